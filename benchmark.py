@@ -0,0 +1,150 @@
+import argparse
+import os
+import sys
+
+from dotenv import load_dotenv
+
+from config import DATASET_OUTPUT_DIR, ANALYSIS_OUTPUT_DIR, OPERATION_B_AS_OF
+from script.benchmark import Benchmark, OPERATION_NAMES, DEFAULT_OPERATION_NAMES, LOAD_MODES, save_results, \
+    load_results, compare_results, print_comparison, get_timestamp
+from script.database import DatabaseInstance
+from script.loader import Loader
+from script.memory_graph import MemoryGraph
+from script.memory_operations import MemoryOperations
+from script.operations import Operations
+
+
+def run_memory(args: argparse.Namespace) -> dict:
+    unsupported = [name for name in args.operations if name not in DEFAULT_OPERATION_NAMES]
+    if unsupported or args.load_mode != 'default' or args.profile:
+        raise ValueError(f"The memory backend supports only the operations {list(DEFAULT_OPERATION_NAMES)}, the "
+                         f"default load mode and no profiling")
+
+    graph = MemoryGraph()
+    benchmark = Benchmark(
+        db=None,
+        loader=graph,
+        operations=MemoryOperations(graph),
+        dataset_output_dir=args.dataset_dir,
+        warmup=args.warmup,
+        repeat=args.repeat,
+        load_repeat=args.load_repeat,
+        cache_mode=args.cache,
+        cold_command=args.cold_command,
+        u_customer_id=args.customer_id,
+        k=args.k,
+        as_of=args.as_of
+    )
+
+    return benchmark.run(args.datasets, args.operations, args.load_mode)
+
+
+def run_neo4j(args: argparse.Namespace) -> dict:
+    load_dotenv()
+
+    db = DatabaseInstance(
+        uri=os.getenv("DBMS_URI"),
+        user=os.getenv("DBMS_USER"),
+        password=os.getenv("DBMS_PASSWORD"),
+        database=os.getenv("DATABASE_NAME"),
+    )
+    benchmark = Benchmark(
+        db=db,
+        loader=Loader(db, spending_aggregates=args.spending_aggregates, monthly_aggregates=args.monthly_aggregates,
+                      buying_friends=args.buying_friends),
+        operations=Operations(db),
+        dataset_output_dir=args.dataset_dir,
+        warmup=args.warmup,
+        repeat=args.repeat,
+        load_repeat=args.load_repeat,
+        cache_mode=args.cache,
+        cold_command=args.cold_command,
+        u_customer_id=args.customer_id,
+        k=args.k,
+        as_of=args.as_of,
+        profile_operations=Operations(db, profile=True) if args.profile else None
+    )
+
+    try:
+        return benchmark.run(args.datasets, args.operations, args.load_mode)
+    finally:
+        db.close()
+
+
+def run(args: argparse.Namespace):
+    results = run_memory(args) if args.backend == 'memory' else run_neo4j(args)
+
+    output_path = args.output or os.path.join(ANALYSIS_OUTPUT_DIR, f"benchmark_{get_timestamp()}.json")
+    save_results(results, output_path)
+    print(f"Benchmark results saved in '{output_path}'")
+
+
+def compare(args: argparse.Namespace) -> int:
+    comparison = compare_results(load_results(args.baseline), load_results(args.current), args.threshold,
+                                 args.statistic)
+    print_comparison(comparison)
+
+    regressions = [row for row in comparison if row['regression']]
+    if regressions:
+        print(f"{len(regressions)} regressions over {args.threshold:.0%} found")
+        return 1
+
+    print("No regressions found")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the loading of the datasets and the operations.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help="Run the benchmark and save the results as JSON.")
+    run_parser.add_argument('--datasets', nargs='+', default=['dataset_50MB', 'dataset_200MB'],
+                            help="Names of the generated datasets to benchmark.")
+    run_parser.add_argument('--dataset-dir', default=DATASET_OUTPUT_DIR,
+                            help="Directory containing the generated datasets.")
+    run_parser.add_argument('--operations', nargs='+', default=list(DEFAULT_OPERATION_NAMES), choices=OPERATION_NAMES,
+                            help="Operations to benchmark, executed in the given order.")
+    run_parser.add_argument('--backend', default='neo4j', choices=('neo4j', 'memory'),
+                            help="Run the operations on Neo4j or on the in-memory graph of MemoryGraph.")
+    run_parser.add_argument('--load-mode', default='default', choices=LOAD_MODES, help="How the datasets are loaded.")
+    run_parser.add_argument('--spending-aggregates', action='store_true',
+                            help="Materialize the SPENT_AT aggregates at the end of each load.")
+    run_parser.add_argument('--monthly-aggregates', action='store_true',
+                            help="Materialize the TerminalMonth aggregates at the end of each load.")
+    run_parser.add_argument('--buying-friends', action='store_true',
+                            help="Materialize the BUYING_FRIEND relationships at the end of each load, it requires "
+                                 "--spending-aggregates.")
+    run_parser.add_argument('--warmup', type=int, default=1, help="Unmeasured runs of each operation.")
+    run_parser.add_argument('--repeat', type=int, default=5, help="Measured runs of each operation.")
+    run_parser.add_argument('--load-repeat', type=int, default=1, help="Measured loads of each dataset.")
+    run_parser.add_argument('--cache', default='warm', choices=('warm', 'cold'),
+                            help="Measure the operations with warm caches or clear them before each run.")
+    run_parser.add_argument('--cold-command', default=None,
+                            help="Shell command executed before each cold run, e.g. to restart the DBMS.")
+    run_parser.add_argument('--customer-id', type=int, default=0, help="Customer id of the user u of operation c.")
+    run_parser.add_argument('--k', type=int, default=3, help="Degree of operation c.")
+    run_parser.add_argument('--as-of', default=OPERATION_B_AS_OF,
+                            help="Reference date of operation b in ISO format, by default the day after the last day "
+                                 "of the smallest generated dataset.")
+    run_parser.add_argument('--profile', action='store_true',
+                            help="Run each operation once more under PROFILE and store its plan with the timings.")
+    run_parser.add_argument('--output', default=None, help="Path of the JSON results.")
+
+    compare_parser = subparsers.add_parser('compare', help="Compare benchmark results against a baseline.")
+    compare_parser.add_argument('baseline', help="Path of the JSON results of the baseline.")
+    compare_parser.add_argument('current', help="Path of the JSON results to compare.")
+    compare_parser.add_argument('--threshold', type=float, default=0.1,
+                                help="Relative slowdown above which a measure is flagged as a regression.")
+    compare_parser.add_argument('--statistic', default='median', choices=('median', 'p95', 'mean', 'min'),
+                                help="Statistic compared.")
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        run(args)
+        return 0
+
+    return compare(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,5 @@
 import os
+from datetime import date, timedelta
 
 CUSTOMERS_NUM = 5000
 
@@ -10,6 +11,19 @@ R = 5
 
 NB_DAYS = 500
 
+# Reference date of operation b, the day after the last day of the smallest generated dataset, so that its current
+# and previous months are months of the dataset whenever the operation is executed
+OPERATION_B_AS_OF = (date.fromisoformat(START_DATE) + timedelta(days=NB_DAYS)).isoformat()
+
+GENERATION_WORKERS = os.cpu_count() or 1
+
+# If True, the extension of operation d.i is generated with the transactions and set by the Loader at creation
+ENRICH_TRANSACTIONS = False
+
+OPERATIONS_CONCURRENCY = 4
+
+PROFILE_OPERATIONS = False
+
 PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
 
 OUTPUT_DIR = os.path.join(PROJECT_ROOT, ".output")
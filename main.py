@@ -1,3 +1,5 @@
+import asyncio
+import json
 import os
 
 from dotenv import load_dotenv
@@ -5,7 +7,9 @@ from dotenv import load_dotenv
 from common.logger import logger, set_global_logger
 from common.utils import clear_dir_path, create_plot
 from config import OUTPUT_DIR, DATASET_OUTPUT_DIR, ANALYSIS_OUTPUT_DIR, \
-    CUSTOMERS_NUM, TERMINALS_NUM, START_DATE, R, NB_DAYS
+    CUSTOMERS_NUM, TERMINALS_NUM, START_DATE, R, NB_DAYS, GENERATION_WORKERS, OPERATIONS_CONCURRENCY, \
+    PROFILE_OPERATIONS, ENRICH_TRANSACTIONS, OPERATION_B_AS_OF
+from script.async_database import AsyncDatabaseInstance
 from script.database import DatabaseInstance
 from script.generator import Generator
 from script.loader import Loader
@@ -30,7 +34,14 @@ def generate_datasets(generator: Generator,
     return datasets_name
 
 
-def loading_and_operating_datasets(loader: Loader, operations: Operations):
+async def execute_read_operations(async_db: AsyncDatabaseInstance, queries: dict[str, tuple[str, dict]]):
+    try:
+        return await async_db.execute_queries(queries)
+    finally:
+        await async_db.close()
+
+
+def loading_and_operating_datasets(loader: Loader, operations: Operations, async_db: AsyncDatabaseInstance = None):
     time_results = {}
     for dataset_name in ['dataset_50MB', 'dataset_200MB']:
         logger.info(f"[LOADING and OPERATING '{dataset_name}']")
@@ -40,14 +51,28 @@ def loading_and_operating_datasets(loader: Loader, operations: Operations):
 
         queries = {
             "a": operations.operation_a,
-            "b": operations.operation_b,
+            "b": lambda: operations.operation_b(OPERATION_B_AS_OF),
             "c": lambda: operations.operation_c(0, 3),
             "d.i": operations.operation_d_i,
             "d.ii": operations.operation_d_ii,
             "e": operations.operation_e
         }
+        if ENRICH_TRANSACTIONS:
+            # The transactions have been loaded with the extension of operation d.i
+            queries.pop("d.i")
 
         operation_times = {}
+        if async_db is not None:
+            # The read-only operations a, b and c are independent, so they are executed concurrently
+            read_queries = operations.get_read_queries(0, 3, OPERATION_B_AS_OF)
+            read_times, elapsed_time = asyncio.run(execute_read_operations(async_db, read_queries))
+            for name, execution_time in read_times.items():
+                queries.pop(name)
+                operation_times[name] = execution_time
+                logger.info(f"Time to execute operation [{name}] on dataset '{dataset_name}': {execution_time:.3f}s")
+            logger.info(f"Time to execute operations {list(read_times)} concurrently on dataset '{dataset_name}': "
+                        f"{elapsed_time:.3f}s")
+
         for name, operation in queries.items():
             execution_time = operation()
             operation_times[name] = execution_time
@@ -55,7 +80,8 @@ def loading_and_operating_datasets(loader: Loader, operations: Operations):
 
         time_results[dataset_name] = {
             "loading_time": loading_time,
-            "operations": operation_times
+            "operations": operation_times,
+            "profiles": operations.get_profiles()
         }
 
     return time_results
@@ -76,10 +102,19 @@ def main():
         n_customers=CUSTOMERS_NUM,
         n_terminals=TERMINALS_NUM,
         start_date=START_DATE,
-        r=R
+        r=R,
+        n_workers=GENERATION_WORKERS,
+        enrich=ENRICH_TRANSACTIONS
     )
+    async_db = AsyncDatabaseInstance(
+        uri=os.getenv("DBMS_URI"),
+        user=os.getenv("DBMS_USER"),
+        password=os.getenv("DBMS_PASSWORD"),
+        database=os.getenv("DATABASE_NAME"),
+        max_concurrency=OPERATIONS_CONCURRENCY
+    ) if OPERATIONS_CONCURRENCY > 1 and not PROFILE_OPERATIONS else None
     loader = Loader(db)
-    operations = Operations(db)
+    operations = Operations(db, profile=PROFILE_OPERATIONS)
 
     generate_datasets(
         generator,
@@ -87,8 +122,10 @@ def main():
         initial_estimated_mb_size=50,
         multipliers=[1, 2, 4]
     )
-    time_results = loading_and_operating_datasets(loader, operations)
+    time_results = loading_and_operating_datasets(loader, operations, async_db)
     create_plot(ANALYSIS_OUTPUT_DIR, time_results)
+    with open(os.path.join(ANALYSIS_OUTPUT_DIR, "time_results.json"), 'w', encoding='utf-8') as f:
+        json.dump(time_results, f, indent=2)
 
     db.close()
 
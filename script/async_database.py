@@ -0,0 +1,159 @@
+import asyncio
+import time
+from typing import Any
+
+from neo4j import AsyncGraphDatabase, AsyncDriver, AsyncManagedTransaction, ResultSummary
+
+
+class AsyncDatabaseInstance:
+    def __init__(self, uri: str, user: str, password: str, database: str,
+                 max_concurrency: int = 4,
+                 max_connection_pool_size: int = 16,
+                 connection_acquisition_timeout: float = 60.0,
+                 max_connection_lifetime: float = 3600.0,
+                 max_transaction_retry_time: float = 30.0):
+        """
+        A class to handle asynchronous interactions with a Neo4j database instance, so that independent queries can
+        be executed concurrently and use the parallelism of the server. The driver is created on first use and bound
+        to the running event loop, after close it is created again on the next use, so the same instance can be used
+        across multiple asyncio.run calls as long as it is closed at the end of each of them.
+
+        :param uri: The URI of the Neo4j DBMS.
+        :param user: The username for authentication.
+        :param password: The password for authentication.
+        :param database: The name of the Neo4j database to connect to.
+        :param max_concurrency: Default maximum number of queries executed at the same time by execute_queries.
+        :param max_connection_pool_size: Maximum number of connections kept by the driver.
+        :param connection_acquisition_timeout: Maximum time in seconds to wait for a free connection of the pool.
+        :param max_connection_lifetime: Maximum time in seconds a connection is kept in the pool.
+        :param max_transaction_retry_time: Maximum time in seconds managed transactions are retried on transient
+            errors (deadlocks, leader switches, unavailable server).
+        """
+
+        self.__uri = uri
+        self.__user = user
+        self.__password = password
+        self.__database = database
+        self.__max_concurrency = max_concurrency
+        self.__driver_config = {
+            'max_connection_pool_size': max(max_connection_pool_size, max_concurrency),
+            'connection_acquisition_timeout': connection_acquisition_timeout,
+            'max_connection_lifetime': max_connection_lifetime,
+            'max_transaction_retry_time': max_transaction_retry_time
+        }
+        self.__driver = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    def __get_driver(self) -> AsyncDriver:
+        if self.__driver is None:
+            self.__driver = AsyncGraphDatabase.driver(
+                self.__uri, auth=(self.__user, self.__password), **self.__driver_config)
+        return self.__driver
+
+    def get_database(self) -> str:
+        return self.__database
+
+    async def close(self):
+        if self.__driver is not None:
+            await self.__driver.close()
+            self.__driver = None
+
+    @staticmethod
+    def __get_execution_time(summary: ResultSummary, query_name: str = None) -> float:
+        execution_time = (summary.result_available_after + summary.result_consumed_after) / 1000.0
+
+        if query_name:
+            print(f"Time to execute query {query_name}: {execution_time:.3f}s")
+
+        return execution_time
+
+    async def execute_query(self, query, query_name=None, **kwargs: Any) -> float:
+        """
+        Execute query on the database in an auto-commit transaction, as DatabaseInstance.execute_query. Queries that
+        manage their own transactions (CALL { ... } IN TRANSACTIONS) must be executed with this method.
+
+        :param query: Query string.
+        :param query_name: Optional query name.
+        :param kwargs: Query parameters.
+        :return: Query execution time in seconds.
+        """
+
+        async with self.__get_driver().session(database=self.__database) as session:
+            result = await session.run(query, kwargs)
+            summary = await result.consume()
+
+        return self.__get_execution_time(summary, query_name)
+
+    async def execute_read(self, query, query_name=None, **kwargs: Any) -> float:
+        """
+        Execute query on the database in a managed read transaction, retried on transient errors.
+
+        :param query: Query string.
+        :param query_name: Optional query name.
+        :param kwargs: Query parameters.
+        :return: Query execution time in seconds.
+        """
+
+        async with self.__get_driver().session(database=self.__database) as session:
+            summary = await session.execute_read(self.__run_transaction, query, kwargs)
+
+        return self.__get_execution_time(summary, query_name)
+
+    async def execute_write(self, query, query_name=None, **kwargs: Any) -> float:
+        """
+        Execute query on the database in a managed write transaction, retried on transient errors.
+
+        :param query: Query string.
+        :param query_name: Optional query name.
+        :param kwargs: Query parameters.
+        :return: Query execution time in seconds.
+        """
+
+        async with self.__get_driver().session(database=self.__database) as session:
+            summary = await session.execute_write(self.__run_transaction, query, kwargs)
+
+        return self.__get_execution_time(summary, query_name)
+
+    @staticmethod
+    async def __run_transaction(tx: AsyncManagedTransaction, query: str, parameters: dict) -> ResultSummary:
+        # The result is consumed inside the transaction function, so that a retry runs the whole query again
+        result = await tx.run(query, parameters)
+        return await result.consume()
+
+    async def execute_queries(self, queries: dict[str, str | tuple[str, dict]], max_concurrency: int = None,
+                              access_mode: str = 'read') -> tuple[dict[str, float], float]:
+        """
+        Execute a group of independent queries concurrently, each one in its own managed transaction.
+
+        :param queries: Dictionary from query name to query string, or to a (query string, parameters) tuple.
+        :param max_concurrency: Maximum number of queries executed at the same time, the default one of the
+            instance if None.
+        :param access_mode: 'read' or 'write', the kind of managed transaction used for all the queries.
+        :return: A tuple containing the execution time of each query in seconds, with the same keys of queries, and
+            the total elapsed time of the group in seconds.
+        """
+
+        if access_mode == 'read':
+            execute = self.execute_read
+        elif access_mode == 'write':
+            execute = self.execute_write
+        else:
+            raise ValueError(f"Unknown access mode '{access_mode}', expected 'read' or 'write'")
+
+        semaphore = asyncio.Semaphore(max_concurrency or self.__max_concurrency)
+
+        async def execute_limited(name: str, query: str | tuple[str, dict]) -> float:
+            query, parameters = query if isinstance(query, tuple) else (query, {})
+            async with semaphore:
+                return await execute(query, query_name=name, **parameters)
+
+        start_time = time.time()
+        execution_times = await asyncio.gather(*(execute_limited(name, query) for name, query in queries.items()))
+        elapsed_time = time.time() - start_time
+
+        return dict(zip(queries.keys(), execution_times)), elapsed_time
@@ -0,0 +1,339 @@
+import json
+import os
+import platform
+import subprocess
+import time
+from datetime import datetime
+
+import numpy as np
+
+from script.database import DatabaseInstance
+from script.loader import Loader
+from script.operations import Operations
+
+LOAD_MODES = ('default', 'fresh', 'batched')
+
+# Operations of the project, executed by default, and their variants
+DEFAULT_OPERATION_NAMES = ('a', 'b', 'c', 'd.i', 'd.ii', 'e')
+
+OPERATION_NAMES = DEFAULT_OPERATION_NAMES + ('a.aggregated', 'a.shared_terminals', 'b.aggregated', 'c.frontier',
+                                             'd.i.batched', 'd.ii.aggregated')
+
+# Queries restoring the graph written by the write operations as it was loaded, executed before each of their runs so
+# that every run writes the same data instead of overwriting the properties or merging the relationships of the
+# previous one
+_REMOVE_TRANSACTIONS_EXTENSION_QUERY = """
+MATCH ()-[tx:TRANSACTION]->()
+CALL (tx) {
+    REMOVE tx.period_of_day, tx.product_type, tx.security_feeling
+} IN TRANSACTIONS OF 10000 ROWS
+"""
+
+_DELETE_BUYING_FRIENDS_QUERY = """
+MATCH (:Customer)-[f:BUYING_FRIEND]->(:Customer)
+CALL (f) {
+    DELETE f
+} IN TRANSACTIONS OF 10000 ROWS
+"""
+
+WRITE_OPERATION_RESET_QUERIES = {
+    'd.i': _REMOVE_TRANSACTIONS_EXTENSION_QUERY,
+    'd.i.batched': _REMOVE_TRANSACTIONS_EXTENSION_QUERY,
+    'd.ii': _DELETE_BUYING_FRIENDS_QUERY,
+    'd.ii.aggregated': _DELETE_BUYING_FRIENDS_QUERY
+}
+
+
+def summarize_times(times: list[float]) -> dict:
+    """
+    Summarize the execution times of the measured runs of a benchmark.
+
+    :param times: Execution times in seconds.
+    :return: Dictionary with the runs and their median, p95, mean, variance, min and max.
+    """
+
+    times_array = np.asarray(times, dtype=float)
+
+    return {
+        'runs': [float(t) for t in times_array],
+        'median': float(np.median(times_array)),
+        'p95': float(np.percentile(times_array, 95)),
+        'mean': float(np.mean(times_array)),
+        'variance': float(np.var(times_array, ddof=1)) if len(times_array) > 1 else 0.0,
+        'min': float(np.min(times_array)),
+        'max': float(np.max(times_array))
+    }
+
+
+class Benchmark:
+    def __init__(self, db: DatabaseInstance, loader: Loader, operations: Operations, dataset_output_dir: str,
+                 warmup: int = 1, repeat: int = 5, load_repeat: int = 1, cache_mode: str = 'warm',
+                 cold_command: str = None, u_customer_id: int = 0, k: int = 3, as_of: str = None,
+                 profile_operations: Operations = None):
+        """
+        A class to benchmark the loading of the datasets and the execution of the operations on them.
+
+        :param db: Database instance, None for the in-memory backend.
+        :param loader: Loader used to load the datasets, or the MemoryGraph of the in-memory backend.
+        :param operations: Operations to benchmark, or MemoryOperations for the in-memory backend.
+        :param dataset_output_dir: Directory containing the generated datasets.
+        :param warmup: Number of runs of each operation executed before the measured ones, they are not recorded.
+        :param repeat: Number of measured runs of each operation.
+        :param load_repeat: Number of measured loads of each dataset.
+        :param cache_mode: 'warm' to measure the operations with the caches filled by the previous runs, 'cold' to
+            clear the query caches (and run cold_command, if any) before each measured run.
+        :param cold_command: Optional shell command executed before each cold run, e.g. to restart the DBMS or to
+            drop the OS page cache, since the page cache of Neo4j cannot be cleared from Cypher.
+        :param u_customer_id: Customer id of the user u of operation c.
+        :param k: Degree of operation c.
+        :param as_of: Reference date of operation b, the current date of the server if None (of the client for
+            b.aggregated).
+        :param profile_operations: Optional Operations in profiling mode, if given each operation is executed once
+            more under PROFILE after the measured runs, so that profiling does not affect the timings, and the summary
+            of its plan is stored with them.
+        """
+
+        if cache_mode not in ('warm', 'cold'):
+            raise ValueError(f"Unknown cache mode '{cache_mode}', expected 'warm' or 'cold'")
+
+        self.__db = db
+        self.__loader = loader
+        self.__operations = operations
+        self.__dataset_output_dir = dataset_output_dir
+        self.__warmup = warmup
+        self.__repeat = repeat
+        self.__load_repeat = load_repeat
+        self.__cache_mode = cache_mode
+        self.__cold_command = cold_command
+        self.__u_customer_id = u_customer_id
+        self.__k = k
+        self.__as_of = as_of
+        self.__profile_operations = profile_operations
+
+    def __get_operation(self, name: str, operations: Operations):
+        # Resolved lazily, MemoryOperations only has the operations of DEFAULT_OPERATION_NAMES
+        operation_functions = {
+            "a": lambda: operations.operation_a(),
+            "b": lambda: operations.operation_b(self.__as_of),
+            "c": lambda: operations.operation_c(self.__u_customer_id, self.__k),
+            "c.frontier": lambda: operations.operation_c_frontier(self.__u_customer_id, self.__k),
+            "d.i": lambda: operations.operation_d_i(),
+            "d.i.batched": lambda: operations.operation_d_i_batched(),
+            "d.ii": lambda: operations.operation_d_ii(),
+            "e": lambda: operations.operation_e(),
+            "a.aggregated": lambda: operations.operation_a_aggregated(),
+            "a.shared_terminals": lambda: operations.operation_a_shared_terminals(),
+            "b.aggregated": lambda: operations.operation_b_aggregated(self.__as_of),
+            "d.ii.aggregated": lambda: operations.operation_d_ii_aggregated()
+        }
+        if name not in operation_functions:
+            raise ValueError(f"Unknown operation '{name}', expected one of {list(operation_functions)}")
+
+        return operation_functions[name]
+
+    def __restore_graph(self, name: str):
+        # The in-memory operations recompute their results from the graph, only the database needs to be restored
+        if self.__db is not None and name in WRITE_OPERATION_RESET_QUERIES:
+            self.__db.execute_query(WRITE_OPERATION_RESET_QUERIES[name])
+
+    def __prepare_cold_run(self):
+        if self.__db is not None:
+            self.__db.execute_query("CALL db.clearQueryCaches()")
+        if self.__cold_command:
+            subprocess.run(self.__cold_command, shell=True, check=True)
+
+    def __load(self, dataset_path: str, load_mode: str) -> float:
+        if load_mode == 'default':
+            return self.__loader.load_dataset(dataset_path)
+        if load_mode == 'fresh':
+            return self.__loader.load_dataset(dataset_path, fresh=True)
+        if load_mode == 'batched':
+            return self.__loader.load_dataset_batched(dataset_path)
+
+        raise ValueError(f"Unknown load mode '{load_mode}', expected one of {list(LOAD_MODES)}")
+
+    def benchmark_load(self, dataset_name: str, load_mode: str = 'default') -> dict:
+        """
+        Load a dataset load_repeat times, recording the total time and the time of each stage of the Loader.
+
+        :param dataset_name: Name of the dataset directory.
+        :param load_mode: 'default', 'fresh' or 'batched'.
+        :return: Dictionary with the summary of the total loading time and of each stage.
+        """
+
+        dataset_path = os.path.join(self.__dataset_output_dir, dataset_name)
+        total_times = []
+        stage_times = {}
+        for _ in range(self.__load_repeat):
+            total_times.append(self.__load(dataset_path, load_mode))
+            for stage_name, stage_time in self.__loader.get_stage_times().items():
+                stage_times.setdefault(stage_name, []).append(stage_time)
+
+        return {
+            'mode': load_mode,
+            'total': summarize_times(total_times),
+            'stages': {stage_name: summarize_times(times) for stage_name, times in stage_times.items()}
+        }
+
+    def benchmark_operation(self, name: str) -> dict:
+        """
+        Execute an operation warmup times and then repeat measured times, on the dataset currently loaded. Before
+        each run of the write operations d.i and d.ii, and of their variants, the data they write is removed, so that
+        every run starts from the graph as it was loaded; the removal is not measured.
+
+        :param name: Operation name.
+        :return: Summary of the execution times of the measured runs, with the summary of the plan of the operation
+            if profiling is enabled.
+        """
+
+        operation = self.__get_operation(name, self.__operations)
+        for _ in range(self.__warmup):
+            self.__restore_graph(name)
+            operation()
+
+        times = []
+        for _ in range(self.__repeat):
+            self.__restore_graph(name)
+            if self.__cache_mode == 'cold':
+                self.__prepare_cold_run()
+            times.append(operation())
+
+        summary = summarize_times(times)
+        if self.__profile_operations is not None:
+            self.__restore_graph(name)
+            self.__get_operation(name, self.__profile_operations)()
+            summary['profile'] = self.__profile_operations.get_profiles().get(name)
+
+        return summary
+
+    def run(self, datasets: list[str], operations: list[str], load_mode: str = 'default') -> dict:
+        """
+        Run the benchmark: each dataset is loaded and then all the operations are executed on it, in order.
+
+        :param datasets: Names of the dataset directories.
+        :param operations: Names of the operations, executed in the given order.
+        :param load_mode: 'default', 'fresh' or 'batched'.
+        :return: Dictionary with the configuration of the benchmark and the results of each dataset.
+        """
+
+        results = {}
+        for dataset_name in datasets:
+            print(f"[BENCHMARK '{dataset_name}']")
+            loading = self.benchmark_load(dataset_name, load_mode)
+            print(f"Median time to load dataset '{dataset_name}': {loading['total']['median']:.3f}s")
+
+            operation_results = {}
+            for name in operations:
+                operation_results[name] = self.benchmark_operation(name)
+                print(f"Median time to execute operation [{name}] on dataset '{dataset_name}': "
+                      f"{operation_results[name]['median']:.3f}s (p95 {operation_results[name]['p95']:.3f}s)")
+                if operation_results[name].get('profile'):
+                    print_top_operators(operation_results[name]['profile'])
+
+            results[dataset_name] = {
+                'loading': loading,
+                'operations': operation_results
+            }
+
+        return {
+            'metadata': {
+                'timestamp': datetime.now().isoformat(timespec='seconds'),
+                'host': platform.node(),
+                'database': self.__db.get_database() if self.__db is not None else 'memory',
+                'load_mode': load_mode,
+                'warmup': self.__warmup,
+                'repeat': self.__repeat,
+                'load_repeat': self.__load_repeat,
+                'cache_mode': self.__cache_mode,
+                'cold_command': self.__cold_command,
+                'as_of': self.__as_of,
+                'profile': self.__profile_operations is not None
+            },
+            'results': results
+        }
+
+
+def save_results(results: dict, path: str):
+    """
+    Save the results of a benchmark as JSON.
+
+    :param results: Results returned by Benchmark.run.
+    :param path: Output file path.
+    """
+
+    output_dir = os.path.dirname(path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+
+
+def load_results(path: str) -> dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare_results(baseline: dict, current: dict, threshold: float = 0.1, statistic: str = 'median') -> list[dict]:
+    """
+    Compare the results of a benchmark with the ones of a baseline, for every loading time, loading stage and
+    operation measured in both.
+
+    :param baseline: Baseline results.
+    :param current: Current results.
+    :param threshold: Relative slowdown above which a measure is flagged as a regression.
+    :param statistic: Statistic compared, 'median', 'p95', 'mean' or 'min'.
+    :return: One dictionary per compared measure, with its baseline and current values, the relative change and
+        whether it is a regression.
+    """
+
+    def measures(results: dict) -> dict[tuple[str, str], dict]:
+        flattened = {}
+        for dataset_name, dataset_results in results['results'].items():
+            flattened[(dataset_name, "load")] = dataset_results['loading']['total']
+            for stage_name, stage_summary in dataset_results['loading']['stages'].items():
+                flattened[(dataset_name, f"load/{stage_name}")] = stage_summary
+            for name, summary in dataset_results['operations'].items():
+                flattened[(dataset_name, name)] = summary
+        return flattened
+
+    baseline_measures = measures(baseline)
+    current_measures = measures(current)
+
+    comparison = []
+    for key, current_summary in current_measures.items():
+        if key not in baseline_measures:
+            continue
+
+        baseline_value = baseline_measures[key][statistic]
+        current_value = current_summary[statistic]
+        change = (current_value - baseline_value) / baseline_value if baseline_value > 0 else 0.0
+        comparison.append({
+            'dataset': key[0],
+            'measure': key[1],
+            'baseline': baseline_value,
+            'current': current_value,
+            'change': change,
+            'regression': change > threshold
+        })
+
+    return comparison
+
+
+def print_top_operators(profile: dict):
+    print(f"  Total db hits: {profile['db_hits']}, page cache hits/misses: {profile['page_cache_hits']}/"
+          f"{profile['page_cache_misses']}")
+    for operator in profile['top_operators']:
+        print(f"  {operator['operator']:<40} {operator['db_hits']:>12} db hits ({operator['db_hits_share']:.1%}), "
+              f"{operator['rows']} rows (estimated {operator['estimated_rows']:.0f})")
+
+
+def print_comparison(comparison: list[dict]):
+    for row in comparison:
+        flag = "REGRESSION" if row['regression'] else ""
+        print(f"{row['dataset']:<20} {row['measure']:<50} {row['baseline']:>10.3f}s {row['current']:>10.3f}s "
+              f"{row['change']:>+8.1%} {flag}")
+
+
+def get_timestamp() -> str:
+    return time.strftime("%Y%m%d-%H%M%S")
@@ -0,0 +1,105 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import script.dataset_io as dataset_io
+
+BULK_IMPORT_DIR_NAME = "neo4j_import"
+
+CUSTOMERS_FILE = "customers.csv"
+TERMINALS_FILE = "terminals.csv"
+TRANSACTIONS_FILE = "transactions.csv"
+ACCESS_TO_FILE = "access_to.csv"
+
+
+def _write_csv(df: pd.DataFrame, path: str) -> int:
+    df.to_csv(path, index=False)
+    return len(df)
+
+
+def write_bulk_import_files(dataset_path: str) -> dict[str, int]:
+    """
+    Write the node and relationship files of a generated dataset in the format of 'neo4j-admin database import', in
+    the neo4j_import subdirectory of the dataset. Node ids are the customer and terminal ids in their own id spaces,
+    properties have the same names and types of the ones set by the Loader, and the ACCESS_TO relationships are
+    expanded from available_terminals.
+
+    :param dataset_path: Directory of the generated dataset, in any of the formats of the Generator.
+    :return: Number of rows written in each file.
+    """
+
+    customer_profiles_table, terminal_profiles_table, transactions_df = dataset_io.read_dataset(dataset_path)
+
+    import_dir = os.path.join(dataset_path, BULK_IMPORT_DIR_NAME)
+    if not os.path.exists(import_dir):
+        os.makedirs(import_dir)
+
+    rows = {}
+
+    customers = pd.DataFrame({
+        'customer_id:ID(Customer)': customer_profiles_table.CUSTOMER_ID.values,
+        'x_location:double': customer_profiles_table.x_customer_id.values,
+        'y_location:double': customer_profiles_table.y_customer_id.values,
+        'mean_amount:double': customer_profiles_table.mean_amount.values,
+        'std_amount:double': customer_profiles_table.std_amount.values,
+        'mean_nb_tx_per_day:double': customer_profiles_table.mean_nb_tx_per_day.values,
+        'nb_terminals:long': customer_profiles_table.nb_terminals.values
+    })
+    rows[CUSTOMERS_FILE] = _write_csv(customers, os.path.join(import_dir, CUSTOMERS_FILE))
+
+    terminals = pd.DataFrame({
+        'terminal_id:ID(Terminal)': terminal_profiles_table.TERMINAL_ID.values,
+        'x_location:double': terminal_profiles_table.x_terminal_id.values,
+        'y_location:double': terminal_profiles_table.y_terminal_id.values
+    })
+    rows[TERMINALS_FILE] = _write_csv(terminals, os.path.join(import_dir, TERMINALS_FILE))
+
+    transactions = pd.DataFrame({
+        ':START_ID(Customer)': transactions_df.CUSTOMER_ID.values,
+        ':END_ID(Terminal)': transactions_df.TERMINAL_ID.values,
+        'transaction_id:long': transactions_df.TRANSACTION_ID.values,
+        'datetime:datetime': np.datetime_as_string(
+            transactions_df.TX_DATETIME.values.astype('datetime64[s]'), unit='s'),
+        'amount:double': transactions_df.TX_AMOUNT.values.astype(float).round(2),
+        'fraudulent:boolean': np.where(transactions_df.TX_FRAUD.values == 1, 'true', 'false')
+    })
+    if 'TX_SECURITY_FEELING' in transactions_df.columns:
+        # Extension of operation d.i, written only if the dataset was generated with it
+        transactions['period_of_day'] = transactions_df.TX_PERIOD_OF_DAY.values
+        transactions['product_type'] = transactions_df.TX_PRODUCT_TYPE.values
+        transactions['security_feeling:long'] = transactions_df.TX_SECURITY_FEELING.values
+    rows[TRANSACTIONS_FILE] = _write_csv(transactions, os.path.join(import_dir, TRANSACTIONS_FILE))
+
+    available_terminals = customer_profiles_table.available_terminals
+    access_to = pd.DataFrame({
+        ':START_ID(Customer)': np.repeat(customer_profiles_table.CUSTOMER_ID.values, available_terminals.apply(len)),
+        ':END_ID(Terminal)': np.fromiter((t for terminals in available_terminals for t in terminals), dtype=np.int64)
+    })
+    rows[ACCESS_TO_FILE] = _write_csv(access_to, os.path.join(import_dir, ACCESS_TO_FILE))
+
+    return rows
+
+
+def get_bulk_import_command(dataset_path: str, database: str, neo4j_admin: str = "neo4j-admin") -> list[str]:
+    """
+    Build the 'neo4j-admin database import full' command that imports the files written by write_bulk_import_files.
+    The target database must be stopped (or not exist yet) while the command runs, and it is overwritten.
+
+    :param dataset_path: Directory of the generated dataset.
+    :param database: Name of the database to import into.
+    :param neo4j_admin: Path of the neo4j-admin executable.
+    :return: The command as a list of arguments.
+    """
+
+    import_dir = os.path.abspath(os.path.join(dataset_path, BULK_IMPORT_DIR_NAME))
+
+    return [
+        neo4j_admin, "database", "import", "full", database,
+        "--overwrite-destination",
+        "--id-type=INTEGER",
+        f"--nodes=Customer={os.path.join(import_dir, CUSTOMERS_FILE)}",
+        f"--nodes=Terminal={os.path.join(import_dir, TERMINALS_FILE)}",
+        f"--relationships=TRANSACTION={os.path.join(import_dir, TRANSACTIONS_FILE)}",
+        f"--relationships=ACCESS_TO={os.path.join(import_dir, ACCESS_TO_FILE)}"
+    ]
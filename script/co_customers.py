@@ -0,0 +1,90 @@
+import numpy as np
+
+from script.database import DatabaseInstance
+
+
+class CoCustomerEngine:
+    def __init__(self, db: DatabaseInstance, fetch_size: int = 10000):
+        """
+        A class to compute the co-customers of a batch of customers with a level-by-level breadth-first search on the
+        customer-customer projection of the graph, in which two customers are adjacent if they have a transaction on
+        the same terminal. Each level is expanded with two parameterized queries (frontier customers to their
+        terminals, new terminals to their customers) and the visited customers and terminals of each source are
+        pruned on the client, so the work of each level is proportional to the newly reached part of the graph
+        instead of the number of paths.
+
+        :param db: Database instance.
+        :param fetch_size: Number of records pulled from the database at each step.
+        """
+
+        self.__db = db
+        self.__fetch_size = fetch_size
+
+    def __expand(self, query: str, frontier_sources: np.ndarray, frontier_ids: np.ndarray,
+                 result_column: str) -> tuple[np.ndarray, np.ndarray]:
+        frontier = [{'source': int(source), 'id': int(node_id)}
+                    for source, node_id in zip(frontier_sources, frontier_ids)]
+        records, _ = self.__db.fetch_query(query, fetch_size=self.__fetch_size, output='numpy', frontier=frontier)
+
+        return records['source'].astype(np.int64), records[result_column].astype(np.int64)
+
+    @staticmethod
+    def __prune(sources: np.ndarray, ids: np.ndarray, visited: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Keys of the (source, id) pairs, the visited ones are kept sorted for the membership test
+        keys = np.unique((sources << 32) | ids)
+        keys = keys[~np.isin(keys, visited, assume_unique=True)]
+
+        return keys >> 32, keys & 0xFFFFFFFF, np.union1d(visited, keys)
+
+    def search(self, source_customer_ids: list[int], max_degree: int) -> dict[int, dict[int, np.ndarray]]:
+        """
+        Find the co-customers of each source customer up to max_degree. The co-customers of degree k of a customer u
+        are the customers u' whose shortest chain u-t1-u2-...-tk-1-u' has k customers, so every customer appears
+        at a single degree, the smallest one at which it can be reached.
+
+        :param source_customer_ids: Customer ids of the source customers, processed together.
+        :param max_degree: Maximum degree k.
+        :return: Dictionary from source customer id to a dictionary from degree (2 to max_degree) to the sorted
+            array of the customer ids of that degree.
+        """
+
+        terminals_query = """
+        UNWIND $frontier AS row
+        MATCH (:Customer {customer_id: row.id})-[:TRANSACTION]->(t:Terminal)
+        RETURN DISTINCT row.source AS source, t.terminal_id AS terminal_id
+        """
+
+        customers_query = """
+        UNWIND $frontier AS row
+        MATCH (:Terminal {terminal_id: row.id})<-[:TRANSACTION]-(c:Customer)
+        RETURN DISTINCT row.source AS source, c.customer_id AS customer_id
+        """
+
+        source_customer_ids = np.asarray(source_customer_ids, dtype=np.int64)
+        results = {int(customer_id): {} for customer_id in source_customer_ids}
+
+        frontier_sources = np.arange(len(source_customer_ids), dtype=np.int64)
+        frontier_customers = source_customer_ids
+        visited_customers = np.unique((frontier_sources << 32) | frontier_customers)
+        visited_terminals = np.zeros(0, dtype=np.int64)
+
+        for degree in range(2, max_degree + 1):
+            if len(frontier_customers) == 0:
+                for customer_id in source_customer_ids:
+                    results[int(customer_id)][degree] = np.zeros(0, dtype=np.int64)
+                continue
+
+            # The terminals already expanded only lead to customers that have already been visited
+            sources, terminal_ids = self.__expand(terminals_query, frontier_sources, frontier_customers, 'terminal_id')
+            sources, terminal_ids, visited_terminals = self.__prune(sources, terminal_ids, visited_terminals)
+
+            sources, customer_ids = self.__expand(customers_query, sources, terminal_ids, 'customer_id')
+            frontier_sources, frontier_customers, visited_customers = self.__prune(
+                sources, customer_ids, visited_customers)
+
+            # Pairs are sorted by source and then by customer id
+            bounds = np.searchsorted(frontier_sources, np.arange(len(source_customer_ids) + 1))
+            for source_index, customer_id in enumerate(source_customer_ids):
+                results[int(customer_id)][degree] = frontier_customers[bounds[source_index]:bounds[source_index + 1]]
+
+        return results
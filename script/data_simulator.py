@@ -3,6 +3,17 @@ import random
 import numpy as np
 import pandas as pd
 
+from script.spatial_index import TerminalGridIndex
+
+# Tile sizes of generate_transactions_table_batch, every tile has its own random generator
+TRANSACTIONS_CUSTOMERS_BLOCK_SIZE = 1024
+TRANSACTIONS_DAYS_BLOCK_SIZE = 32
+
+# Values of the transaction extension of operation d.i, with the same hours and probabilities
+PERIODS_OF_DAY = np.array(['night', 'morning', 'afternoon', 'evening'])
+PERIODS_OF_DAY_START_HOURS = np.array([0, 6, 12, 18, 22])
+PRODUCT_TYPES = np.array(['hightech', 'food', 'clothing', 'consumable', 'other'])
+
 
 def generate_customer_profiles_table(n_customers, random_state=0):
     """
@@ -69,6 +80,82 @@ def generate_terminal_profiles_table(n_terminals, random_state=0):
     return terminal_profiles_table
 
 
+def get_random_generator(random_state=0, seeding='legacy'):
+    """
+    Return the random number source used by the vectorized generation functions. With the 'legacy' seeding a
+    np.random.RandomState is returned, which produces the same stream of numbers as np.random.seed(random_state)
+    and therefore reproduces the output of the loop based functions. With the 'generator' seeding a faster
+    np.random.Generator is returned.
+    """
+
+    if seeding == 'legacy':
+        return np.random.RandomState(random_state)
+    if seeding == 'generator':
+        return np.random.default_rng(random_state)
+
+    raise ValueError(f"Unknown seeding '{seeding}', expected 'legacy' or 'generator'")
+
+
+def generate_customer_profiles_table_vectorized(n_customers, random_state=0, seeding='legacy'):
+    """
+    Vectorized version of generate_customer_profiles_table, every column is drawn as a single NumPy array and the
+    DataFrame is built directly from the columns. With the 'legacy' seeding the draws are made in the same order
+    as the loop (one row of attributes per customer), so the output is exactly the same.
+    """
+
+    rng = get_random_generator(random_state, seeding)
+
+    if seeding == 'legacy':
+        # One row of standard uniform draws per customer, in the same order as the loop, then scaled as
+        # np.random.uniform(low, high) does (low + (high - low) * u)
+        draws = rng.uniform(size=(n_customers, 4))
+        x_customer_id = 0.0 + 100.0 * draws[:, 0]
+        y_customer_id = 0.0 + 100.0 * draws[:, 1]
+        mean_amount = 5.0 + 95.0 * draws[:, 2]
+        mean_nb_tx_per_day = 0.0 + 4.0 * draws[:, 3]
+    else:
+        x_customer_id = rng.uniform(0, 100, n_customers)
+        y_customer_id = rng.uniform(0, 100, n_customers)
+        mean_amount = rng.uniform(5, 100, n_customers)
+        mean_nb_tx_per_day = rng.uniform(0, 4, n_customers)
+
+    customer_profiles_table = pd.DataFrame({
+        'CUSTOMER_ID': np.arange(n_customers),
+        'x_customer_id': x_customer_id,
+        'y_customer_id': y_customer_id,
+        'mean_amount': mean_amount,
+        'std_amount': mean_amount / 2,
+        'mean_nb_tx_per_day': mean_nb_tx_per_day
+    })
+
+    return customer_profiles_table
+
+
+def generate_terminal_profiles_table_vectorized(n_terminals, random_state=0, seeding='legacy'):
+    """
+    Vectorized version of generate_terminal_profiles_table, with the same seeding options of
+    generate_customer_profiles_table_vectorized.
+    """
+
+    rng = get_random_generator(random_state, seeding)
+
+    if seeding == 'legacy':
+        draws = rng.uniform(size=(n_terminals, 2))
+        x_terminal_id = 0.0 + 100.0 * draws[:, 0]
+        y_terminal_id = 0.0 + 100.0 * draws[:, 1]
+    else:
+        x_terminal_id = rng.uniform(0, 100, n_terminals)
+        y_terminal_id = rng.uniform(0, 100, n_terminals)
+
+    terminal_profiles_table = pd.DataFrame({
+        'TERMINAL_ID': np.arange(n_terminals),
+        'x_terminal_id': x_terminal_id,
+        'y_terminal_id': y_terminal_id
+    })
+
+    return terminal_profiles_table
+
+
 def get_list_terminals_within_radius(customer_profile, x_y_terminals, r):
     """
     The function will take as input a customer profile (any row in the customer profiles table), an array
@@ -97,6 +184,17 @@ def get_list_terminals_within_radius(customer_profile, x_y_terminals, r):
     return available_terminals
 
 
+def get_terminals_within_radius_csr(x_y_customers, x_y_terminals, r):
+    """
+    Batched version of get_list_terminals_within_radius. It takes as input the geographical locations of all
+    customers and all terminals, and the radius r. It returns the terminals within a radius of r for every customer
+    at once in CSR form (offsets, indices), using a grid spatial index over the terminals so that only the terminals
+    of the neighbouring cells are compared with each customer.
+    """
+
+    return TerminalGridIndex(x_y_terminals, r).query(x_y_customers)
+
+
 def generate_transactions_table(customer_profile, start_date, nb_days):
     """
     Takes as input a customer profile, a starting date, and a number of days for which to generate transactions.
@@ -158,6 +256,100 @@ def generate_transactions_table(customer_profile, start_date, nb_days):
     return customer_transactions
 
 
+def generate_transactions_table_batch(customer_profiles_table, available_terminals_offsets, available_terminals_indices,
+                                     start_date, nb_days, first_day=0, random_state=0):
+    """
+    Vectorized version of generate_transactions_table for many customers at once. It takes as input the customer
+    profiles, their available terminals in CSR form (offsets, indices) aligned with the rows of the profiles, a
+    starting date and the days [first_day, nb_days) for which to generate transactions. It returns the table of
+    transactions of all the customers, with the same format of generate_transactions_table.
+
+    The customer x day matrix is split in tiles of TRANSACTIONS_CUSTOMERS_BLOCK_SIZE customers (by CUSTOMER_ID) and
+    TRANSACTIONS_DAYS_BLOCK_SIZE days, and each tile has its own np.random.Generator seeded with
+    (random_state, customers block, days block). In each tile the Poisson numbers of transactions are drawn for the
+    whole matrix in one go, expanded with np.repeat, and times, amounts and terminals are drawn as arrays, with the
+    rejection and negative amount rules applied with masks. The output is therefore deterministic and does not
+    change if the customers or the days are split in parts aligned with the blocks.
+    """
+
+    columns = ['TX_DATETIME', 'CUSTOMER_ID', 'TERMINAL_ID', 'TX_AMOUNT', 'TX_TIME_SECONDS', 'TX_TIME_DAYS']
+
+    customer_ids = customer_profiles_table.CUSTOMER_ID.values
+    mean_amount = customer_profiles_table.mean_amount.values.astype(float)
+    std_amount = customer_profiles_table.std_amount.values.astype(float)
+    mean_nb_tx_per_day = customer_profiles_table.mean_nb_tx_per_day.values.astype(float)
+    offsets = np.asarray(available_terminals_offsets)
+    indices = np.asarray(available_terminals_indices)
+
+    # Rows of the customers table grouped by customers block
+    customer_blocks = customer_ids // TRANSACTIONS_CUSTOMERS_BLOCK_SIZE
+    block_starts = np.flatnonzero(np.diff(customer_blocks, prepend=-1))
+    block_ends = np.append(block_starts[1:], len(customer_ids))
+
+    tiles = []
+    for block_start, block_end in zip(block_starts, block_ends):
+        rows = np.arange(block_start, block_end)
+        customer_block = int(customer_blocks[block_start])
+
+        first_days_block = first_day // TRANSACTIONS_DAYS_BLOCK_SIZE
+        last_days_block = -(-nb_days // TRANSACTIONS_DAYS_BLOCK_SIZE)
+        for days_block in range(first_days_block, last_days_block):
+            days = np.arange(max(days_block * TRANSACTIONS_DAYS_BLOCK_SIZE, first_day),
+                             min((days_block + 1) * TRANSACTIONS_DAYS_BLOCK_SIZE, nb_days))
+
+            rng = np.random.default_rng([random_state, customer_block, days_block])
+            tiles.append(_generate_transactions_tile(
+                rng, rows, days, customer_ids, mean_amount, std_amount, mean_nb_tx_per_day, offsets, indices))
+
+    if not tiles:
+        return pd.DataFrame(columns=columns)
+
+    tx_time_seconds, tx_time_days, customer_id, terminal_id, tx_amount = (np.concatenate(c) for c in zip(*tiles))
+    transactions_df = pd.DataFrame({
+        'TX_DATETIME': pd.to_datetime(tx_time_seconds, unit='s', origin=start_date),
+        'CUSTOMER_ID': customer_id,
+        'TERMINAL_ID': terminal_id,
+        'TX_AMOUNT': tx_amount,
+        'TX_TIME_SECONDS': tx_time_seconds,
+        'TX_TIME_DAYS': tx_time_days
+    })
+
+    return transactions_df
+
+
+def _generate_transactions_tile(rng, rows, days, customer_ids, mean_amount, std_amount, mean_nb_tx_per_day,
+                                offsets, indices):
+    # Random number of transactions for each customer and day, expanded to one entry per transaction
+    nb_tx = rng.poisson(mean_nb_tx_per_day[rows][:, None], size=(len(rows), len(days))).ravel()
+    tx_rows = np.repeat(np.repeat(rows, len(days)), nb_tx)
+    tx_days = np.repeat(np.tile(days, len(rows)), nb_tx)
+    n_tx = len(tx_rows)
+
+    # Time of transaction: Around noon, std 20000 seconds (truncated as int() does)
+    time_tx = rng.normal(86400 / 2, 20000, n_tx).astype(np.int64)
+
+    # Amount is drawn from a normal distribution, negative amounts are drawn again from a uniform distribution
+    amount = rng.normal(mean_amount[tx_rows], std_amount[tx_rows])
+    negative = amount < 0
+    amount[negative] = rng.uniform(0, mean_amount[tx_rows[negative]] * 2)
+    amount = np.round(amount, decimals=2)
+
+    # Terminal chosen uniformly among the available terminals of the customer
+    nb_available = offsets[tx_rows + 1] - offsets[tx_rows]
+    terminal_pos = offsets[tx_rows] + (rng.random(n_tx) * nb_available).astype(np.int64)
+
+    # Keep only the transactions with time between 0 and 86400 and with at least an available terminal
+    keep = (time_tx > 0) & (time_tx < 86400) & (nb_available > 0)
+    tx_rows = tx_rows[keep]
+    tx_days = tx_days[keep]
+
+    return (time_tx[keep] + tx_days * 86400,
+            tx_days,
+            customer_ids[tx_rows],
+            indices[terminal_pos[keep]],
+            amount[keep])
+
+
 def add_frauds(customer_profiles_table, terminal_profiles_table, transactions_df):
     """
     Scenario 1: Any transaction whose amount is more than 220 is a fraud. This scenario is not inspired by a
@@ -177,43 +369,172 @@ def add_frauds(customer_profiles_table, terminal_profiles_table, transactions_df
     scenario will require adding features that keep track of the spending habits of the customer. As for scenario 2,
     since the card is only temporarily compromised, additional strategies that involve concept drift should also
     be designed.
+
+    The compromised terminals and customers of every day are first collected in small interval tables, which are
+    then joined with the transactions in a single pass, so the cost is linear in the number of transactions.
     """
 
-    # By default, all transactions are genuine
-    transactions_df['TX_FRAUD'] = 0
-    transactions_df['TX_FRAUD_SCENARIO'] = 0
+    nb_days = transactions_df.TX_TIME_DAYS.max()
+    tx_days = transactions_df.TX_TIME_DAYS.values
+    tx_amount = transactions_df.TX_AMOUNT.values.copy()
 
     # Scenario 1
-    transactions_df.loc[transactions_df.TX_AMOUNT > 220, 'TX_FRAUD'] = 1
-    transactions_df.loc[transactions_df.TX_AMOUNT > 220, 'TX_FRAUD_SCENARIO'] = 1
+    scenario_1 = tx_amount > 220
 
     # Scenario 2
-    for day in range(transactions_df.TX_TIME_DAYS.max()):
-        compromised_terminals = terminal_profiles_table.TERMINAL_ID.sample(n=2, random_state=day)
+    compromised_terminals = get_compromised_terminals_table(terminal_profiles_table, 0, nb_days)
+    scenario_2 = get_transactions_in_windows(
+        transactions_df.TERMINAL_ID.values, tx_days, compromised_terminals, 'TERMINAL_ID')
 
-        compromised_transactions = transactions_df[(transactions_df.TX_TIME_DAYS >= day) &
-                                                   (transactions_df.TX_TIME_DAYS < day + 28) &
-                                                   (transactions_df.TERMINAL_ID.isin(compromised_terminals))]
+    # Scenario 3
+    compromised_customers = get_compromised_customers_table(customer_profiles_table, 0, nb_days)
+    nb_frauds = get_scenario_3_frauds(transactions_df.CUSTOMER_ID.values, tx_days, compromised_customers)
+    scenario_3 = nb_frauds > 0
 
-        transactions_df.loc[compromised_transactions.index, 'TX_FRAUD'] = 1
-        transactions_df.loc[compromised_transactions.index, 'TX_FRAUD_SCENARIO'] = 2
+    # An amount can be multiplied more than once if its transaction is drawn in more than one window
+    for nb_times in range(1, nb_frauds.max(initial=0) + 1):
+        tx_amount[nb_frauds >= nb_times] *= 5
 
-    # Scenario 3
-    for day in range(transactions_df.TX_TIME_DAYS.max()):
-        compromised_customers = customer_profiles_table.CUSTOMER_ID.sample(n=3, random_state=day).values
+    transactions_df['TX_AMOUNT'] = tx_amount
+    transactions_df['TX_FRAUD'], transactions_df['TX_FRAUD_SCENARIO'] = get_fraud_labels(
+        scenario_1, scenario_2, scenario_3)
 
-        compromised_transactions = transactions_df[(transactions_df.TX_TIME_DAYS >= day) &
-                                                   (transactions_df.TX_TIME_DAYS < day + 14) &
-                                                   (transactions_df.CUSTOMER_ID.isin(compromised_customers))]
+    return transactions_df
 
-        nb_compromised_transactions = len(compromised_transactions)
 
-        random.seed(day)
-        index_frauds = random.sample(list(compromised_transactions.index.values),
-                                     k=int(nb_compromised_transactions / 3))
+def get_fraud_labels(scenario_1, scenario_2, scenario_3):
+    """
+    Return the TX_FRAUD and TX_FRAUD_SCENARIO labels given the boolean masks of the three scenarios, later
+    scenarios overwrite the labels of the previous ones.
+    """
 
-        transactions_df.loc[index_frauds, 'TX_AMOUNT'] = transactions_df.loc[index_frauds, 'TX_AMOUNT'] * 5
-        transactions_df.loc[index_frauds, 'TX_FRAUD'] = 1
-        transactions_df.loc[index_frauds, 'TX_FRAUD_SCENARIO'] = 3
+    tx_fraud = (scenario_1 | scenario_2 | scenario_3).astype(np.int64)
+    tx_fraud_scenario = np.select([scenario_3, scenario_2, scenario_1], [3, 2, 1], default=0)
 
-    return transactions_df
+    return tx_fraud, tx_fraud_scenario
+
+
+def _hash_to_uniform(values, random_state, stream):
+    # SplitMix64 finalizer of the (random_state, stream, value) triple, mapped to a uniform float in [0, 1)
+    with np.errstate(over='ignore'):
+        x = np.asarray(values).astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15) * np.uint64(
+            (random_state * 2 + stream + 1) & 0xFFFFFFFF)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        x = x ^ (x >> np.uint64(31))
+
+    return (x >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+
+def get_transactions_extension(transaction_ids, tx_time_seconds, random_state=2):
+    """
+    Compute the extension of the transactions of operation d.i: the period of the day from the time of the
+    transaction, the kind of product and the feeling of security drawn at random. The random values are a hash of
+    the transaction id and random_state, so each transaction gets the same values however the transactions are
+    split in chunks or shards.
+
+    :return: A tuple of arrays (period_of_day, product_type, security_feeling).
+    """
+
+    hours = (np.asarray(tx_time_seconds) % 86400) // 3600
+    periods = np.searchsorted(PERIODS_OF_DAY_START_HOURS, hours, side='right') - 1
+    # Hours from 22 are night as the ones before 6
+    period_of_day = PERIODS_OF_DAY[np.where(periods == 4, 0, periods)]
+
+    product_type = PRODUCT_TYPES[(_hash_to_uniform(transaction_ids, random_state, 0) * 5).astype(np.int64)]
+    security_feeling = (_hash_to_uniform(transaction_ids, random_state, 1) * 5).astype(np.int64) + 1
+
+    return period_of_day, product_type, security_feeling
+
+
+def get_compromised_terminals_table(terminal_profiles_table, first_day, last_day):
+    """
+    Interval table of scenario 2: for every day in [first_day, last_day) two terminals are drawn at random (with
+    random_state=day) and are compromised from that day (START_DAY) to 28 days later (END_DAY, excluded).
+    """
+
+    compromised_terminals = [terminal_profiles_table.TERMINAL_ID.sample(n=2, random_state=day).values
+                             for day in range(first_day, last_day)]
+
+    return _get_windows_table('TERMINAL_ID', compromised_terminals, first_day, 28)
+
+
+def get_compromised_customers_table(customer_profiles_table, first_day, last_day):
+    """
+    Interval table of scenario 3: for every day in [first_day, last_day) three customers are drawn at random (with
+    random_state=day) and are compromised from that day (START_DAY) to 14 days later (END_DAY, excluded).
+    """
+
+    compromised_customers = [customer_profiles_table.CUSTOMER_ID.sample(n=3, random_state=day).values
+                             for day in range(first_day, last_day)]
+
+    return _get_windows_table('CUSTOMER_ID', compromised_customers, first_day, 14)
+
+
+def _get_windows_table(id_column, compromised_ids, first_day, nb_window_days):
+    nb_ids = np.array([len(ids) for ids in compromised_ids], dtype=np.int64)
+    start_day = np.repeat(np.arange(first_day, first_day + len(compromised_ids)), nb_ids)
+
+    return pd.DataFrame({
+        id_column: np.concatenate(compromised_ids) if compromised_ids else np.zeros(0, dtype=np.int64),
+        'START_DAY': start_day,
+        'END_DAY': start_day + nb_window_days
+    })
+
+
+def get_transactions_in_windows(tx_ids, tx_days, windows_table, id_column):
+    """
+    Return the boolean mask of the transactions (given by their ids and days) that fall in at least one of the
+    windows of the interval table, using a (day, id) lookup.
+    """
+
+    window_ids = windows_table[id_column].values
+    nb_window_days = (windows_table.END_DAY.values - windows_table.START_DAY.values)
+    if len(tx_ids) == 0 or len(window_ids) == 0:
+        return np.zeros(len(tx_ids), dtype=bool)
+
+    # Expand every window into its (day, id) keys
+    window_days = (np.repeat(windows_table.START_DAY.values, nb_window_days) +
+                   np.arange(nb_window_days.sum()) - np.repeat(np.cumsum(nb_window_days) - nb_window_days,
+                                                               nb_window_days))
+    window_ids = np.repeat(window_ids, nb_window_days)
+
+    nb_keys_ids = int(max(tx_ids.max(), window_ids.max())) + 1
+    window_keys = np.unique(window_days.astype(np.int64) * nb_keys_ids + window_ids)
+    tx_keys = tx_days.astype(np.int64) * nb_keys_ids + tx_ids
+
+    return np.isin(tx_keys, window_keys)
+
+
+def get_scenario_3_frauds(tx_customers, tx_days, compromised_customers):
+    """
+    Return, for every transaction, how many times it has been drawn as fraudulent by scenario 3. For every day of
+    the interval table, a third of the transactions of the compromised customers in the window are drawn with
+    random.seed(day), from the transactions listed in the same order of the table.
+    """
+
+    nb_frauds = np.zeros(len(tx_customers), dtype=np.int64)
+    if len(tx_customers) == 0 or len(compromised_customers) == 0:
+        return nb_frauds
+
+    # Transactions sorted by (customer, day), keeping the table order inside each group
+    order = np.lexsort((tx_days, tx_customers))
+    nb_keys_days = int(max(tx_days.max(), compromised_customers.END_DAY.max())) + 1
+    keys = tx_customers[order].astype(np.int64) * nb_keys_days + tx_days[order]
+
+    customer_ids = compromised_customers.CUSTOMER_ID.values.astype(np.int64)
+    window_starts = np.searchsorted(keys, customer_ids * nb_keys_days + compromised_customers.START_DAY.values)
+    window_ends = np.searchsorted(keys, customer_ids * nb_keys_days + compromised_customers.END_DAY.values)
+
+    start_days, first_windows = np.unique(compromised_customers.START_DAY.values, return_index=True)
+    last_windows = np.append(first_windows[1:], len(compromised_customers))
+    for day, first_window, last_window in zip(start_days, first_windows, last_windows):
+        compromised_transactions = np.sort(np.concatenate(
+            [order[start:end] for start, end in zip(window_starts[first_window:last_window],
+                                                     window_ends[first_window:last_window])]))
+
+        random.seed(int(day))
+        index_frauds = random.sample(list(compromised_transactions), k=int(len(compromised_transactions) / 3))
+        nb_frauds[index_frauds] += 1
+
+    return nb_frauds
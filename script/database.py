@@ -1,6 +1,9 @@
-from typing import Any
+import time
+from typing import Any, Iterator
 
-from neo4j import GraphDatabase, Session
+import numpy as np
+import pandas as pd
+from neo4j import GraphDatabase, Session, Record
 
 
 class DatabaseInstance:
@@ -19,12 +22,16 @@ class DatabaseInstance:
         self.__password = password
         self.__database = database
         self.__driver = GraphDatabase.driver(self.__uri, auth=(self.__user, self.__password))
+        self.__last_query_stats = None
 
-    def get_session(self) -> Session | None:
+    def get_session(self, database: str = None) -> Session | None:
         if self.__driver is not None:
-            return self.__driver.session(database=self.__database)
+            return self.__driver.session(database=database or self.__database)
         return None
 
+    def get_database(self) -> str:
+        return self.__database
+
     def close(self):
         if self.__driver is not None:
             self.__driver.close()
@@ -49,3 +56,191 @@ class DatabaseInstance:
                 print(f"Time to execute query {query_name}: {execution_time:.3f}s")
 
             return execution_time
+
+    def profile_query(self, query, query_name=None, **kwargs: Any) -> tuple[float, dict]:
+        """
+        Execute query on the database under PROFILE, the records are discarded as in execute_query.
+
+        :param query: Query string, without the PROFILE keyword.
+        :param query_name: Optional query name.
+        :param kwargs: Query parameters.
+        :return: A tuple containing the query execution time in seconds and the profiled plan tree.
+        """
+
+        with self.get_session() as session:
+            result = session.run("PROFILE " + query.lstrip(), kwargs).consume()
+            avail = result.result_available_after
+            cons = result.result_consumed_after
+            execution_time = (avail + cons) / 1000.0
+
+            if query_name:
+                print(f"Time to execute profiled query {query_name}: {execution_time:.3f}s")
+
+            return execution_time, result.profile
+
+    def get_last_query_stats(self) -> dict[str, float] | None:
+        """
+        Get the statistics of the last query fully consumed by stream_query or fetch_query:
+        - result_available_after: Server time in seconds until the first record was available.
+        - result_consumed_after: Server time in seconds to stream all the records.
+        - server_time: Sum of the two server times, as returned by execute_query.
+        - client_time: End-to-end time in seconds measured by the client, from the query submission to the conversion
+          of the last batch of records.
+        - records: Number of records received.
+        - batches: Number of batches yielded.
+        - bytes: Estimated size in bytes of the received PackStream payload.
+        """
+
+        return self.__last_query_stats
+
+    def stream_query(self, query, fetch_size: int = 1000, output: str = 'records',
+                     **kwargs: Any) -> Iterator[list[dict] | dict[str, np.ndarray] | pd.DataFrame]:
+        """
+        Execute query on the database and stream its records in batches of fetch_size records, pulled from the server
+        one batch at a time, so that the whole result is never held in memory. When the stream is exhausted, its
+        statistics are available with get_last_query_stats.
+
+        :param query: Query string.
+        :param fetch_size: Number of records pulled from the server and yielded at each step.
+        :param output: Format of each batch, 'records' for a list of dictionaries, 'numpy' for a dictionary from
+            column name to NumPy array, or 'pandas' for a DataFrame. The columnar formats are built in bulk from the
+            values of the batch, without a Python dictionary per record.
+        :param kwargs: Query parameters.
+        :return: A generator of batches of records.
+        """
+
+        if output not in ('records', 'numpy', 'pandas'):
+            raise ValueError(f"Unknown output '{output}', expected 'records', 'numpy' or 'pandas'")
+
+        start_time = time.time()
+        n_records = 0
+        n_batches = 0
+        n_bytes = 0
+        with self.__driver.session(database=self.__database, fetch_size=fetch_size) as session:
+            result = session.run(query, kwargs)
+            keys = result.keys()
+
+            batch = []
+            for record in result:
+                batch.append(record)
+                if len(batch) == fetch_size:
+                    n_bytes += sum(_estimate_packstream_size(r.values()) for r in batch)
+                    n_records += len(batch)
+                    n_batches += 1
+                    yield _convert_records(batch, keys, output)
+                    batch = []
+
+            if batch or n_batches == 0:
+                n_bytes += sum(_estimate_packstream_size(r.values()) for r in batch)
+                n_records += len(batch)
+                n_batches += 1
+                yield _convert_records(batch, keys, output)
+
+            summary = result.consume()
+
+        avail = summary.result_available_after / 1000.0
+        cons = summary.result_consumed_after / 1000.0
+        self.__last_query_stats = {
+            'result_available_after': avail,
+            'result_consumed_after': cons,
+            'server_time': avail + cons,
+            'client_time': time.time() - start_time,
+            'records': n_records,
+            'batches': n_batches,
+            'bytes': n_bytes
+        }
+
+    def fetch_query(self, query, query_name=None, fetch_size: int = 1000, output: str = 'records',
+                    **kwargs: Any) -> tuple[list[dict] | dict[str, np.ndarray] | pd.DataFrame, dict[str, float]]:
+        """
+        Execute query on the database and return all its records, streamed in batches of fetch_size records.
+
+        :param query: Query string.
+        :param query_name: Optional query name.
+        :param fetch_size: Number of records pulled from the server at each step.
+        :param output: 'records', 'numpy' or 'pandas', as in stream_query.
+        :param kwargs: Query parameters.
+        :return: A tuple containing the records in the output format and the statistics of the query, as returned by
+            get_last_query_stats.
+        """
+
+        batches = list(self.stream_query(query, fetch_size=fetch_size, output=output, **kwargs))
+        if output == 'records':
+            records = [record for batch in batches for record in batch]
+        elif output == 'numpy':
+            records = {key: np.concatenate([batch[key] for batch in batches]) for key in batches[0]}
+        else:
+            records = pd.concat(batches, ignore_index=True)
+
+        stats = self.__last_query_stats
+        if query_name:
+            print(f"Time to fetch query {query_name}: {stats['server_time']:.3f}s (server), "
+                  f"{stats['client_time']:.3f}s (client), {stats['records']} records, {stats['bytes']} bytes")
+
+        return records, stats
+
+
+def _convert_records(records: list[Record], keys: list[str],
+                     output: str) -> list[dict] | dict[str, np.ndarray] | pd.DataFrame:
+    if output == 'records':
+        return [record.data() for record in records]
+
+    # Transpose the values of the batch into columns, instead of building a dictionary per record
+    columns = list(zip(*(record.values() for record in records))) if records else [()] * len(keys)
+    arrays = {key: _to_array(column) for key, column in zip(keys, columns)}
+    if output == 'numpy':
+        return arrays
+    return pd.DataFrame(arrays, columns=keys)
+
+
+def _to_array(column: tuple) -> np.ndarray:
+    if any(isinstance(value, (list, dict)) or value is None for value in column):
+        # Nested values (e.g. collected lists) and nulls are kept as Python objects
+        array = np.empty(len(column), dtype=object)
+        array[:] = column
+        return array
+    return np.asarray(column)
+
+
+def _estimate_packstream_size(value: Any) -> int:
+    # Size of the value in the PackStream encoding used by the Bolt protocol, structures (nodes, relationships,
+    # temporal and spatial values) are approximated by the size of their fields
+    if value is None or isinstance(value, bool):
+        return 1
+    if isinstance(value, int):
+        if -16 <= value < 128:
+            return 1
+        if -128 <= value < 128:
+            return 2
+        if -32768 <= value < 32768:
+            return 3
+        if -2147483648 <= value < 2147483648:
+            return 5
+        return 9
+    if isinstance(value, float):
+        return 9
+    if isinstance(value, str):
+        return _estimate_packstream_header_size(len(value.encode('utf-8'))) + len(value.encode('utf-8'))
+    if isinstance(value, (bytes, bytearray)):
+        return _estimate_packstream_header_size(len(value)) + len(value)
+    if isinstance(value, (list, tuple)):
+        return _estimate_packstream_header_size(len(value)) + sum(_estimate_packstream_size(v) for v in value)
+    if isinstance(value, dict):
+        return _estimate_packstream_header_size(len(value)) + sum(
+            _estimate_packstream_size(k) + _estimate_packstream_size(v) for k, v in value.items())
+    if hasattr(value, 'items') and hasattr(value, 'element_id'):
+        # Nodes and relationships: ids, labels or type and properties
+        return 16 + len(value.element_id) + _estimate_packstream_size(dict(value.items()))
+
+    # Temporal and spatial values are structures of a few integers or floats
+    return 16
+
+
+def _estimate_packstream_header_size(length: int) -> int:
+    if length < 16:
+        return 1
+    if length < 256:
+        return 2
+    if length < 65536:
+        return 3
+    return 5
@@ -0,0 +1,250 @@
+import glob
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from script.schema import CUSTOMER_PROFILES_DTYPES, TERMINAL_PROFILES_DTYPES, TRANSACTIONS_DTYPES, apply_schema
+from script.spatial_index import csr_to_lists
+
+# Number of days of transactions stored in each partition of the Parquet format
+TRANSACTIONS_PARTITION_DAYS = 30
+
+# The default parser of pandas can be off by one ulp, floats are parsed exactly as toFloat of LOAD CSV, so that the
+# values read back can be compared with the ones in the database
+CSV_FLOAT_PRECISION = 'round_trip'
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("The 'parquet' output format requires pyarrow, install it with 'pip install pyarrow'") from e
+
+    return pyarrow
+
+
+def _to_parquet_table(df: pd.DataFrame, dtypes: dict):
+    # Parquet files use the compact integer dtypes of the schema and keep the precision of the float columns
+    pa = _import_pyarrow()
+    df = apply_schema(df, {column: dtype for column, dtype in dtypes.items() if not dtype.startswith('float')})
+    if 'TX_DATETIME' in df.columns:
+        df = df.astype({'TX_DATETIME': 'datetime64[s]'})
+
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def write_customer_profiles(dataset_subdir: str, customer_profiles_table: pd.DataFrame, output_format: str = 'csv',
+                            terminals_offsets: np.ndarray = None, terminals_indices: np.ndarray = None):
+    """
+    Write the customer profiles table in the dataset directory.
+
+    :param dataset_subdir: Dataset directory.
+    :param customer_profiles_table: Customer profiles table.
+    :param output_format: 'csv' or 'parquet'.
+    :param terminals_offsets: Offsets of the available terminals of each customer in CSR form, used by the 'parquet'
+        format to store them as a native list column, and by the 'csv' format when the table has no
+        available_terminals column.
+    :param terminals_indices: Indices of the available terminals of each customer in CSR form.
+    """
+
+    if output_format == 'csv':
+        if 'available_terminals' not in customer_profiles_table.columns:
+            customer_profiles_table = customer_profiles_table.copy()
+            customer_profiles_table.insert(
+                _get_available_terminals_position(customer_profiles_table), 'available_terminals',
+                csr_to_lists(terminals_offsets, terminals_indices))
+        customer_profiles_table.to_csv(os.path.join(dataset_subdir, "customer_profiles.csv"), index=False)
+    elif output_format == 'parquet':
+        pa = _import_pyarrow()
+        table = _to_parquet_table(customer_profiles_table.drop(columns=['available_terminals'], errors='ignore'),
+                                  CUSTOMER_PROFILES_DTYPES)
+        available_terminals = pa.ListArray.from_arrays(np.asarray(terminals_offsets, dtype=np.int32),
+                                                       np.asarray(terminals_indices, dtype=np.int32))
+        if 'available_terminals' in customer_profiles_table.columns:
+            position = customer_profiles_table.columns.get_loc('available_terminals')
+        else:
+            position = _get_available_terminals_position(customer_profiles_table)
+        table = table.add_column(position, 'available_terminals', available_terminals)
+        pa.parquet.write_table(table, os.path.join(dataset_subdir, "customer_profiles.parquet"))
+    else:
+        raise ValueError(f"Unknown output format '{output_format}', expected 'csv' or 'parquet'")
+
+
+def _get_available_terminals_position(customer_profiles_table: pd.DataFrame) -> int:
+    # The available_terminals column comes before nb_terminals, as in the generated tables
+    if 'nb_terminals' in customer_profiles_table.columns:
+        return customer_profiles_table.columns.get_loc('nb_terminals')
+    return len(customer_profiles_table.columns)
+
+
+def write_terminal_profiles(dataset_subdir: str, terminal_profiles_table: pd.DataFrame, output_format: str = 'csv'):
+    """
+    Write the terminal profiles table in the dataset directory.
+
+    :param dataset_subdir: Dataset directory.
+    :param terminal_profiles_table: Terminal profiles table.
+    :param output_format: 'csv' or 'parquet'.
+    """
+
+    if output_format == 'csv':
+        terminal_profiles_table.to_csv(os.path.join(dataset_subdir, "terminal_profiles.csv"), index=False)
+    elif output_format == 'parquet':
+        pa = _import_pyarrow()
+        table = _to_parquet_table(terminal_profiles_table, TERMINAL_PROFILES_DTYPES)
+        pa.parquet.write_table(table, os.path.join(dataset_subdir, "terminal_profiles.parquet"))
+    else:
+        raise ValueError(f"Unknown output format '{output_format}', expected 'csv' or 'parquet'")
+
+
+def write_transactions(dataset_subdir: str, transactions_df: pd.DataFrame, output_format: str = 'csv',
+                       part: int = 0):
+    """
+    Write the transactions in the dataset directory. The 'parquet' format stores them in a transactions directory
+    partitioned by ranges of TRANSACTIONS_PARTITION_DAYS days of TX_TIME_DAYS.
+
+    :param dataset_subdir: Dataset directory.
+    :param transactions_df: Transactions, sorted chronologically.
+    :param output_format: 'csv' or 'parquet'.
+    :param part: Index of the chunk of transactions, with part 0 any existing transactions are replaced, otherwise
+        the chunk is appended after them.
+    """
+
+    if output_format == 'csv':
+        if transactions_df.TX_AMOUNT.dtype == np.float32:
+            # Compact amounts are written with their exact value in cents
+            transactions_df = transactions_df.assign(TX_AMOUNT=transactions_df.TX_AMOUNT.astype(float).round(2))
+        transactions_path = os.path.join(dataset_subdir, "transactions.csv")
+        transactions_df.to_csv(transactions_path, mode='w' if part == 0 else 'a', header=part == 0, index=False)
+    elif output_format == 'parquet':
+        pa = _import_pyarrow()
+        transactions_dir = os.path.join(dataset_subdir, "transactions")
+        if part == 0 and os.path.exists(transactions_dir):
+            shutil.rmtree(transactions_dir)
+
+        partitions = transactions_df.TX_TIME_DAYS.values // TRANSACTIONS_PARTITION_DAYS
+        for partition in np.unique(partitions):
+            first_day = int(partition) * TRANSACTIONS_PARTITION_DAYS
+            partition_dir = os.path.join(
+                transactions_dir, f"days_{first_day:05d}-{first_day + TRANSACTIONS_PARTITION_DAYS - 1:05d}")
+            if not os.path.exists(partition_dir):
+                os.makedirs(partition_dir)
+
+            table = _to_parquet_table(transactions_df[partitions == partition], TRANSACTIONS_DTYPES)
+            pa.parquet.write_table(table, os.path.join(partition_dir, f"part-{part:05d}.parquet"))
+    else:
+        raise ValueError(f"Unknown output format '{output_format}', expected 'csv' or 'parquet'")
+
+
+def write_side_table(dataset_subdir: str, table_name: str, df: pd.DataFrame, output_format: str = 'csv'):
+    """
+    Write a table derived from the dataset, e.g. an index computed from it, in the dataset directory.
+
+    :param dataset_subdir: Dataset directory.
+    :param table_name: Name of the table, used as file name.
+    :param df: Table to write.
+    :param output_format: 'csv' or 'parquet'.
+    """
+
+    if output_format == 'csv':
+        df.to_csv(os.path.join(dataset_subdir, f"{table_name}.csv"), index=False)
+    elif output_format == 'parquet':
+        pa = _import_pyarrow()
+        pa.parquet.write_table(pa.Table.from_pandas(df, preserve_index=False),
+                               os.path.join(dataset_subdir, f"{table_name}.parquet"))
+    else:
+        raise ValueError(f"Unknown output format '{output_format}', expected 'csv' or 'parquet'")
+
+
+def get_dataset_format(dataset_path: str) -> str:
+    """
+    Detect the format of a generated dataset.
+
+    :param dataset_path: Dataset directory.
+    :return: 'csv' or 'parquet'.
+    """
+
+    if os.path.exists(os.path.join(dataset_path, "customer_profiles.parquet")):
+        return 'parquet'
+    if os.path.exists(os.path.join(dataset_path, "customer_profiles.csv")):
+        return 'csv'
+
+    raise FileNotFoundError(f"No dataset found in '{dataset_path}'")
+
+
+def read_dataset(dataset_path: str) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Load a generated dataset back into DataFrames. Parquet datasets are read without any CSV parsing, in both
+    formats available_terminals is returned as a column of lists of terminal ids.
+
+    :param dataset_path: Dataset directory.
+    :return: A tuple containing customer_profiles_table, terminal_profiles_table and transactions_df.
+    """
+
+    if get_dataset_format(dataset_path) == 'csv':
+        customer_profiles_table = pd.read_csv(os.path.join(dataset_path, "customer_profiles.csv"),
+                                              float_precision=CSV_FLOAT_PRECISION)
+        customer_profiles_table['available_terminals'] = customer_profiles_table.available_terminals.apply(json.loads)
+        terminal_profiles_table = pd.read_csv(os.path.join(dataset_path, "terminal_profiles.csv"),
+                                              float_precision=CSV_FLOAT_PRECISION)
+        transactions_df = pd.read_csv(os.path.join(dataset_path, "transactions.csv"), parse_dates=['TX_DATETIME'],
+                                      float_precision=CSV_FLOAT_PRECISION)
+
+        return customer_profiles_table, terminal_profiles_table, transactions_df
+
+    pa = _import_pyarrow()
+    customer_profiles = pa.parquet.read_table(os.path.join(dataset_path, "customer_profiles.parquet"))
+    customer_profiles_table = customer_profiles.to_pandas()
+    customer_profiles_table['available_terminals'] = customer_profiles.column('available_terminals').to_pylist()
+
+    terminal_profiles_table = pa.parquet.read_table(
+        os.path.join(dataset_path, "terminal_profiles.parquet")).to_pandas()
+
+    # Partitions and parts are named so that their sorted order is the chronological one
+    transactions_files = sorted(glob.glob(os.path.join(dataset_path, "transactions", "*", "*.parquet")))
+    if transactions_files:
+        transactions_df = pa.concat_tables([pa.parquet.read_table(path) for path in transactions_files]).to_pandas()
+    else:
+        transactions_df = pd.DataFrame(columns=list(TRANSACTIONS_DTYPES))
+
+    return customer_profiles_table, terminal_profiles_table, transactions_df
+
+
+def iter_dataset_table(dataset_path: str, table_name: str, chunk_size: int = 100000):
+    """
+    Read a table of a generated dataset in chunks, so that it never has to be loaded in memory all at once.
+
+    :param dataset_path: Dataset directory.
+    :param table_name: 'customer_profiles', 'terminal_profiles', 'transactions' or 'shared_terminals' (the side table
+        written by shared_terminals.write_shared_terminals).
+    :param chunk_size: Maximum number of rows of each chunk.
+    :return: A generator of DataFrames, with the same columns returned by read_dataset.
+    """
+
+    if table_name not in ('customer_profiles', 'terminal_profiles', 'transactions', 'shared_terminals'):
+        raise ValueError(f"Unknown table '{table_name}'")
+
+    if get_dataset_format(dataset_path) == 'csv':
+        parse_dates = ['TX_DATETIME'] if table_name == 'transactions' else None
+        for chunk in pd.read_csv(os.path.join(dataset_path, f"{table_name}.csv"), chunksize=chunk_size,
+                                 parse_dates=parse_dates, float_precision=CSV_FLOAT_PRECISION):
+            if table_name == 'customer_profiles':
+                chunk['available_terminals'] = chunk.available_terminals.apply(json.loads)
+            yield chunk
+        return
+
+    pa = _import_pyarrow()
+    if table_name == 'transactions':
+        paths = sorted(glob.glob(os.path.join(dataset_path, "transactions", "*", "*.parquet")))
+    else:
+        paths = [os.path.join(dataset_path, f"{table_name}.parquet")]
+
+    for path in paths:
+        for batch in pa.parquet.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            chunk = batch.to_pandas()
+            if table_name == 'customer_profiles':
+                chunk['available_terminals'] = batch.column('available_terminals').to_pylist()
+            yield chunk
@@ -0,0 +1,477 @@
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+import script.dataset_io as dataset_io
+
+# Rules of the scorer, each one is a bit of the flags of a transaction
+HIGH_AMOUNT = 1
+TERMINAL_COMPROMISED = 2
+CUSTOMER_COMPROMISED = 4
+CUSTOMER_AMOUNT_SPIKE = 8
+TERMINAL_AMOUNT_SPIKE = 16
+
+RULE_NAMES = {
+    HIGH_AMOUNT: 'high_amount',
+    TERMINAL_COMPROMISED: 'terminal_compromised',
+    CUSTOMER_COMPROMISED: 'customer_compromised',
+    CUSTOMER_AMOUNT_SPIKE: 'customer_amount_spike',
+    TERMINAL_AMOUNT_SPIKE: 'terminal_amount_spike'
+}
+
+DEFAULT_RULE_WEIGHTS = {
+    'high_amount': 1.0,
+    'terminal_compromised': 0.6,
+    'customer_compromised': 0.3,
+    'customer_amount_spike': 0.6,
+    'terminal_amount_spike': 0.1
+}
+
+
+def get_rule_names(flags: int) -> list[str]:
+    """
+    :param flags: Flags of a transaction, as returned by StreamingFraudScorer.
+    :return: Names of the rules triggered by the transaction.
+    """
+
+    return [name for rule, name in RULE_NAMES.items() if flags & rule]
+
+
+def _exclusive_group_cumsum(groups: np.ndarray, values: np.ndarray) -> np.ndarray:
+    # Sum of the values of the previous entries of the same group, in the order of the entries
+    order = np.argsort(groups, kind='stable')
+    sorted_groups = groups[order]
+    sums = np.cumsum(values[order]) - values[order]
+    starts = np.flatnonzero(np.diff(sorted_groups, prepend=-1))
+    sums -= np.repeat(sums[starts], np.diff(np.append(starts, len(groups))))
+
+    result = np.empty_like(sums)
+    result[order] = sums
+
+    return result
+
+
+class _RollingWindow:
+    def __init__(self, n_days: int, capacity: int, labeled_delay: int = 0):
+        """
+        Daily counts and sums of the last n_days days of each entity, in a ring of n_days columns indexed by
+        day % n_days, with the totals of the window kept up to date, so that reading them costs O(1). If labeled_delay
+        is given, labeled_counts are the counts of the days of the window whose labels are known, the ones at least
+        labeled_delay days before the current day.
+        """
+
+        self.n_days = n_days
+        self.labeled_delay = labeled_delay
+        self.counts = np.zeros((capacity, n_days), dtype=np.int64)
+        self.sums = np.zeros((capacity, n_days), dtype=np.float64)
+        self.total_counts = np.zeros(capacity, dtype=np.int64)
+        self.total_sums = np.zeros(capacity, dtype=np.float64)
+        self.labeled_counts = np.zeros(capacity, dtype=np.int64)
+
+    def grow(self, capacity: int):
+        extra = capacity - len(self.total_counts)
+        self.counts = np.vstack((self.counts, np.zeros((extra, self.n_days), dtype=np.int64)))
+        self.sums = np.vstack((self.sums, np.zeros((extra, self.n_days), dtype=np.float64)))
+        self.total_counts = np.append(self.total_counts, np.zeros(extra, dtype=np.int64))
+        self.total_sums = np.append(self.total_sums, np.zeros(extra, dtype=np.float64))
+        self.labeled_counts = np.append(self.labeled_counts, np.zeros(extra, dtype=np.int64))
+
+    def advance(self, from_day: int, to_day: int):
+        if to_day - from_day >= self.n_days:
+            # No day of the window is left
+            for array in (self.counts, self.sums, self.total_counts, self.total_sums, self.labeled_counts):
+                array[...] = 0
+            return
+
+        # The columns of the days that leave the window are reused by the new days
+        for day in range(from_day + 1, to_day + 1):
+            column = day % self.n_days
+            if self.labeled_delay > 0:
+                self.labeled_counts -= self.counts[:, column]
+            self.total_counts -= self.counts[:, column]
+            self.total_sums -= self.sums[:, column]
+            self.counts[:, column] = 0
+            self.sums[:, column] = 0.0
+            if self.labeled_delay > 0:
+                self.labeled_counts += self.counts[:, (day - self.labeled_delay) % self.n_days]
+
+    def add(self, entity: int, day: int, value: float):
+        column = day % self.n_days
+        self.counts[entity, column] += 1
+        self.sums[entity, column] += value
+        self.total_counts[entity] += 1
+        self.total_sums[entity] += value
+
+    def add_many(self, entities: np.ndarray, day: int, values: np.ndarray):
+        column = day % self.n_days
+        capacity = len(self.total_counts)
+        counts = np.bincount(entities, minlength=capacity)
+        sums = np.bincount(entities, weights=values, minlength=capacity)
+        self.counts[:, column] += counts
+        self.sums[:, column] += sums
+        self.total_counts += counts
+        self.total_sums += sums
+
+    def add_values(self, entities: np.ndarray, day: int, values: np.ndarray):
+        # Values added to the sums of a day without counting them, e.g. the labels of its counted transactions
+        sums = np.bincount(entities, weights=values, minlength=len(self.total_sums))
+        self.sums[:, day % self.n_days] += sums
+        self.total_sums += sums
+
+    def to_arrays(self, prefix: str) -> dict[str, np.ndarray]:
+        return {f"{prefix}_counts": self.counts, f"{prefix}_sums": self.sums,
+                f"{prefix}_total_counts": self.total_counts, f"{prefix}_total_sums": self.total_sums,
+                f"{prefix}_labeled_counts": self.labeled_counts}
+
+    def from_arrays(self, arrays, prefix: str):
+        self.counts = arrays[f"{prefix}_counts"]
+        self.sums = arrays[f"{prefix}_sums"]
+        self.total_counts = arrays[f"{prefix}_total_counts"]
+        self.total_sums = arrays[f"{prefix}_total_sums"]
+        self.labeled_counts = arrays[f"{prefix}_labeled_counts"]
+
+
+class StreamingFraudScorer:
+    def __init__(self, terminal_window_days: int = 30, terminal_fraud_window_days: int = 28,
+                 customer_window_days: int = 14, customer_fraud_window_days: int = 14, feedback_delay_days: int = 7,
+                 high_amount: float = 220.0, terminal_fraud_ratio: float = 0.5, customer_spike_ratio: float = 3.0,
+                 terminal_spike_ratio: float = 1.2, min_history: int = 3, rule_weights: dict[str, float] = None,
+                 threshold: float = 0.5, capacity: int = 1024):
+        """
+        A class to score the transactions one at a time as they arrive, with rules on rolling state of the customers
+        and terminals kept in memory, bounded by the number of customers and terminals and the length of the windows.
+        The rules follow the fraud scenarios of data_simulator.add_frauds:
+        - high_amount: the amount is higher than high_amount (scenario 1).
+        - terminal_compromised: at least terminal_fraud_ratio of the transactions of the terminal in the last
+          terminal_fraud_window_days days whose labels are known have been reported as frauds (scenario 2).
+        - customer_compromised: frauds have been reported on the customer in the last customer_fraud_window_days
+          days (scenario 3).
+        - customer_amount_spike: the amount is higher than customer_spike_ratio times the average amount of the
+          customer in the last customer_window_days days (scenario 3).
+        - terminal_amount_spike: the amount is higher than terminal_spike_ratio times the average amount of the
+          terminal in the last terminal_window_days days, as operation b.
+        The score of a transaction is the sum of the weights of its rules, it is flagged as fraudulent if the score is
+        at least threshold. Each transaction is scored with the state before it, and then added to the state. Its
+        label, if known, is reported to the state of its customer and terminal feedback_delay_days days later, as the
+        frauds are known only after they are investigated.
+
+        Customers and terminals are indexed by their integer ids, as the dense ids of the Generator. Time is measured
+        in days, as TX_TIME_DAYS. The transactions are expected in chronological order, a late transaction is counted
+        in the current day.
+
+        :param terminal_window_days: Days of the spending window of the terminals.
+        :param terminal_fraud_window_days: Days of the fraud window of the terminals.
+        :param customer_window_days: Days of the spending window of the customers.
+        :param customer_fraud_window_days: Days of the fraud window of the customers.
+        :param feedback_delay_days: Days after which the label of a transaction is known, at least 1.
+        :param high_amount: Amount of the high_amount rule.
+        :param terminal_fraud_ratio: Ratio of the terminal_compromised rule.
+        :param customer_spike_ratio: Ratio of the customer_amount_spike rule.
+        :param terminal_spike_ratio: Ratio of the terminal_amount_spike rule.
+        :param min_history: Minimum number of transactions in the window for the spike rules.
+        :param rule_weights: Weight of each rule, DEFAULT_RULE_WEIGHTS if None.
+        :param threshold: Minimum score of the transactions flagged as fraudulent.
+        :param capacity: Initial number of customers and terminals of the state, it grows with the ids.
+        """
+
+        if feedback_delay_days < 1:
+            raise ValueError("The labels are reported at the change of day, feedback_delay_days must be at least 1")
+        if feedback_delay_days >= terminal_fraud_window_days:
+            raise ValueError("No label would be known in the fraud window of the terminals, feedback_delay_days must "
+                             "be lower than terminal_fraud_window_days")
+
+        self.__config = {
+            'terminal_window_days': terminal_window_days,
+            'terminal_fraud_window_days': terminal_fraud_window_days,
+            'customer_window_days': customer_window_days,
+            'customer_fraud_window_days': customer_fraud_window_days,
+            'feedback_delay_days': feedback_delay_days,
+            'high_amount': high_amount,
+            'terminal_fraud_ratio': terminal_fraud_ratio,
+            'customer_spike_ratio': customer_spike_ratio,
+            'terminal_spike_ratio': terminal_spike_ratio,
+            'min_history': min_history,
+            'rule_weights': dict(rule_weights or DEFAULT_RULE_WEIGHTS),
+            'threshold': threshold
+        }
+        self.__feedback_delay_days = feedback_delay_days
+        self.__high_amount = high_amount
+        self.__terminal_fraud_ratio = terminal_fraud_ratio
+        self.__customer_spike_ratio = customer_spike_ratio
+        self.__terminal_spike_ratio = terminal_spike_ratio
+        self.__min_history = min_history
+        self.__threshold = threshold
+
+        # Score of every combination of flags
+        weights = self.__config['rule_weights']
+        self.__scores = [sum(weights[name] for rule, name in RULE_NAMES.items() if flags & rule)
+                         for flags in range(2 ** len(RULE_NAMES))]
+        self.__scores_array = np.asarray(self.__scores)
+
+        self.__terminals = _RollingWindow(terminal_window_days, capacity)
+        # The fraud windows count the transactions and sum their labels
+        self.__terminal_frauds = _RollingWindow(terminal_fraud_window_days, capacity, feedback_delay_days)
+        self.__customers = _RollingWindow(customer_window_days, capacity)
+        self.__customer_frauds = _RollingWindow(customer_fraud_window_days, capacity)
+
+        self.__day = None
+        # Labels of the frauds not reported yet, from the day they are reported to their (day, customer, terminal)
+        self.__pending_frauds = {}
+
+    def get_day(self) -> int:
+        return self.__day
+
+    def __ensure_capacity(self, max_id: int):
+        capacity = len(self.__customers.total_counts)
+        if max_id >= capacity:
+            capacity = max(capacity * 2, max_id + 1)
+            for window in (self.__terminals, self.__terminal_frauds, self.__customers, self.__customer_frauds):
+                window.grow(capacity)
+
+    def __advance(self, day: int):
+        if self.__day is None:
+            self.__day = day
+            return
+        if day <= self.__day:
+            return
+
+        for window in (self.__terminals, self.__terminal_frauds, self.__customers, self.__customer_frauds):
+            window.advance(self.__day, day)
+        self.__day = day
+
+        # Report the labels that are known from the new day, if their transactions are still in the fraud windows
+        for report_day in sorted(report_day for report_day in self.__pending_frauds if report_day <= day):
+            for tx_days, customers, terminals in self.__pending_frauds.pop(report_day):
+                for fraud_window, entities in ((self.__terminal_frauds, terminals),
+                                               (self.__customer_frauds, customers)):
+                    in_window = tx_days > day - fraud_window.n_days
+                    for tx_day in np.unique(tx_days[in_window]):
+                        same_day = in_window & (tx_days == tx_day)
+                        fraud_window.add_values(entities[same_day], int(tx_day), np.ones(int(same_day.sum())))
+
+    def score(self, customer_id: int, terminal_id: int, amount: float, tx_time_days: int,
+              fraudulent: bool = None) -> tuple[float, int]:
+        """
+        Score a transaction and add it to the state.
+
+        :param customer_id: Customer id.
+        :param terminal_id: Terminal id.
+        :param amount: Amount.
+        :param tx_time_days: Day of the transaction.
+        :param fraudulent: Label of the transaction, if known, it is reported feedback_delay_days days later.
+        :return: A tuple containing the score of the transaction and its flags, see get_rule_names.
+        """
+
+        if tx_time_days != self.__day:
+            self.__advance(tx_time_days)
+        day = self.__day
+        if customer_id >= len(self.__customers.total_counts) or terminal_id >= len(self.__customers.total_counts):
+            self.__ensure_capacity(max(customer_id, terminal_id))
+
+        customers = self.__customers
+        terminals = self.__terminals
+
+        flags = 0
+        if amount > self.__high_amount:
+            flags |= HIGH_AMOUNT
+        terminal_frauds = self.__terminal_frauds.total_sums[terminal_id]
+        if terminal_frauds > 0 and \
+                terminal_frauds >= self.__terminal_fraud_ratio * self.__terminal_frauds.labeled_counts[terminal_id]:
+            flags |= TERMINAL_COMPROMISED
+        if self.__customer_frauds.total_sums[customer_id] > 0:
+            flags |= CUSTOMER_COMPROMISED
+        customer_count = customers.total_counts[customer_id]
+        if customer_count >= self.__min_history and \
+                amount * customer_count > self.__customer_spike_ratio * customers.total_sums[customer_id]:
+            flags |= CUSTOMER_AMOUNT_SPIKE
+        terminal_count = terminals.total_counts[terminal_id]
+        if terminal_count >= self.__min_history and \
+                amount * terminal_count > self.__terminal_spike_ratio * terminals.total_sums[terminal_id]:
+            flags |= TERMINAL_AMOUNT_SPIKE
+
+        customers.add(customer_id, day, amount)
+        terminals.add(terminal_id, day, amount)
+        self.__terminal_frauds.add(terminal_id, day, 0.0)
+        if fraudulent:
+            self.__pending_frauds.setdefault(day + self.__feedback_delay_days, []).append(
+                (np.array([day]), np.array([customer_id]), np.array([terminal_id])))
+
+        return self.__scores[flags], flags
+
+    def score_many(self, customer_ids: np.ndarray, terminal_ids: np.ndarray, amounts: np.ndarray,
+                   tx_time_days: np.ndarray, fraudulent: np.ndarray = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Score a batch of transactions, in chronological order, and add them to the state, with the same results of
+        calling score on each of them. The transactions of each day are scored together with vectorized operations.
+
+        :param customer_ids: Customer ids.
+        :param terminal_ids: Terminal ids.
+        :param amounts: Amounts.
+        :param tx_time_days: Days of the transactions.
+        :param fraudulent: Labels of the transactions, if known.
+        :return: A tuple containing the arrays of the scores and of the flags of the transactions.
+        """
+
+        customer_ids = np.asarray(customer_ids, dtype=np.int64)
+        terminal_ids = np.asarray(terminal_ids, dtype=np.int64)
+        amounts = np.asarray(amounts, dtype=np.float64)
+        # Late transactions are counted in the current day
+        days = np.maximum.accumulate(np.asarray(tx_time_days, dtype=np.int64))
+        if self.__day is not None:
+            days = np.maximum(days, self.__day)
+        flags = np.zeros(len(amounts), dtype=np.int64)
+        if len(amounts) == 0:
+            return np.zeros(0), flags
+        self.__ensure_capacity(int(max(customer_ids.max(), terminal_ids.max())))
+
+        day_starts = np.flatnonzero(np.diff(days, prepend=days[0] - 1))
+        for start, end in zip(day_starts, np.append(day_starts[1:], len(days))):
+            day = int(days[start])
+            self.__advance(day)
+            customers = customer_ids[start:end]
+            terminals = terminal_ids[start:end]
+            day_amounts = amounts[start:end]
+
+            # State before each transaction: the window plus the previous transactions of the same day
+            customer_counts = self.__customers.total_counts[customers] + _exclusive_group_cumsum(
+                customers, np.ones(end - start, dtype=np.int64))
+            customer_sums = self.__customers.total_sums[customers] + _exclusive_group_cumsum(customers, day_amounts)
+            terminal_counts = self.__terminals.total_counts[terminals] + _exclusive_group_cumsum(
+                terminals, np.ones(end - start, dtype=np.int64))
+            terminal_sums = self.__terminals.total_sums[terminals] + _exclusive_group_cumsum(terminals, day_amounts)
+            terminal_frauds = self.__terminal_frauds.total_sums[terminals]
+
+            flags[start:end] = (
+                np.where(day_amounts > self.__high_amount, HIGH_AMOUNT, 0) |
+                np.where((terminal_frauds > 0) & (terminal_frauds >= self.__terminal_fraud_ratio *
+                                                  self.__terminal_frauds.labeled_counts[terminals]),
+                         TERMINAL_COMPROMISED, 0) |
+                np.where(self.__customer_frauds.total_sums[customers] > 0, CUSTOMER_COMPROMISED, 0) |
+                np.where((customer_counts >= self.__min_history) &
+                         (day_amounts * customer_counts > self.__customer_spike_ratio * customer_sums),
+                         CUSTOMER_AMOUNT_SPIKE, 0) |
+                np.where((terminal_counts >= self.__min_history) &
+                         (day_amounts * terminal_counts > self.__terminal_spike_ratio * terminal_sums),
+                         TERMINAL_AMOUNT_SPIKE, 0))
+
+            self.__customers.add_many(customers, day, day_amounts)
+            self.__terminals.add_many(terminals, day, day_amounts)
+            self.__terminal_frauds.add_many(terminals, day, np.zeros(end - start))
+            if fraudulent is not None:
+                frauds = np.flatnonzero(np.asarray(fraudulent[start:end], dtype=bool))
+                if len(frauds) > 0:
+                    self.__pending_frauds.setdefault(day + self.__feedback_delay_days, []).append(
+                        (np.full(len(frauds), day), customers[frauds], terminals[frauds]))
+
+        return self.__scores_array[flags], flags
+
+    def is_fraudulent(self, score):
+        """
+        :param score: Score of a transaction, or array of scores.
+        :return: Whether the transactions are flagged as fraudulent.
+        """
+
+        return score >= self.__threshold
+
+    def checkpoint(self, path: str):
+        """
+        Save the state of the scorer, with its configuration, in a compressed NumPy archive.
+
+        :param path: Output file path, written as given, without the .npz suffix added by NumPy to file names.
+        """
+
+        pending = [(report_day, tx_days, customers, terminals)
+                   for report_day, reports in self.__pending_frauds.items()
+                   for tx_days, customers, terminals in reports]
+        with open(path, 'wb') as f:
+            np.savez_compressed(
+                f,
+                config=np.array(json.dumps(self.__config)),
+                day=np.array(-1 if self.__day is None else self.__day),
+                pending_report_days=np.concatenate([np.full(len(tx_days), report_day)
+                                                    for report_day, tx_days, _, _ in pending] or [np.zeros(0, int)]),
+                pending_tx_days=np.concatenate([tx_days for _, tx_days, _, _ in pending] or [np.zeros(0, int)]),
+                pending_customers=np.concatenate([customers for _, _, customers, _ in pending] or [np.zeros(0, int)]),
+                pending_terminals=np.concatenate([terminals for _, _, _, terminals in pending] or [np.zeros(0, int)]),
+                **self.__terminals.to_arrays('terminals'),
+                **self.__terminal_frauds.to_arrays('terminal_frauds'),
+                **self.__customers.to_arrays('customers'),
+                **self.__customer_frauds.to_arrays('customer_frauds'))
+
+    @staticmethod
+    def restore(path: str) -> 'StreamingFraudScorer':
+        """
+        Restore a scorer saved with checkpoint, it continues from the same state.
+
+        :param path: Path of the checkpoint.
+        :return: The restored scorer.
+        """
+
+        with np.load(path) as arrays:
+            scorer = StreamingFraudScorer(**json.loads(str(arrays['config'])))
+            scorer.__day = None if int(arrays['day']) < 0 else int(arrays['day'])
+            scorer.__terminals.from_arrays(arrays, 'terminals')
+            scorer.__terminal_frauds.from_arrays(arrays, 'terminal_frauds')
+            scorer.__customers.from_arrays(arrays, 'customers')
+            scorer.__customer_frauds.from_arrays(arrays, 'customer_frauds')
+
+            report_days = arrays['pending_report_days']
+            for report_day in np.unique(report_days):
+                same_day = report_days == report_day
+                scorer.__pending_frauds[int(report_day)] = [(arrays['pending_tx_days'][same_day],
+                                                             arrays['pending_customers'][same_day],
+                                                             arrays['pending_terminals'][same_day])]
+
+        return scorer
+
+
+def replay_transactions(dataset_path: str, scorer: StreamingFraudScorer = None, chunk_size: int = 100000,
+                        batch: bool = True) -> pd.DataFrame:
+    """
+    Replay the transactions of a generated dataset through a scorer in chronological order, reporting their labels,
+    and print the throughput and the precision and recall of the flagged transactions.
+
+    :param dataset_path: Directory of the generated dataset.
+    :param scorer: Scorer, a new one with the default configuration if None.
+    :param chunk_size: Number of transactions read at a time.
+    :param batch: If True, each chunk is scored with score_many, otherwise the transactions are scored one at a time.
+    :return: DataFrame with TRANSACTION_ID, TX_FRAUD, SCORE and FLAGS of every transaction.
+    """
+
+    scorer = scorer or StreamingFraudScorer()
+
+    results = []
+    scoring_time = 0.0
+    for chunk in dataset_io.iter_dataset_table(dataset_path, 'transactions', chunk_size=chunk_size):
+        customer_ids = chunk.CUSTOMER_ID.values
+        terminal_ids = chunk.TERMINAL_ID.values
+        amounts = chunk.TX_AMOUNT.values.astype(np.float64)
+        days = chunk.TX_TIME_DAYS.values
+        frauds = chunk.TX_FRAUD.values == 1
+
+        start_time = time.time()
+        if batch:
+            scores, flags = scorer.score_many(customer_ids, terminal_ids, amounts, days, frauds)
+        else:
+            scored = [scorer.score(customer_id, terminal_id, amount, day, fraud) for customer_id, terminal_id, amount,
+                      day, fraud in zip(customer_ids.tolist(), terminal_ids.tolist(), amounts.tolist(),
+                                        days.tolist(), frauds.tolist())]
+            scores = np.array([score for score, _ in scored], dtype=np.float64)
+            flags = np.array([flag for _, flag in scored], dtype=np.int64)
+        scoring_time += time.time() - start_time
+
+        results.append(pd.DataFrame({'TRANSACTION_ID': chunk.TRANSACTION_ID.values, 'TX_FRAUD': chunk.TX_FRAUD.values,
+                                     'SCORE': scores, 'FLAGS': flags}))
+
+    result = pd.concat(results, ignore_index=True)
+    flagged = scorer.is_fraudulent(result.SCORE.values)
+    frauds = result.TX_FRAUD.values == 1
+    true_positives = int((flagged & frauds).sum())
+    print(f"Time to score {len(result)} transactions: {scoring_time:.3f}s "
+          f"({scoring_time / max(len(result), 1) * 1e6:.2f}us per transaction)")
+    print(f"Precision: {true_positives / max(int(flagged.sum()), 1):.3f}, "
+          f"recall: {true_positives / max(int(frauds.sum()), 1):.3f}")
+
+    return result
@@ -1,11 +1,22 @@
 import os
 import time
+from concurrent.futures import ProcessPoolExecutor
 
+import numpy as np
+import pandas as pd
+
+import script.bulk_import as bulk_import
 import script.data_simulator as data_simulator
+import script.dataset_io as dataset_io
+import script.schema as schema
+import script.shared_terminals as shared_terminals
+from script.spatial_index import csr_to_lists
 
 
 class Generator:
-    def __init__(self, n_customers: int, n_terminals: int, start_date: str, r: int):
+    def __init__(self, n_customers: int, n_terminals: int, start_date: str, r: int,
+                 vectorized: bool = False, seeding: str = 'legacy', n_workers: int = 1, compact_dtypes: bool = False,
+                 enrich: bool = False):
         """
         A class to handle datasets generations.
 
@@ -14,45 +25,100 @@ class Generator:
         :param start_date: Starting date of the transactions that will be generated.
         :param r: Radius within which terminals must be positioned relative to a customer's
             coordinates to be considered for transactions.
+        :param vectorized: If True, the vectorized generation functions are used instead of the loop based ones.
+        :param seeding: Seeding of the vectorized profiles generation, 'legacy' reproduces the output of the loop
+            based functions, 'generator' uses the faster np.random.Generator. The vectorized transactions are always
+            drawn from np.random.Generator instances with a fixed seed.
+        :param n_workers: Number of processes used to generate the transactions. With more than one worker the
+            customers are split in shards generated in parallel, the result does not depend on the number of workers.
+        :param compact_dtypes: If True, the compact dtypes of script.schema are applied to the tables as soon as they
+            are generated, and the available terminals are only kept in CSR form instead of a column of lists.
+        :param enrich: If True, the transactions are generated with the extension of operation d.i, in the
+            TX_PERIOD_OF_DAY, TX_PRODUCT_TYPE and TX_SECURITY_FEELING columns, which the Loader sets when it creates
+            the transactions.
         """
 
         self.__n_customers = n_customers
         self.__n_terminals = n_terminals
         self.__start_date = start_date
         self.__r = r
+        self.__vectorized = vectorized
+        self.__seeding = seeding
+        self.__n_workers = n_workers
+        self.__compact_dtypes = compact_dtypes
+        self.__enrich = enrich
 
-    def __create_dataset(self, nb_days: int):
+    def __create_profiles(self):
         """
-        Generate a synthetic dataset including customer profiles, terminal profiles, and transaction data over a
-        specified number of days.
+        Generate the customer profiles and the terminal profiles, and associate to each customer the terminals within
+        the radius r.
 
-        :param nb_days: Number of days for which transactions will be simulated.
-        :return: A tuple containing customer_profiles_table, terminal_profiles_table and transactions_df.
+        :return: A tuple containing customer_profiles_table, terminal_profiles_table and the available terminals of
+            each customer in CSR form (terminals_offsets, terminals_indices).
         """
 
         start_time = time.time()
-        customer_profiles_table = data_simulator.generate_customer_profiles_table(self.__n_customers, random_state=0)
+        if self.__vectorized:
+            customer_profiles_table = data_simulator.generate_customer_profiles_table_vectorized(
+                self.__n_customers, random_state=0, seeding=self.__seeding)
+        else:
+            customer_profiles_table = data_simulator.generate_customer_profiles_table(
+                self.__n_customers, random_state=0)
         print(f"Time to generate customer profiles table: {time.time() - start_time:.3f}s")
 
         start_time = time.time()
-        terminal_profiles_table = data_simulator.generate_terminal_profiles_table(self.__n_terminals, random_state=1)
+        if self.__vectorized:
+            terminal_profiles_table = data_simulator.generate_terminal_profiles_table_vectorized(
+                self.__n_terminals, random_state=1, seeding=self.__seeding)
+        else:
+            terminal_profiles_table = data_simulator.generate_terminal_profiles_table(
+                self.__n_terminals, random_state=1)
         print(f"Time to generate terminal profiles table: {time.time() - start_time:.3f}s")
 
         start_time = time.time()
+        x_y_customers = customer_profiles_table[['x_customer_id', 'y_customer_id']].values.astype(float)
         x_y_terminals = terminal_profiles_table[['x_terminal_id', 'y_terminal_id']].values.astype(float)
-        customer_profiles_table['available_terminals'] = customer_profiles_table.apply(
-            lambda x: data_simulator.get_list_terminals_within_radius(x, x_y_terminals=x_y_terminals, r=self.__r), axis=1)
-        customer_profiles_table['nb_terminals'] = customer_profiles_table.available_terminals.apply(len)
+        terminals_offsets, terminals_indices = data_simulator.get_terminals_within_radius_csr(
+            x_y_customers, x_y_terminals, r=self.__r)
+        if self.__compact_dtypes:
+            terminals_indices = terminals_indices.astype(schema.TERMINALS_INDICES_DTYPE)
+        else:
+            customer_profiles_table['available_terminals'] = csr_to_lists(terminals_offsets, terminals_indices)
+        customer_profiles_table['nb_terminals'] = np.diff(terminals_offsets)
         print(f"Time to associate terminals to customers: {time.time() - start_time:.3f}s")
 
+        if self.__compact_dtypes:
+            customer_profiles_table = schema.apply_schema(customer_profiles_table, schema.CUSTOMER_PROFILES_DTYPES)
+            terminal_profiles_table = schema.apply_schema(terminal_profiles_table, schema.TERMINAL_PROFILES_DTYPES)
+
+        return customer_profiles_table, terminal_profiles_table, terminals_offsets, terminals_indices
+
+    def __create_dataset(self, nb_days: int):
+        """
+        Generate a synthetic dataset including customer profiles, terminal profiles, and transaction data over a
+        specified number of days.
+
+        :param nb_days: Number of days for which transactions will be simulated.
+        :return: A tuple containing customer_profiles_table, terminal_profiles_table, transactions_df and the
+            available terminals of each customer in CSR form (terminals_offsets, terminals_indices).
+        """
+
+        (customer_profiles_table, terminal_profiles_table,
+         terminals_offsets, terminals_indices) = self.__create_profiles()
+
         start_time = time.time()
-        transactions_df = (customer_profiles_table.groupby('CUSTOMER_ID').apply(
-            lambda x: data_simulator.generate_transactions_table(
-                x.iloc[0], self.__start_date, nb_days)).reset_index(drop=True))
+        if self.__n_workers > 1:
+            transactions_df = self.__generate_transactions_parallel(
+                customer_profiles_table, terminals_offsets, terminals_indices, nb_days)
+        else:
+            transactions_df = _generate_transactions_shard(
+                customer_profiles_table, terminals_offsets, terminals_indices, self.__start_date, nb_days, 0,
+                self.__vectorized, self.__compact_dtypes)
         print(f"Time to generate transactions: {time.time() - start_time:.3f}s")
 
-        # Sort transactions chronologically
-        transactions_df = transactions_df.sort_values('TX_DATETIME')
+        # Sort transactions chronologically (with a stable sort for the vectorized generation, so that transactions
+        # with the same datetime keep the generation order)
+        transactions_df = transactions_df.sort_values('TX_DATETIME', kind='stable' if self.__vectorized else 'quicksort')
         # Reset indices, starting from 0
         transactions_df.reset_index(inplace=True, drop=True)
         transactions_df.reset_index(inplace=True)
@@ -61,16 +127,69 @@ class Generator:
 
         # Adds fraudulent transactions to the dataset
         transactions_df = data_simulator.add_frauds(customer_profiles_table, terminal_profiles_table, transactions_df)
+        if self.__enrich:
+            transactions_df = _add_transactions_extension(transactions_df)
+        if self.__compact_dtypes:
+            transactions_df = schema.apply_schema(transactions_df, schema.TRANSACTIONS_DTYPES)
+
+        return customer_profiles_table, terminal_profiles_table, transactions_df, terminals_offsets, terminals_indices
+
+    def __generate_transactions_parallel(self, customer_profiles_table, terminals_offsets, terminals_indices,
+                                         nb_days: int, first_day: int = 0):
+        """
+        Generate the transactions of all customers splitting them in shards generated by a pool of processes. The
+        shards are merged in customers order, so the result is the same of a sequential generation.
+
+        :param customer_profiles_table: Customer profiles table.
+        :param terminals_offsets: Offsets of the available terminals of each customer in CSR form.
+        :param terminals_indices: Indices of the available terminals of each customer in CSR form.
+        :param nb_days: Number of days for which transactions will be simulated.
+        :param first_day: First simulated day, only supported by the vectorized generation.
+        :return: The transactions of all customers, not sorted.
+        """
+
+        # About 4 shards per worker to balance the load, the vectorized generation needs shards aligned to its
+        # customers blocks to keep its output independent of the sharding
+        shard_size = -(-len(customer_profiles_table) // (self.__n_workers * 4))
+        if self.__vectorized:
+            block_size = data_simulator.TRANSACTIONS_CUSTOMERS_BLOCK_SIZE
+            shard_size = -(-shard_size // block_size) * block_size
+        shard_size = max(shard_size, 1)
 
-        return customer_profiles_table, terminal_profiles_table, transactions_df
+        shards_args = []
+        for start in range(0, len(customer_profiles_table), shard_size):
+            end = min(start + shard_size, len(customer_profiles_table))
+            shards_args.append((
+                customer_profiles_table.iloc[start:end],
+                terminals_offsets[start:end + 1] - terminals_offsets[start],
+                terminals_indices[terminals_offsets[start]:terminals_offsets[end]],
+                self.__start_date,
+                nb_days,
+                first_day,
+                self.__vectorized,
+                self.__compact_dtypes
+            ))
 
-    def generate(self, dataset_output_path: str, nb_days: int, dataset_name: str = None) -> float:
+        with ProcessPoolExecutor(max_workers=self.__n_workers) as executor:
+            shards = list(executor.map(_generate_transactions_shard, *zip(*shards_args)))
+
+        columns = ['TX_DATETIME', 'CUSTOMER_ID', 'TERMINAL_ID', 'TX_AMOUNT', 'TX_TIME_SECONDS', 'TX_TIME_DAYS']
+        shards = [shard[columns] for shard in shards if len(shard) > 0]
+        if not shards:
+            return pd.DataFrame(columns=columns)
+
+        return pd.concat(shards, ignore_index=True)
+
+    def generate(self, dataset_output_path: str, nb_days: int, dataset_name: str = None,
+                 output_format: str = 'csv') -> float:
         """
         Generates a dataset for a specific number of days and saves it to disk at the specified path.
 
         :param dataset_output_path: Output path where the dataset will be stored.
         :param nb_days: Number of days to generate data for.
         :param dataset_name: Dataset name. If not specified, it will be based on the number of days.
+        :param output_format: 'csv' to write three CSV files, 'parquet' to write Parquet files with compact dtypes
+            and transactions partitioned by day ranges.
         :return: Generations execution time in seconds.
         """
 
@@ -78,21 +197,243 @@ class Generator:
             dataset_name = f'nb_days_{nb_days}'
 
         start_time = time.time()
-        customer_profiles, terminal_profiles, transactions_df = self.__create_dataset(nb_days)
+        (customer_profiles, terminal_profiles, transactions_df,
+         terminals_offsets, terminals_indices) = self.__create_dataset(nb_days)
         generation_time = time.time() - start_time
 
         dataset_subdir = os.path.join(dataset_output_path, dataset_name)
         if not os.path.exists(dataset_subdir):
             os.makedirs(dataset_subdir)
 
-        customer_profiles_path = os.path.join(dataset_subdir, "customer_profiles.csv")
-        terminal_profiles_path = os.path.join(dataset_subdir, "terminal_profiles.csv")
-        transactions_path = os.path.join(dataset_subdir, "transactions.csv")
-
-        customer_profiles.to_csv(customer_profiles_path, index=False)
-        terminal_profiles.to_csv(terminal_profiles_path, index=False)
-        transactions_df.to_csv(transactions_path, index=False)
+        dataset_io.write_customer_profiles(
+            dataset_subdir, customer_profiles, output_format, terminals_offsets, terminals_indices)
+        dataset_io.write_terminal_profiles(dataset_subdir, terminal_profiles, output_format)
+        dataset_io.write_transactions(dataset_subdir, transactions_df, output_format)
 
         print(f"Time to generate and save dataset: {time.time() - start_time:.3f}s")
 
         return generation_time
+
+    @staticmethod
+    def export_bulk_import(dataset_output_path: str, dataset_name: str) -> float:
+        """
+        Export a generated dataset as the node and relationship files of 'neo4j-admin database import', in the
+        neo4j_import subdirectory of the dataset.
+
+        :param dataset_output_path: Output path where the dataset is stored.
+        :param dataset_name: Dataset name.
+        :return: Export execution time in seconds.
+        """
+
+        start_time = time.time()
+        rows = bulk_import.write_bulk_import_files(os.path.join(dataset_output_path, dataset_name))
+        export_time = time.time() - start_time
+
+        for file_name, nb_rows in rows.items():
+            print(f"Rows exported to {file_name}: {nb_rows}")
+        print(f"Time to export dataset for bulk import: {export_time:.3f}s")
+
+        return export_time
+
+    @staticmethod
+    def export_shared_terminals(dataset_output_path: str, dataset_name: str, min_shared_terminals: int = 3) -> float:
+        """
+        Export the customer pairs of a generated dataset that share at least min_shared_terminals terminals, as the
+        shared_terminals side table of the dataset loaded by Loader.load_shared_terminals.
+
+        :param dataset_output_path: Output path where the dataset is stored.
+        :param dataset_name: Dataset name.
+        :param min_shared_terminals: Minimum number of shared terminals of the pairs exported.
+        :return: Export execution time in seconds.
+        """
+
+        start_time = time.time()
+        nb_pairs = shared_terminals.write_shared_terminals(os.path.join(dataset_output_path, dataset_name),
+                                                           min_shared_terminals)
+        export_time = time.time() - start_time
+
+        print(f"Customer pairs with at least {min_shared_terminals} shared terminals: {nb_pairs}")
+        print(f"Time to export shared terminals: {export_time:.3f}s")
+
+        return export_time
+
+    def generate_streaming(self, dataset_output_path: str, nb_days: int, dataset_name: str = None,
+                           chunk_days: int = 128, output_format: str = 'csv') -> float:
+        """
+        Generates a dataset like generate, but producing the transactions in day ordered chunks that are labelled
+        and appended to the transactions file one after the other, so that the peak memory does not depend on the
+        number of days. Fraud windows only look 14 or 28 days forward, so a chunk can be labelled as soon as the
+        following 13 days have been generated: those days are kept in memory and labelled with the next chunk.
+        The output is the same of generate with the vectorized generation.
+
+        :param dataset_output_path: Output path where the dataset will be stored.
+        :param nb_days: Number of days to generate data for.
+        :param dataset_name: Dataset name. If not specified, it will be based on the number of days.
+        :param chunk_days: Number of days generated for each chunk, rounded up to a multiple of the days block size
+            of the vectorized generation.
+        :param output_format: 'csv' or 'parquet', as in generate.
+        :return: Generations execution time in seconds.
+        """
+
+        if not self.__vectorized:
+            raise ValueError("Streaming generation requires the vectorized generation")
+
+        if not dataset_name:
+            dataset_name = f'nb_days_{nb_days}'
+
+        start_time = time.time()
+
+        dataset_subdir = os.path.join(dataset_output_path, dataset_name)
+        if not os.path.exists(dataset_subdir):
+            os.makedirs(dataset_subdir)
+
+        (customer_profiles_table, terminal_profiles_table,
+         terminals_offsets, terminals_indices) = self.__create_profiles()
+        dataset_io.write_customer_profiles(
+            dataset_subdir, customer_profiles_table, output_format, terminals_offsets, terminals_indices)
+        dataset_io.write_terminal_profiles(dataset_subdir, terminal_profiles_table, output_format)
+
+        days_block_size = data_simulator.TRANSACTIONS_DAYS_BLOCK_SIZE
+        chunk_days = max(-(-chunk_days // days_block_size) * days_block_size, days_block_size)
+
+        # Transactions generated but not yet written, the scenario 3 windows starting before labelled_until_day
+        # have already been applied to them
+        pending_df = None
+        next_transaction_id = 0
+        labelled_until_day = 0
+        max_day = -1
+        for part, first_day in enumerate(range(0, nb_days, chunk_days)):
+            last_day = min(first_day + chunk_days, nb_days)
+
+            chunk_start_time = time.time()
+            if self.__n_workers > 1:
+                chunk_df = self.__generate_transactions_parallel(
+                    customer_profiles_table, terminals_offsets, terminals_indices, last_day, first_day)
+            else:
+                chunk_df = _generate_transactions_shard(
+                    customer_profiles_table, terminals_offsets, terminals_indices, self.__start_date, last_day,
+                    first_day, self.__vectorized, self.__compact_dtypes)
+
+            chunk_df = chunk_df.sort_values('TX_DATETIME', kind='stable').reset_index(drop=True)
+            chunk_df.insert(0, 'TRANSACTION_ID', np.arange(next_transaction_id, next_transaction_id + len(chunk_df)))
+            next_transaction_id += len(chunk_df)
+
+            # Scenario 1 is based on the amounts before the scenario 3 ones
+            chunk_df['SCENARIO_1'] = chunk_df.TX_AMOUNT.values > 220
+            chunk_df['NB_SCENARIO_3'] = 0
+            pending_df = chunk_df if pending_df is None else pd.concat([pending_df, chunk_df], ignore_index=True)
+            if len(chunk_df) > 0:
+                max_day = max(max_day, int(chunk_df.TX_TIME_DAYS.max()))
+
+            # Like add_frauds, windows start in the days before the last day with transactions
+            if last_day == nb_days:
+                new_labelled_until_day = max_day
+            else:
+                new_labelled_until_day = max(min(last_day - 13, max_day), labelled_until_day)
+
+            compromised_customers = data_simulator.get_compromised_customers_table(
+                customer_profiles_table, labelled_until_day, new_labelled_until_day)
+            nb_frauds = data_simulator.get_scenario_3_frauds(
+                pending_df.CUSTOMER_ID.values, pending_df.TX_TIME_DAYS.values, compromised_customers)
+            tx_amount = pending_df.TX_AMOUNT.values.copy()
+            for nb_times in range(1, nb_frauds.max(initial=0) + 1):
+                tx_amount[nb_frauds >= nb_times] *= 5
+            pending_df['TX_AMOUNT'] = tx_amount
+            pending_df['NB_SCENARIO_3'] += nb_frauds
+            labelled_until_day = new_labelled_until_day
+
+            if last_day == nb_days:
+                ready = np.ones(len(pending_df), dtype=bool)
+            else:
+                ready = pending_df.TX_TIME_DAYS.values < labelled_until_day
+            ready_df = pending_df[ready]
+            pending_df = pending_df[~ready].reset_index(drop=True)
+
+            self.__write_transactions_chunk(
+                ready_df, terminal_profiles_table, max_day, dataset_subdir, output_format, part,
+                self.__compact_dtypes, self.__enrich)
+            print(f"Time to generate days [{first_day}, {last_day}): {time.time() - chunk_start_time:.3f}s")
+
+        generation_time = time.time() - start_time
+        print(f"Time to generate and save dataset: {generation_time:.3f}s")
+
+        return generation_time
+
+    @staticmethod
+    def __write_transactions_chunk(transactions_df, terminal_profiles_table, max_day: int, dataset_subdir: str,
+                                   output_format: str, part: int, compact_dtypes: bool, enrich: bool):
+        """
+        Set the fraud labels of a chunk of transactions whose scenario 3 windows have all been applied, and append
+        it to the transactions of the dataset.
+
+        :param transactions_df: Chunk of transactions, with the SCENARIO_1 and NB_SCENARIO_3 working columns.
+        :param terminal_profiles_table: Terminal profiles table.
+        :param max_day: Last day with transactions seen so far.
+        :param dataset_subdir: Dataset directory.
+        :param output_format: 'csv' or 'parquet'.
+        :param part: Index of the chunk.
+        :param compact_dtypes: If True, the compact dtypes are applied to the labels.
+        :param enrich: If True, the extension of operation d.i is added to the transactions.
+        """
+
+        tx_days = transactions_df.TX_TIME_DAYS.values
+        if len(transactions_df) > 0:
+            # Scenario 2 windows that can contain the transactions of the chunk
+            compromised_terminals = data_simulator.get_compromised_terminals_table(
+                terminal_profiles_table, max(int(tx_days.min()) - 27, 0), min(int(tx_days.max()) + 1, max_day))
+        else:
+            compromised_terminals = data_simulator.get_compromised_terminals_table(terminal_profiles_table, 0, 0)
+        scenario_2 = data_simulator.get_transactions_in_windows(
+            transactions_df.TERMINAL_ID.values, tx_days, compromised_terminals, 'TERMINAL_ID')
+
+        tx_fraud, tx_fraud_scenario = data_simulator.get_fraud_labels(
+            transactions_df.SCENARIO_1.values, scenario_2, transactions_df.NB_SCENARIO_3.values > 0)
+        transactions_df = transactions_df.drop(columns=['SCENARIO_1', 'NB_SCENARIO_3'])
+        transactions_df['TX_FRAUD'] = tx_fraud
+        transactions_df['TX_FRAUD_SCENARIO'] = tx_fraud_scenario
+        if enrich:
+            transactions_df = _add_transactions_extension(transactions_df)
+        if compact_dtypes:
+            transactions_df = schema.apply_schema(transactions_df, schema.TRANSACTIONS_DTYPES)
+
+        dataset_io.write_transactions(dataset_subdir, transactions_df, output_format, part)
+
+
+def _add_transactions_extension(transactions_df):
+    """
+    Add the extension of operation d.i to the transactions, computed from their ids and times.
+    """
+
+    period_of_day, product_type, security_feeling = data_simulator.get_transactions_extension(
+        transactions_df.TRANSACTION_ID.values, transactions_df.TX_TIME_SECONDS.values)
+
+    return transactions_df.assign(TX_PERIOD_OF_DAY=period_of_day, TX_PRODUCT_TYPE=product_type,
+                                  TX_SECURITY_FEELING=security_feeling)
+
+
+def _generate_transactions_shard(customer_profiles_table, terminals_offsets, terminals_indices, start_date: str,
+                                 nb_days: int, first_day: int, vectorized: bool, compact_dtypes: bool = False):
+    """
+    Generate the transactions of a shard of customers. It is a module level function so that it can be run in a
+    worker process.
+    """
+
+    if vectorized:
+        transactions_df = data_simulator.generate_transactions_table_batch(
+            customer_profiles_table, terminals_offsets, terminals_indices, start_date, nb_days, first_day=first_day)
+    else:
+        if 'available_terminals' not in customer_profiles_table.columns:
+            customer_profiles_table = customer_profiles_table.assign(
+                available_terminals=csr_to_lists(terminals_offsets, terminals_indices))
+        customer_transactions = [
+            data_simulator.generate_transactions_table(customer_profile, start_date, nb_days)
+            for _, customer_profile in customer_profiles_table.sort_values('CUSTOMER_ID', kind='stable').iterrows()]
+        # The customers without transactions have empty tables without TX_DATETIME, which must not determine the
+        # columns of the result
+        non_empty = [transactions for transactions in customer_transactions if len(transactions) > 0]
+        transactions_df = pd.concat(non_empty or customer_transactions[:1], ignore_index=True)
+
+    if compact_dtypes:
+        transactions_df = schema.apply_schema(transactions_df, schema.TRANSACTIONS_DTYPES)
+
+    return transactions_df
@@ -1,22 +1,154 @@
 import os
+import shlex
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
 
+import numpy as np
+import pandas as pd
+from neo4j.exceptions import Neo4jError
+
+import script.bulk_import as bulk_import
+import script.dataset_io as dataset_io
 from script.database import DatabaseInstance
 
+# Columns of the extension of operation d.i, present if the dataset was generated with it, mapped to the name of the
+# row key. The properties of the missing columns are null, so they are not set on the relationships.
+TRANSACTION_EXTENSION_COLUMNS = {
+    'TX_PERIOD_OF_DAY': 'period_of_day',
+    'TX_PRODUCT_TYPE': 'product_type',
+    'TX_SECURITY_FEELING': 'security_feeling'
+}
+
 
 class Loader:
-    def __init__(self, db: DatabaseInstance):
+    def __init__(self, db: DatabaseInstance, reset_strategy: str = 'single', reset_batch_size: int = 10000,
+                 spending_aggregates: bool = False, monthly_aggregates: bool = False, buying_friends: bool = False):
         """
         A class to handle datasets load in the database.
 
         :param db: Database instance.
+        :param reset_strategy: How the database is cleared before a load: 'single' deletes the whole graph in one
+            transaction, 'batched' deletes relationships and then nodes in bounded transactions, 'recreate' drops and
+            recreates the database (falling back to 'batched' if it is not permitted).
+        :param reset_batch_size: Number of relationships or nodes deleted in each transaction by the 'batched' reset.
+        :param spending_aggregates: If True, the SPENT_AT aggregates of the transactions of each customer on each
+            terminal are materialized at the end of every load, and kept updated by append_dataset.
+        :param monthly_aggregates: If True, the TerminalMonth aggregates of the transactions of each terminal in each
+            calendar month are materialized at the end of every load, and the months touched by append_dataset are
+            recomputed.
+        :param buying_friends: If True, the BUYING_FRIEND relationships of operation d.ii are materialized from the
+            SPENT_AT aggregates at the end of every load, and append_dataset updates them incrementally, adding and
+            removing only the ones of the customers sharing a terminal with the new transactions. It requires
+            spending_aggregates.
         """
 
+        if reset_strategy not in ('single', 'batched', 'recreate'):
+            raise ValueError(f"Unknown reset strategy '{reset_strategy}', expected 'single', 'batched' or 'recreate'")
+        if buying_friends and not spending_aggregates:
+            raise ValueError("The BUYING_FRIEND relationships are maintained from the SPENT_AT aggregates, "
+                             "buying_friends requires spending_aggregates")
+
         self.__db = db
+        self.__reset_strategy = reset_strategy
+        self.__reset_batch_size = reset_batch_size
+        self.__spending_aggregates = spending_aggregates
+        self.__monthly_aggregates = monthly_aggregates
+        self.__buying_friends = buying_friends
+        self.__stage_times = {}
+
+    def get_stage_times(self) -> dict[str, float]:
+        """
+        Get the execution time of each stage of the last load, e.g. 'load transactions', as printed during the load.
+
+        :return: Dictionary from stage name to execution time in seconds.
+        """
+
+        return dict(self.__stage_times)
+
+    def __print_stage_time(self, stage_name: str, stage_time: float):
+        self.__stage_times[stage_name] = self.__stage_times.get(stage_name, 0.0) + stage_time
+        print(f"Time to {stage_name}: {stage_time:.3f}s")
+
+    def __delete_in_batches(self, entity: str) -> float:
+        """
+        Delete all the relationships or all the nodes of the database in transactions of reset_batch_size entities,
+        in rounds of 100 transactions, reporting progress and throughput after each round.
+
+        :param entity: 'relationships' or 'nodes'.
+        :return: Execution time in seconds.
+        """
+
+        if entity == 'relationships':
+            count_query = "MATCH ()-[r]->() RETURN count(r) AS count"
+            delete_query = """
+            MATCH ()-[r]->()
+            WITH r LIMIT $limit
+            CALL (r) {
+                DELETE r
+            } IN TRANSACTIONS OF $batch_size ROWS
+            """
+        else:
+            count_query = "MATCH (n) RETURN count(n) AS count"
+            delete_query = """
+            MATCH (n)
+            WITH n LIMIT $limit
+            CALL (n) {
+                DETACH DELETE n
+            } IN TRANSACTIONS OF $batch_size ROWS
+            """
+
+        start_time = time.time()
+        with self.__db.get_session() as session:
+            total = session.run(count_query).single()["count"]
+            deleted = 0
+            while True:
+                counters = session.run(delete_query, limit=self.__reset_batch_size * 100,
+                                       batch_size=self.__reset_batch_size).consume().counters
+                round_deleted = counters.relationships_deleted if entity == 'relationships' else counters.nodes_deleted
+                if round_deleted == 0:
+                    break
+
+                deleted += round_deleted
+                elapsed = time.time() - start_time
+                print(f"Deleted {deleted}/{total} {entity} ({deleted / max(elapsed, 1e-9):.0f} {entity}/s)")
+
+        return time.time() - start_time
+
+    def __recreate_database(self) -> float:
+        query = """
+        CREATE OR REPLACE DATABASE $database WAIT
+        """
+
+        start_time = time.time()
+        with self.__db.get_session(database="system") as session:
+            session.run(query, database=self.__db.get_database()).consume()
+
+        return time.time() - start_time
 
     def __clear_database(self):
-        self.__db.execute_query("MATCH (n) DETACH DELETE n")
+        if self.__reset_strategy == 'recreate':
+            try:
+                recreate_time = self.__recreate_database()
+                self.__print_stage_time("recreate database", recreate_time)
+                return
+            except Neo4jError as e:
+                print(f"Cannot recreate database ({e.code}), deleting it in batches")
+
+        if self.__reset_strategy == 'single':
+            self.__db.execute_query("MATCH (n) DETACH DELETE n")
+        else:
+            relationships_time = self.__delete_in_batches('relationships')
+            self.__print_stage_time("delete relationships", relationships_time)
+            nodes_time = self.__delete_in_batches('nodes')
+            self.__print_stage_time("delete nodes", nodes_time)
+
         self.__db.execute_query("DROP INDEX customer_index IF EXISTS")
         self.__db.execute_query("DROP INDEX terminal_index IF EXISTS")
+        self.__db.execute_query("DROP INDEX transaction_datetime_index IF EXISTS")
+        self.__db.execute_query("DROP INDEX terminal_month_index IF EXISTS")
+        self.__db.execute_query("DROP CONSTRAINT customer_id_unique IF EXISTS")
+        self.__db.execute_query("DROP CONSTRAINT terminal_id_unique IF EXISTS")
 
     def __load_customers(self, customer_profiles_path: str) -> float:
         query = """
@@ -64,18 +196,28 @@ class Loader:
 
         return self.__db.execute_query(query)
 
+    def __load_transaction_datetime_index(self) -> float:
+        query = """
+        CREATE INDEX transaction_datetime_index IF NOT EXISTS FOR ()-[tx:TRANSACTION]-() ON (tx.datetime)
+        """
+
+        return self.__db.execute_query(query)
+
     def __load_transactions(self, transactions_path: str) -> float:
         query = """
         LOAD CSV WITH HEADERS FROM $file_path AS row
         CALL (row) {
             MATCH (c:Customer {customer_id: toInteger(row.CUSTOMER_ID)})
             MATCH (t:Terminal {terminal_id: toInteger(row.TERMINAL_ID)})
-            MERGE (c)-[:TRANSACTION {
+            MERGE (c)-[tx:TRANSACTION {
                 transaction_id: toInteger(row.TRANSACTION_ID),
                 datetime: datetime(replace(row.TX_DATETIME, ' ', 'T')),
                 amount: toFloat(row.TX_AMOUNT),
                 fraudulent: toInteger(row.TX_FRAUD) = 1
             }]->(t)
+            SET tx.period_of_day = COALESCE(row.TX_PERIOD_OF_DAY, tx.period_of_day),
+                tx.product_type = COALESCE(row.TX_PRODUCT_TYPE, tx.product_type),
+                tx.security_feeling = COALESCE(toInteger(row.TX_SECURITY_FEELING), tx.security_feeling)
         } IN TRANSACTIONS OF 10000 ROWS
         """
 
@@ -96,14 +238,116 @@ class Loader:
 
         return self.__db.execute_query(query, file_path=f"file:///{customer_profiles_path.replace(os.sep, '/')}")
 
-    def load_dataset(self, dataset_path: str) -> float:
+    def __load_constraints(self) -> float:
+        customer_query = """
+        CREATE CONSTRAINT customer_id_unique IF NOT EXISTS FOR (c:Customer) REQUIRE c.customer_id IS UNIQUE
+        """
+
+        terminal_query = """
+        CREATE CONSTRAINT terminal_id_unique IF NOT EXISTS FOR (t:Terminal) REQUIRE t.terminal_id IS UNIQUE
+        """
+
+        return self.__db.execute_query(customer_query) + self.__db.execute_query(terminal_query)
+
+    def __create_terminals(self, terminal_profiles_path: str) -> float:
+        query = """
+        LOAD CSV WITH HEADERS FROM $file_path AS row
+        CALL (row) {
+            CREATE (:Terminal {
+                terminal_id: toInteger(row.TERMINAL_ID),
+                x_location: toFloat(row.x_terminal_id),
+                y_location: toFloat(row.y_terminal_id)
+            })
+        } IN TRANSACTIONS OF 10000 ROWS
+        """
+
+        return self.__db.execute_query(query, file_path=f"file:///{terminal_profiles_path.replace(os.sep, '/')}")
+
+    def __create_customers_with_available_terminals(self, customer_profiles_path: str) -> float:
+        query = """
+        LOAD CSV WITH HEADERS FROM $file_path AS row
+        CALL (row) {
+            CREATE (c:Customer {
+                customer_id: toInteger(row.CUSTOMER_ID),
+                x_location: toFloat(row.x_customer_id),
+                y_location: toFloat(row.y_customer_id),
+                mean_amount: toFloat(row.mean_amount),
+                std_amount: toFloat(row.std_amount),
+                mean_nb_tx_per_day: toFloat(row.mean_nb_tx_per_day),
+                nb_terminals: toInteger(row.nb_terminals)
+            })
+            WITH c, apoc.convert.fromJsonList(row.available_terminals) AS available_terminals
+            UNWIND available_terminals AS terminal_id
+            MATCH (t:Terminal {terminal_id: terminal_id})
+            CREATE (c)-[:ACCESS_TO]->(t)
+        } IN TRANSACTIONS OF 10000 ROWS
+        """
+
+        return self.__db.execute_query(query, file_path=f"file:///{customer_profiles_path.replace(os.sep, '/')}")
+
+    def __create_transactions(self, transactions_path: str) -> float:
+        query = """
+        LOAD CSV WITH HEADERS FROM $file_path AS row
+        CALL (row) {
+            MATCH (c:Customer {customer_id: toInteger(row.CUSTOMER_ID)})
+            MATCH (t:Terminal {terminal_id: toInteger(row.TERMINAL_ID)})
+            CREATE (c)-[:TRANSACTION {
+                transaction_id: toInteger(row.TRANSACTION_ID),
+                datetime: datetime(replace(row.TX_DATETIME, ' ', 'T')),
+                amount: toFloat(row.TX_AMOUNT),
+                fraudulent: toInteger(row.TX_FRAUD) = 1,
+                period_of_day: row.TX_PERIOD_OF_DAY,
+                product_type: row.TX_PRODUCT_TYPE,
+                security_feeling: toInteger(row.TX_SECURITY_FEELING)
+            }]->(t)
+        } IN TRANSACTIONS OF 10000 ROWS
+        """
+
+        return self.__db.execute_query(query, file_path=f"file:///{transactions_path.replace(os.sep, '/')}")
+
+    def __load_dataset_fresh(self, customer_profiles_path: str, terminal_profiles_path: str,
+                             transactions_path: str) -> float:
+        """
+        Load the dataset in the just cleared database: the uniqueness constraints on customer_id and terminal_id
+        are created first, so that every lookup is an index seek, nodes and relationships are created with CREATE
+        instead of MERGE, and the ACCESS_TO relationships are created in the same pass that creates the customers.
+        The transactions are instead created in a pass of their own over transactions.csv: the file is sorted by
+        datetime rather than by customer, so creating them in the pass of their customers would require either reading
+        the file once per customer or collecting all of it in memory to group it. Each row of that pass costs two
+        constraint-backed seeks and a CREATE, so the loading time grows linearly with the size of the dataset.
+
+        :return: Loading execution time in seconds.
+        """
+
+        constraints_time = self.__load_constraints()
+        self.__print_stage_time("load constraints", constraints_time)
+
+        terminal_time = self.__create_terminals(terminal_profiles_path)
+        self.__print_stage_time("load terminal profiles table", terminal_time)
+
+        customer_time = self.__create_customers_with_available_terminals(customer_profiles_path)
+        self.__print_stage_time("load customer profiles table and available terminal", customer_time)
+
+        transactions_time = self.__create_transactions(transactions_path)
+        self.__print_stage_time("load transactions", transactions_time)
+
+        transaction_datetime_index_time = self.__load_transaction_datetime_index()
+        self.__print_stage_time("load transaction datetime index", transaction_datetime_index_time)
+
+        return constraints_time + terminal_time + customer_time + transactions_time + transaction_datetime_index_time
+
+    def load_dataset(self, dataset_path: str, fresh: bool = False) -> float:
         """
         Load the datasets located in the specified dataset_path in the database.
 
         :param dataset_path: path where the datasets to load is stored.
+        :param fresh: If True, the dataset is loaded with uniqueness constraints created before the data and CREATE
+            instead of MERGE, which is correct because the database has just been cleared.
         :return: Loading execution time in seconds.
         """
 
+        self.__stage_times = {}
+
         customer_profiles_path = os.path.join(dataset_path, "customer_profiles.csv")
         terminal_profiles_path = os.path.join(dataset_path, "terminal_profiles.csv")
         transactions_path = os.path.join(dataset_path, "transactions.csv")
@@ -111,27 +355,799 @@ class Loader:
         # Delete all existing nodes and relationships in the database
         self.__clear_database()
 
+        if fresh:
+            loading_time = self.__load_dataset_fresh(customer_profiles_path, terminal_profiles_path, transactions_path)
+            return (loading_time +
+                    self.__load_spending_aggregates() +
+                    self.__load_buying_friends() +
+                    self.__load_monthly_aggregates())
+
         customer_time = self.__load_customers(customer_profiles_path)
-        print(f"Time to load customer profiles table: {customer_time:.3f}s")
+        self.__print_stage_time("load customer profiles table", customer_time)
 
         terminal_time = self.__load_terminals(terminal_profiles_path)
-        print(f"Time to load terminal profiles table: {terminal_time:.3f}s")
+        self.__print_stage_time("load terminal profiles table", terminal_time)
 
         customer_index_time = self.__load_customer_index()
-        print(f"Time to load customer index: {customer_index_time:.3f}s")
+        self.__print_stage_time("load customer index", customer_index_time)
 
         terminal_index_time = self.__load_terminal_index()
-        print(f"Time to load terminal index: {terminal_index_time:.3f}s")
+        self.__print_stage_time("load terminal index", terminal_index_time)
 
         transactions_time = self.__load_transactions(transactions_path)
-        print(f"Time to load transactions: {transactions_time:.3f}s")
+        self.__print_stage_time("load transactions", transactions_time)
+
+        transaction_datetime_index_time = self.__load_transaction_datetime_index()
+        self.__print_stage_time("load transaction datetime index", transaction_datetime_index_time)
 
         available_terminals_time = self.__load_available_terminals(customer_profiles_path)
-        print(f"Time to load available terminal: {available_terminals_time:.3f}s")
+        self.__print_stage_time("load available terminal", available_terminals_time)
 
         return (customer_time +
                 terminal_time +
                 customer_index_time +
                 terminal_index_time +
                 transactions_time +
-                available_terminals_time)
+                transaction_datetime_index_time +
+                available_terminals_time +
+                self.__load_spending_aggregates() +
+                self.__load_buying_friends() +
+                self.__load_monthly_aggregates())
+
+    def load_bulk_import(self, dataset_path: str, run: bool = False, neo4j_admin: str = "neo4j-admin") -> float:
+        """
+        Load the dataset located in the specified dataset_path with the offline importer 'neo4j-admin database
+        import', using the files exported by Generator.export_bulk_import (they are exported here if missing). The
+        import replaces the whole database, which must be stopped while the command runs. Once the database is
+        started again, create_indexes creates the indexes used by the operations.
+
+        :param dataset_path: path where the datasets to load is stored.
+        :param run: If True, the import command is executed, otherwise it is only printed.
+        :param neo4j_admin: Path of the neo4j-admin executable.
+        :return: Import execution time in seconds (0 if the command is only printed).
+        """
+
+        self.__stage_times = {}
+
+        if not os.path.exists(os.path.join(dataset_path, bulk_import.BULK_IMPORT_DIR_NAME)):
+            bulk_import.write_bulk_import_files(dataset_path)
+
+        command = bulk_import.get_bulk_import_command(dataset_path, self.__db.get_database(), neo4j_admin)
+        if not run:
+            print(f"Bulk import command: {shlex.join(command)}")
+            return 0.0
+
+        start_time = time.time()
+        subprocess.run(command, check=True)
+        import_time = time.time() - start_time
+        self.__print_stage_time("bulk import dataset", import_time)
+
+        return import_time
+
+    def create_indexes(self) -> float:
+        """
+        Create the customer and terminal indexes, for databases loaded with load_bulk_import.
+
+        :return: Execution time in seconds.
+        """
+
+        self.__stage_times = {}
+
+        customer_index_time = self.__load_customer_index()
+        self.__print_stage_time("load customer index", customer_index_time)
+
+        terminal_index_time = self.__load_terminal_index()
+        self.__print_stage_time("load terminal index", terminal_index_time)
+
+        transaction_datetime_index_time = self.__load_transaction_datetime_index()
+        self.__print_stage_time("load transaction datetime index", transaction_datetime_index_time)
+
+        return customer_index_time + terminal_index_time + transaction_datetime_index_time
+
+    def __run_batches(self, executor: ThreadPoolExecutor, query: str, partitions: list[list[dict]]) -> int:
+        """
+        Run a parameterized UNWIND query for each partition of rows, each in its own session and write transaction
+        on the thread pool, and wait for all of them.
+
+        :param executor: Thread pool.
+        :param query: Query with a $rows parameter.
+        :param partitions: Rows of each partition.
+        :return: Number of rows sent.
+        """
+
+        def run_batch(rows: list[dict]):
+            with self.__db.get_session() as session:
+                session.execute_write(lambda tx: tx.run(query, rows=rows).consume())
+
+        futures = [executor.submit(run_batch, rows) for rows in partitions if rows]
+        for future in futures:
+            future.result()
+
+        return sum(len(rows) for rows in partitions)
+
+    @staticmethod
+    def __to_partitions(df: pd.DataFrame, columns: dict[str, str], n_partitions: int,
+                        partition_column: str = None) -> list[list[dict]]:
+        """
+        Convert a chunk of a table into rows of native Python values, split in partitions.
+
+        :param df: Chunk of the table.
+        :param columns: Columns of the table to send, mapped to the name of the row key, the ones missing from the
+            chunk are skipped.
+        :param n_partitions: Number of partitions.
+        :param partition_column: Column whose value modulo n_partitions is the partition of the row, if not specified
+            rows are split in contiguous partitions.
+        :return: The rows of each partition.
+        """
+
+        if partition_column is not None:
+            partition_ids = df[partition_column].values % n_partitions
+        else:
+            partition_ids = np.arange(len(df)) * n_partitions // max(len(df), 1)
+
+        columns = {column: key for column, key in columns.items() if column in df.columns}
+        partitions = []
+        for partition in range(n_partitions):
+            partition_df = df[partition_ids == partition]
+            keys = list(columns.values())
+            values = [partition_df[column].tolist() for column in columns]
+            partitions.append([dict(zip(keys, row)) for row in zip(*values)])
+
+        return partitions
+
+    def __load_table_batched(self, executor: ThreadPoolExecutor, dataset_path: str, table_name: str, query: str,
+                             columns: dict[str, str], batch_size: int, n_workers: int, stage_name: str,
+                             partition_column: str = None, prepare=None) -> float:
+        """
+        Load a table of the dataset reading it in chunks of n_workers * batch_size rows, each chunk is split in
+        n_workers partitions that are sent concurrently as UNWIND batches.
+
+        :return: Loading execution time in seconds.
+        """
+
+        start_time = time.time()
+        nb_rows = 0
+        for chunk in dataset_io.iter_dataset_table(dataset_path, table_name, chunk_size=batch_size * n_workers):
+            if prepare is not None:
+                chunk = prepare(chunk)
+            partitions = self.__to_partitions(chunk, columns, n_workers, partition_column)
+            nb_rows += self.__run_batches(executor, query, partitions)
+        stage_time = time.time() - start_time
+
+        self.__stage_times[f"load {stage_name}"] = self.__stage_times.get(f"load {stage_name}", 0.0) + stage_time
+        print(f"Time to load {stage_name}: {stage_time:.3f}s ({nb_rows / max(stage_time, 1e-9):.0f} rows/s)")
+
+        return stage_time
+
+    def load_dataset_batched(self, dataset_path: str, batch_size: int = 10000, n_workers: int = 4) -> float:
+        """
+        Load the datasets located in the specified dataset_path in the database from the client side: the dataset
+        is read in chunks by Python (in any of the formats of the Generator) and sent as parameterized UNWIND batches
+        over a pool of n_workers sessions, so the files do not need to be in the import directory of the server.
+        Transactions and ACCESS_TO relationships are partitioned by customer, so that concurrent batches do not
+        lock the same customer nodes.
+
+        :param dataset_path: path where the datasets to load is stored.
+        :param batch_size: Number of rows of each UNWIND batch.
+        :param n_workers: Number of concurrent sessions.
+        :return: Loading execution time in seconds.
+        """
+
+        self.__stage_times = {}
+
+        customers_query = """
+        UNWIND $rows AS row
+        MERGE (c:Customer {customer_id: row.customer_id})
+        SET c.x_location = row.x_location,
+            c.y_location = row.y_location,
+            c.mean_amount = row.mean_amount,
+            c.std_amount = row.std_amount,
+            c.mean_nb_tx_per_day = row.mean_nb_tx_per_day,
+            c.nb_terminals = row.nb_terminals
+        """
+
+        terminals_query = """
+        UNWIND $rows AS row
+        MERGE (t:Terminal {terminal_id: row.terminal_id})
+        SET t.x_location = row.x_location,
+            t.y_location = row.y_location
+        """
+
+        transactions_query = """
+        UNWIND $rows AS row
+        MATCH (c:Customer {customer_id: row.customer_id})
+        MATCH (t:Terminal {terminal_id: row.terminal_id})
+        CREATE (c)-[:TRANSACTION {
+            transaction_id: row.transaction_id,
+            datetime: datetime(row.datetime),
+            amount: row.amount,
+            fraudulent: row.fraudulent,
+            period_of_day: row.period_of_day,
+            product_type: row.product_type,
+            security_feeling: row.security_feeling
+        }]->(t)
+        """
+
+        available_terminals_query = """
+        UNWIND $rows AS row
+        MATCH (c:Customer {customer_id: row.customer_id})
+        UNWIND row.available_terminals AS terminal_id
+        MATCH (t:Terminal {terminal_id: terminal_id})
+        CREATE (c)-[:ACCESS_TO]->(t)
+        """
+
+        def prepare_transactions(chunk: pd.DataFrame) -> pd.DataFrame:
+            return chunk.assign(
+                TX_DATETIME=np.datetime_as_string(chunk.TX_DATETIME.values.astype('datetime64[s]'), unit='s'),
+                TX_AMOUNT=chunk.TX_AMOUNT.astype(float).round(2),
+                TX_FRAUD=chunk.TX_FRAUD == 1)
+
+        # Delete all existing nodes and relationships in the database
+        self.__clear_database()
+
+        # Indexes are created first, so that the MERGE and MATCH of the batches are index seeks
+        customer_index_time = self.__load_customer_index()
+        self.__print_stage_time("load customer index", customer_index_time)
+
+        terminal_index_time = self.__load_terminal_index()
+        self.__print_stage_time("load terminal index", terminal_index_time)
+
+        transaction_datetime_index_time = self.__load_transaction_datetime_index()
+        self.__print_stage_time("load transaction datetime index", transaction_datetime_index_time)
+        self.__db.execute_query("CALL db.awaitIndexes()")
+
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            customer_time = self.__load_table_batched(
+                executor, dataset_path, 'customer_profiles', customers_query,
+                {'CUSTOMER_ID': 'customer_id', 'x_customer_id': 'x_location', 'y_customer_id': 'y_location',
+                 'mean_amount': 'mean_amount', 'std_amount': 'std_amount',
+                 'mean_nb_tx_per_day': 'mean_nb_tx_per_day', 'nb_terminals': 'nb_terminals'},
+                batch_size, n_workers, "customer profiles table")
+
+            terminal_time = self.__load_table_batched(
+                executor, dataset_path, 'terminal_profiles', terminals_query,
+                {'TERMINAL_ID': 'terminal_id', 'x_terminal_id': 'x_location', 'y_terminal_id': 'y_location'},
+                batch_size, n_workers, "terminal profiles table")
+
+            transactions_time = self.__load_table_batched(
+                executor, dataset_path, 'transactions', transactions_query,
+                {'CUSTOMER_ID': 'customer_id', 'TERMINAL_ID': 'terminal_id', 'TRANSACTION_ID': 'transaction_id',
+                 'TX_DATETIME': 'datetime', 'TX_AMOUNT': 'amount', 'TX_FRAUD': 'fraudulent',
+                 **TRANSACTION_EXTENSION_COLUMNS},
+                batch_size, n_workers, "transactions", partition_column='CUSTOMER_ID', prepare=prepare_transactions)
+
+            available_terminals_time = self.__load_table_batched(
+                executor, dataset_path, 'customer_profiles', available_terminals_query,
+                {'CUSTOMER_ID': 'customer_id', 'available_terminals': 'available_terminals'},
+                batch_size, n_workers, "available terminal", partition_column='CUSTOMER_ID')
+
+        return (customer_time +
+                terminal_time +
+                customer_index_time +
+                terminal_index_time +
+                transactions_time +
+                transaction_datetime_index_time +
+                available_terminals_time +
+                self.__load_spending_aggregates() +
+                self.__load_buying_friends() +
+                self.__load_monthly_aggregates())
+
+    def load_shared_terminals(self, dataset_path: str, batch_size: int = 10000, n_workers: int = 4) -> float:
+        """
+        Load the shared_terminals side table of the dataset, exported by Generator.export_shared_terminals, as
+        SHARES_TERMINALS relationships between the customer pairs, with the number of shared terminals as count.
+        The existing SHARES_TERMINALS relationships are replaced.
+
+        :param dataset_path: path where the datasets to load is stored.
+        :param batch_size: Number of rows of each UNWIND batch.
+        :param n_workers: Number of concurrent sessions.
+        :return: Loading execution time in seconds.
+        """
+
+        self.__stage_times = {}
+
+        delete_query = """
+        MATCH (:Customer)-[s:SHARES_TERMINALS]->(:Customer)
+        CALL (s) {
+            DELETE s
+        } IN TRANSACTIONS OF $batch_size ROWS
+        """
+
+        shared_terminals_query = """
+        UNWIND $rows AS row
+        MATCH (x:Customer {customer_id: row.customer_x})
+        MATCH (y:Customer {customer_id: row.customer_y})
+        CREATE (x)-[:SHARES_TERMINALS {count: row.count}]->(y)
+        """
+
+        delete_time = self.__db.execute_query(delete_query, batch_size=batch_size)
+        self.__print_stage_time("delete shared terminals", delete_time)
+
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            shared_terminals_time = self.__load_table_batched(
+                executor, dataset_path, 'shared_terminals', shared_terminals_query,
+                {'CUSTOMER_ID_X': 'customer_x', 'CUSTOMER_ID_Y': 'customer_y', 'SHARED_TERMINALS': 'count'},
+                batch_size, n_workers, "shared terminals", partition_column='CUSTOMER_ID_X')
+
+        return delete_time + shared_terminals_time
+
+    def __get_watermark(self) -> int:
+        """
+        Read the load watermark, that is the last TRANSACTION_ID loaded in the database. For databases loaded before
+        watermarks were recorded, it is computed from the loaded transactions and recorded.
+
+        :return: The last loaded TRANSACTION_ID, -1 if no transaction has been loaded.
+        """
+
+        watermark_query = """
+        MATCH (w:LoadWatermark {name: 'transactions'})
+        RETURN w.last_transaction_id AS last_transaction_id
+        """
+
+        transactions_query = """
+        MATCH ()-[tx:TRANSACTION]->()
+        RETURN max(tx.transaction_id) AS last_transaction_id
+        """
+
+        with self.__db.get_session() as session:
+            record = session.run(watermark_query).single()
+            if record is not None:
+                return record["last_transaction_id"]
+            record = session.run(transactions_query).single()
+
+        last_transaction_id = -1 if record is None or record["last_transaction_id"] is None \
+            else record["last_transaction_id"]
+        # Recorded before appending, a rerun after a failed append restarts from the same watermark
+        self.__set_watermark(last_transaction_id, None)
+        return last_transaction_id
+
+    def __set_watermark(self, last_transaction_id: int, last_datetime: str) -> float:
+        query = """
+        MERGE (w:LoadWatermark {name: 'transactions'})
+        SET w.last_transaction_id = $last_transaction_id,
+            w.last_datetime = datetime($last_datetime)
+        """
+
+        return self.__db.execute_query(query, last_transaction_id=last_transaction_id, last_datetime=last_datetime)
+
+    def append_dataset(self, dataset_path: str, batch_size: int = 10000, n_workers: int = 4) -> float:
+        """
+        Append the dataset located in the specified dataset_path to the data already in the database, without
+        clearing it and without touching the existing indexes. Only the transactions past the load watermark (the
+        last TRANSACTION_ID loaded, recorded in a LoadWatermark node) are loaded, and only the new or changed customer
+        and terminal profiles are written, together with the ACCESS_TO relationships of the new or changed customers.
+        Data is sent from the client side as in load_dataset_batched.
+
+        The watermark is advanced only when all the transactions are loaded, the transactions already loaded by a
+        failed append are skipped when it is rerun, so they are not duplicated nor added again to their SPENT_AT
+        aggregates.
+
+        :param dataset_path: path where the datasets to load is stored.
+        :param batch_size: Number of rows of each UNWIND batch.
+        :param n_workers: Number of concurrent sessions.
+        :return: Loading execution time in seconds.
+        """
+
+        self.__stage_times = {}
+
+        customers_query = """
+        UNWIND $rows AS row
+        MERGE (c:Customer {customer_id: row.customer_id})
+        WITH c, row
+        WHERE c.x_location IS NULL
+            OR c.x_location <> row.x_location
+            OR c.y_location <> row.y_location
+            OR c.mean_amount <> row.mean_amount
+            OR c.std_amount <> row.std_amount
+            OR c.mean_nb_tx_per_day <> row.mean_nb_tx_per_day
+            OR c.nb_terminals <> row.nb_terminals
+        SET c.x_location = row.x_location,
+            c.y_location = row.y_location,
+            c.mean_amount = row.mean_amount,
+            c.std_amount = row.std_amount,
+            c.mean_nb_tx_per_day = row.mean_nb_tx_per_day,
+            c.nb_terminals = row.nb_terminals
+        WITH c, row
+        OPTIONAL MATCH (c)-[access:ACCESS_TO]->(:Terminal)
+        DELETE access
+        WITH DISTINCT c, row
+        UNWIND row.available_terminals AS terminal_id
+        MATCH (t:Terminal {terminal_id: terminal_id})
+        CREATE (c)-[:ACCESS_TO]->(t)
+        """
+
+        terminals_query = """
+        UNWIND $rows AS row
+        MERGE (t:Terminal {terminal_id: row.terminal_id})
+        WITH t, row
+        WHERE t.x_location IS NULL
+            OR t.x_location <> row.x_location
+            OR t.y_location <> row.y_location
+        SET t.x_location = row.x_location,
+            t.y_location = row.y_location
+        """
+
+        transactions_query = """
+        UNWIND $rows AS row
+        MATCH (c:Customer {customer_id: row.customer_id})
+        MATCH (t:Terminal {terminal_id: row.terminal_id})
+        WITH c, t, row
+        WHERE NOT EXISTS { (c)-[:TRANSACTION {transaction_id: row.transaction_id}]->(t) }
+        CREATE (c)-[:TRANSACTION {
+            transaction_id: row.transaction_id,
+            datetime: datetime(row.datetime),
+            amount: row.amount,
+            fraudulent: row.fraudulent,
+            period_of_day: row.period_of_day,
+            product_type: row.product_type,
+            security_feeling: row.security_feeling
+        }]->(t)
+        """
+
+        if self.__spending_aggregates:
+            # The new transactions of each (customer, terminal) pair of the batch are added to its SPENT_AT aggregate
+            transactions_query += """
+            WITH c, t, COUNT(*) AS tx_count, SUM(row.amount) AS total_amount,
+                SUM(COALESCE(row.security_feeling, 0)) AS security_feeling_sum,
+                COUNT(row.security_feeling) AS security_feeling_count
+            MERGE (c)-[s:SPENT_AT]->(t)
+            ON CREATE SET s.tx_count = 0, s.total_amount = 0.0, s.security_feeling_sum = 0,
+                s.security_feeling_count = 0
+            SET s.tx_count = s.tx_count + tx_count,
+                s.total_amount = s.total_amount + total_amount,
+                s.security_feeling_sum = s.security_feeling_sum + security_feeling_sum,
+                s.security_feeling_count = s.security_feeling_count + security_feeling_count
+            SET s.avg_security_feeling = CASE WHEN s.security_feeling_count > 0
+                THEN toFloat(s.security_feeling_sum) / s.security_feeling_count END
+            """
+
+        watermark = self.__get_watermark()
+        print(f"Load watermark: TRANSACTION_ID {watermark}")
+
+        new_watermark = {"last_transaction_id": watermark, "last_datetime": None}
+        first_datetime = []
+        touched_pairs = []
+
+        def prepare_transactions(chunk: pd.DataFrame) -> pd.DataFrame:
+            chunk = chunk[chunk.TRANSACTION_ID > watermark]
+            if len(chunk) > 0:
+                if not first_datetime:
+                    first_datetime.append(str(np.datetime_as_string(
+                        chunk.TX_DATETIME.values.min().astype('datetime64[s]'), unit='s')))
+                last = chunk.TRANSACTION_ID.values.argmax()
+                new_watermark["last_transaction_id"] = int(chunk.TRANSACTION_ID.values[last])
+                new_watermark["last_datetime"] = str(np.datetime_as_string(
+                    chunk.TX_DATETIME.values[last].astype('datetime64[s]'), unit='s'))
+                if self.__buying_friends:
+                    touched_pairs.append(chunk[['CUSTOMER_ID', 'TERMINAL_ID']].drop_duplicates())
+            return chunk.assign(
+                TX_DATETIME=np.datetime_as_string(chunk.TX_DATETIME.values.astype('datetime64[s]'), unit='s'),
+                TX_AMOUNT=chunk.TX_AMOUNT.astype(float).round(2),
+                TX_FRAUD=chunk.TX_FRAUD == 1)
+
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            # Terminals first, the ACCESS_TO relationships of the customers need them
+            terminal_time = self.__load_table_batched(
+                executor, dataset_path, 'terminal_profiles', terminals_query,
+                {'TERMINAL_ID': 'terminal_id', 'x_terminal_id': 'x_location', 'y_terminal_id': 'y_location'},
+                batch_size, n_workers, "terminal profiles table")
+
+            customer_time = self.__load_table_batched(
+                executor, dataset_path, 'customer_profiles', customers_query,
+                {'CUSTOMER_ID': 'customer_id', 'x_customer_id': 'x_location', 'y_customer_id': 'y_location',
+                 'mean_amount': 'mean_amount', 'std_amount': 'std_amount',
+                 'mean_nb_tx_per_day': 'mean_nb_tx_per_day', 'nb_terminals': 'nb_terminals',
+                 'available_terminals': 'available_terminals'},
+                batch_size, n_workers, "customer profiles table and available terminal")
+
+            transactions_time = self.__load_table_batched(
+                executor, dataset_path, 'transactions', transactions_query,
+                {'CUSTOMER_ID': 'customer_id', 'TERMINAL_ID': 'terminal_id', 'TRANSACTION_ID': 'transaction_id',
+                 'TX_DATETIME': 'datetime', 'TX_AMOUNT': 'amount', 'TX_FRAUD': 'fraudulent',
+                 **TRANSACTION_EXTENSION_COLUMNS},
+                batch_size, n_workers, "transactions", partition_column='CUSTOMER_ID', prepare=prepare_transactions)
+
+        watermark_time = 0.0
+        buying_friends_time = 0.0
+        monthly_aggregates_time = 0.0
+        if new_watermark["last_transaction_id"] > watermark:
+            # Only the friendships around the touched (customer, terminal) pairs and the months of the new
+            # transactions are recomputed
+            if self.__buying_friends:
+                buying_friends_time = self.__update_buying_friends(
+                    pd.concat(touched_pairs).drop_duplicates(), batch_size=1000)
+                self.__print_stage_time("update buying friends", buying_friends_time)
+            monthly_aggregates_time = self.__load_monthly_aggregates(from_datetime=first_datetime[0])
+            watermark_time = self.__set_watermark(**new_watermark)
+            print(f"New load watermark: TRANSACTION_ID {new_watermark['last_transaction_id']}")
+
+        return (terminal_time +
+                customer_time +
+                transactions_time +
+                buying_friends_time +
+                monthly_aggregates_time +
+                watermark_time)
+
+    def __materialize_spending_aggregates(self, batch_size: int) -> float:
+        """
+        Replace the SPENT_AT relationships with the aggregates of the current TRANSACTION relationships: one SPENT_AT
+        relationship for each (customer, terminal) pair with at least a transaction, with the number of transactions,
+        their total amount and the sum and number of their security feelings, from which avg_security_feeling is
+        derived. The aggregates are computed per customer, in transactions of batch_size customers.
+
+        :return: Execution time in seconds.
+        """
+
+        delete_query = """
+        MATCH (:Customer)-[s:SPENT_AT]->(:Terminal)
+        CALL (s) {
+            DELETE s
+        } IN TRANSACTIONS OF $batch_size ROWS
+        """
+
+        query = """
+        MATCH (c:Customer)
+        CALL (c) {
+            MATCH (c)-[tx:TRANSACTION]->(t:Terminal)
+            WITH c, t, COUNT(tx) AS tx_count, SUM(tx.amount) AS total_amount,
+                SUM(COALESCE(tx.security_feeling, 0)) AS security_feeling_sum,
+                COUNT(tx.security_feeling) AS security_feeling_count
+            CREATE (c)-[:SPENT_AT {
+                tx_count: tx_count,
+                total_amount: total_amount,
+                security_feeling_sum: security_feeling_sum,
+                security_feeling_count: security_feeling_count,
+                avg_security_feeling: CASE WHEN security_feeling_count > 0
+                    THEN toFloat(security_feeling_sum) / security_feeling_count END
+            }]->(t)
+        } IN TRANSACTIONS OF $batch_size ROWS
+        """
+
+        delete_time = self.__db.execute_query(delete_query, batch_size=batch_size * 10)
+        return delete_time + self.__db.execute_query(query, batch_size=batch_size)
+
+    def __load_spending_aggregates(self) -> float:
+        # Materialization stage at the end of the loads, only when the aggregates are enabled
+        if not self.__spending_aggregates:
+            return 0.0
+
+        aggregates_time = self.__materialize_spending_aggregates(batch_size=1000)
+        self.__print_stage_time("materialize spending aggregates", aggregates_time)
+
+        return aggregates_time
+
+    def materialize_spending_aggregates(self, batch_size: int = 1000) -> float:
+        """
+        Materialize on demand the SPENT_AT aggregates of the transactions of each customer on each terminal, used by
+        Operations.operation_a_aggregated and Operations.operation_d_ii_aggregated. Operation d.i changes the
+        security feelings of the transactions, so the aggregates must be materialized again after it.
+
+        :param batch_size: Number of customers aggregated in each transaction.
+        :return: Execution time in seconds.
+        """
+
+        self.__stage_times = {}
+
+        aggregates_time = self.__materialize_spending_aggregates(batch_size)
+        self.__print_stage_time("materialize spending aggregates", aggregates_time)
+
+        return aggregates_time
+
+    def __materialize_buying_friends(self, batch_size: int) -> float:
+        """
+        Replace the BUYING_FRIEND relationships with the ones of operation d.ii computed from the SPENT_AT aggregates,
+        as Operations.operation_d_ii_aggregated does, in transactions of batch_size customers c1.
+
+        :return: Execution time in seconds.
+        """
+
+        delete_query = """
+        MATCH (:Customer)-[f:BUYING_FRIEND]->(:Customer)
+        CALL (f) {
+            DELETE f
+        } IN TRANSACTIONS OF $batch_size ROWS
+        """
+
+        query = """
+        MATCH (c1:Customer)
+        CALL (c1) {
+            MATCH (c1)-[s1:SPENT_AT]->(t:Terminal)
+            WHERE s1.tx_count > 3
+            WITH c1, t, s1.avg_security_feeling AS c1_avg_security
+
+            MATCH (c2:Customer)-[s2:SPENT_AT]->(t)
+            WHERE c1 <> c2
+            WITH c1, c2, c1_avg_security, SUM(s2.tx_count) AS tx2_count,
+                SUM(s2.security_feeling_sum) AS security_feeling_sum,
+                SUM(s2.security_feeling_count) AS security_feeling_count
+            WHERE tx2_count > 3 AND security_feeling_count > 0
+                AND ABS(c1_avg_security - toFloat(security_feeling_sum) / security_feeling_count) < 1
+            WITH DISTINCT c1, c2
+            CREATE (c1)-[:BUYING_FRIEND]->(c2)
+        } IN TRANSACTIONS OF $batch_size ROWS
+        """
+
+        delete_time = self.__db.execute_query(delete_query, batch_size=batch_size * 10)
+        return delete_time + self.__db.execute_query(query, batch_size=batch_size)
+
+    def __update_buying_friends(self, touched_pairs: pd.DataFrame, batch_size: int) -> float:
+        """
+        Update the BUYING_FRIEND relationships of operation d.ii after the SPENT_AT aggregates of the touched
+        (customer, terminal) pairs have changed. The relationship c1 -> c2 depends only on the aggregates of c1 and c2
+        on the terminals on which c1 has more than three transactions, so it can change only if:
+        - c1 is a touched customer: all the relationships of c1 are computed again;
+        - c2 is the customer of a touched pair whose terminal is one of these terminals of c1: the relationship of
+          the pair (c1, c2) is evaluated again, and created or deleted accordingly.
+        The cost is proportional to the customers of the touched terminals instead of all the pairs of the graph.
+
+        :param touched_pairs: DataFrame with the CUSTOMER_ID and TERMINAL_ID of the touched pairs.
+        :param batch_size: Number of customers, or of customer pairs, updated in each transaction.
+        :return: Execution time in seconds.
+        """
+
+        # The pairs whose c1 is touched are evaluated here too, their relationships are computed again afterwards
+        pairs_query = """
+        UNWIND $pairs AS pair
+        MATCH (c2:Customer {customer_id: pair.customer_id})-[:SPENT_AT]->(t:Terminal {terminal_id: pair.terminal_id})
+        MATCH (c1:Customer)-[s1:SPENT_AT]->(t)
+        WHERE c1 <> c2 AND s1.tx_count > 3
+        WITH DISTINCT c1, c2
+        CALL (c1, c2) {
+            OPTIONAL MATCH (c1)-[s1:SPENT_AT]->(t:Terminal)<-[s2:SPENT_AT]-(c2)
+            WHERE s1.tx_count > 3
+            WITH c1, c2, s1.avg_security_feeling AS c1_avg_security, SUM(s2.tx_count) AS tx2_count,
+                SUM(s2.security_feeling_sum) AS security_feeling_sum,
+                SUM(s2.security_feeling_count) AS security_feeling_count
+            WITH c1, c2, COUNT(CASE WHEN tx2_count > 3 AND security_feeling_count > 0
+                AND ABS(c1_avg_security - toFloat(security_feeling_sum) / security_feeling_count) < 1
+                THEN 1 END) > 0 AS friends
+            OPTIONAL MATCH (c1)-[f:BUYING_FRIEND]->(c2)
+            WITH c1, c2, friends, COLLECT(f) AS friendships
+            FOREACH (f IN CASE WHEN friends THEN [] ELSE friendships END | DELETE f)
+            FOREACH (_ IN CASE WHEN friends THEN [1] ELSE [] END | MERGE (c1)-[:BUYING_FRIEND]->(c2))
+        } IN TRANSACTIONS OF $batch_size ROWS
+        """
+
+        customers_query = """
+        UNWIND $customer_ids AS customer_id
+        MATCH (c1:Customer {customer_id: customer_id})
+        CALL (c1) {
+            OPTIONAL MATCH (c1)-[f:BUYING_FRIEND]->(:Customer)
+            DELETE f
+            WITH DISTINCT c1
+
+            MATCH (c1)-[s1:SPENT_AT]->(t:Terminal)
+            WHERE s1.tx_count > 3
+            WITH c1, t, s1.avg_security_feeling AS c1_avg_security
+
+            MATCH (c2:Customer)-[s2:SPENT_AT]->(t)
+            WHERE c1 <> c2
+            WITH c1, c2, c1_avg_security, SUM(s2.tx_count) AS tx2_count,
+                SUM(s2.security_feeling_sum) AS security_feeling_sum,
+                SUM(s2.security_feeling_count) AS security_feeling_count
+            WHERE tx2_count > 3 AND security_feeling_count > 0
+                AND ABS(c1_avg_security - toFloat(security_feeling_sum) / security_feeling_count) < 1
+            WITH DISTINCT c1, c2
+            CREATE (c1)-[:BUYING_FRIEND]->(c2)
+        } IN TRANSACTIONS OF $batch_size ROWS
+        """
+
+        pairs = [{'customer_id': int(customer_id), 'terminal_id': int(terminal_id)}
+                 for customer_id, terminal_id in zip(touched_pairs.CUSTOMER_ID.values,
+                                                     touched_pairs.TERMINAL_ID.values)]
+        customer_ids = [int(customer_id) for customer_id in np.unique(touched_pairs.CUSTOMER_ID.values)]
+        print(f"Touched (customer, terminal) pairs: {len(pairs)}, touched customers: {len(customer_ids)}")
+
+        pairs_time = self.__db.execute_query(pairs_query, batch_size=batch_size, pairs=pairs)
+        return pairs_time + self.__db.execute_query(customers_query, batch_size=batch_size, customer_ids=customer_ids)
+
+    def __load_buying_friends(self) -> float:
+        # Materialization stage at the end of the loads, only when the relationships are maintained
+        if not self.__buying_friends:
+            return 0.0
+
+        buying_friends_time = self.__materialize_buying_friends(batch_size=1000)
+        self.__print_stage_time("materialize buying friends", buying_friends_time)
+
+        return buying_friends_time
+
+    def materialize_buying_friends(self, batch_size: int = 1000) -> float:
+        """
+        Materialize on demand the BUYING_FRIEND relationships of operation d.ii from the SPENT_AT aggregates, which
+        must be current, so the relationships are the same ones written by Operations.operation_d_ii on the same
+        graph. append_dataset then keeps them updated if buying_friends is enabled.
+
+        :param batch_size: Number of customers processed in each transaction.
+        :return: Execution time in seconds.
+        """
+
+        self.__stage_times = {}
+
+        buying_friends_time = self.__materialize_buying_friends(batch_size)
+        self.__print_stage_time("materialize buying friends", buying_friends_time)
+
+        return buying_friends_time
+
+    def __materialize_monthly_aggregates(self, batch_size: int, from_datetime: str = None) -> float:
+        """
+        Compute the TerminalMonth aggregates of the transactions: one TerminalMonth node for each terminal and calendar
+        month with at least a transaction, linked to its terminal by a HAS_MONTH relationship, with the number of
+        transactions and their total amount. If from_datetime is given, only the months from the one of from_datetime
+        on are recomputed, reading their transactions with the datetime index, otherwise all the aggregates are
+        replaced.
+
+        :return: Execution time in seconds.
+        """
+
+        delete_query = """
+        MATCH (m:TerminalMonth)
+        CALL (m) {
+            DETACH DELETE m
+        } IN TRANSACTIONS OF $batch_size ROWS
+        """
+
+        index_query = """
+        CREATE INDEX terminal_month_index IF NOT EXISTS FOR (m:TerminalMonth) ON (m.terminal_id, m.month)
+        """
+
+        query = """
+        MATCH (:Customer)-[tx:TRANSACTION]->(t:Terminal)
+        WHERE $from_month IS NULL OR tx.datetime >= datetime({date: date($from_month)})
+        WITH t, date.truncate('month', tx.datetime) AS month, COUNT(tx) AS tx_count, SUM(tx.amount) AS total_amount
+        CALL (t, month, tx_count, total_amount) {
+            MERGE (t)-[:HAS_MONTH]->(m:TerminalMonth {terminal_id: t.terminal_id, month: month})
+            SET m.tx_count = tx_count,
+                m.total_amount = total_amount
+        } IN TRANSACTIONS OF $batch_size ROWS
+        """
+
+        materialize_time = self.__db.execute_query(index_query)
+        from_month = None
+        if from_datetime is None:
+            materialize_time += self.__db.execute_query(delete_query, batch_size=batch_size * 10)
+        else:
+            from_month = str(np.datetime64(from_datetime, 'M').astype('datetime64[D]'))
+            # Without the disjunction the planner can seek the datetime index
+            query = query.replace("$from_month IS NULL OR ", "")
+
+        return materialize_time + self.__db.execute_query(query, batch_size=batch_size, from_month=from_month)
+
+    def __load_monthly_aggregates(self, from_datetime: str = None) -> float:
+        # Materialization stage at the end of the loads, only when the aggregates are enabled
+        if not self.__monthly_aggregates:
+            return 0.0
+
+        aggregates_time = self.__materialize_monthly_aggregates(batch_size=1000, from_datetime=from_datetime)
+        self.__print_stage_time("materialize monthly aggregates", aggregates_time)
+
+        return aggregates_time
+
+    def materialize_monthly_aggregates(self, batch_size: int = 1000) -> float:
+        """
+        Materialize on demand the TerminalMonth aggregates of the transactions of each terminal in each calendar
+        month, used by Operations.operation_b_aggregated.
+
+        :param batch_size: Number of (terminal, month) aggregates written in each transaction.
+        :return: Execution time in seconds.
+        """
+
+        self.__stage_times = {}
+
+        aggregates_time = self.__materialize_monthly_aggregates(batch_size)
+        self.__print_stage_time("materialize monthly aggregates", aggregates_time)
+
+        return aggregates_time
+
+    def reset_database(self) -> float:
+        """
+        Delete all nodes, relationships, indexes and constraints of the database with the configured reset strategy.
+
+        :return: Execution time in seconds.
+        """
+
+        self.__stage_times = {}
+
+        start_time = time.time()
+        self.__clear_database()
+
+        return time.time() - start_time
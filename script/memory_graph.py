@@ -0,0 +1,165 @@
+import time
+
+import numpy as np
+
+import script.dataset_io as dataset_io
+
+
+def _to_offsets(keys: np.ndarray, n_keys: int) -> np.ndarray:
+    # CSR offsets of entries sorted by key
+    return np.concatenate(([0], np.cumsum(np.bincount(keys, minlength=n_keys)))).astype(np.int64)
+
+
+class MemoryGraph:
+    def __init__(self):
+        """
+        A class to hold a generated dataset in memory in compact NumPy structures, the in-process counterpart of the
+        graph loaded in the database by the Loader, on which MemoryOperations executes the operations.
+
+        Customers and terminals are referred to by their index in customer_ids and terminal_ids, which are sorted.
+        The transactions are NumPy columns sorted by customer, terminal and datetime, and they are grouped in spending
+        pairs, the distinct (customer, terminal) pairs with at least a transaction, that form the CSR adjacency
+        between customers and terminals in both directions:
+        - customer_offsets: the spending pairs of customer c are the ones in [customer_offsets[c],
+          customer_offsets[c + 1]), sorted by terminal.
+        - terminal_offsets: the spending pairs of terminal t are terminal_pairs[terminal_offsets[t]:
+          terminal_offsets[t + 1]], sorted by customer.
+        - pair_offsets: the transactions of spending pair p are the ones in [pair_offsets[p], pair_offsets[p + 1]).
+        The ACCESS_TO relationships are in access_offsets and access_terminals, per customer.
+        """
+
+        self.customer_ids = np.zeros(0, dtype=np.int64)
+        self.terminal_ids = np.zeros(0, dtype=np.int64)
+
+        self.tx_ids = np.zeros(0, dtype=np.int64)
+        self.tx_customers = np.zeros(0, dtype=np.int64)
+        self.tx_terminals = np.zeros(0, dtype=np.int64)
+        self.tx_datetimes = np.zeros(0, dtype='datetime64[s]')
+        self.tx_amounts = np.zeros(0, dtype=np.float64)
+        self.tx_fraudulent = np.zeros(0, dtype=bool)
+
+        # Extension of operation d.i, None until it is generated or set
+        self.tx_period_of_day = None
+        self.tx_product_type = None
+        self.tx_security_feeling = None
+
+        self.pair_customers = np.zeros(0, dtype=np.int64)
+        self.pair_terminals = np.zeros(0, dtype=np.int64)
+        self.pair_offsets = np.zeros(1, dtype=np.int64)
+        self.customer_offsets = np.zeros(1, dtype=np.int64)
+        self.terminal_pairs = np.zeros(0, dtype=np.int64)
+        self.terminal_offsets = np.zeros(1, dtype=np.int64)
+
+        self.access_offsets = np.zeros(1, dtype=np.int64)
+        self.access_terminals = np.zeros(0, dtype=np.int64)
+
+        # BUYING_FRIEND relationships of operation d.ii, as sorted customer_1 * n_customers + customer_2 keys
+        self.buying_friends = np.zeros(0, dtype=np.int64)
+
+        self.__stage_times = {}
+
+    def get_stage_times(self) -> dict[str, float]:
+        """
+        Get the execution time of each stage of the last load, as printed during the load.
+
+        :return: Dictionary from stage name to execution time in seconds.
+        """
+
+        return dict(self.__stage_times)
+
+    def __print_stage_time(self, stage_name: str, stage_time: float):
+        self.__stage_times[stage_name] = stage_time
+        print(f"Time to {stage_name}: {stage_time:.3f}s")
+
+    def get_n_customers(self) -> int:
+        return len(self.customer_ids)
+
+    def get_n_terminals(self) -> int:
+        return len(self.terminal_ids)
+
+    def get_pair_tx_counts(self) -> np.ndarray:
+        """
+        :return: Number of transactions of each spending pair.
+        """
+
+        return np.diff(self.pair_offsets)
+
+    def get_pair_sums(self, values: np.ndarray) -> np.ndarray:
+        """
+        :param values: A value for each transaction, e.g. tx_amounts.
+        :return: Sum of the values of the transactions of each spending pair.
+        """
+
+        pairs = np.repeat(np.arange(len(self.pair_customers)), self.get_pair_tx_counts())
+        return np.bincount(pairs, weights=values, minlength=len(self.pair_customers))
+
+    def load_dataset(self, dataset_path: str) -> float:
+        """
+        Load the dataset located in the specified dataset_path, replacing the current one.
+
+        :param dataset_path: path where the datasets to load is stored.
+        :return: Loading execution time in seconds.
+        """
+
+        self.__stage_times = {}
+
+        start_time = time.time()
+        customer_profiles_table, terminal_profiles_table, transactions_df = dataset_io.read_dataset(dataset_path)
+        read_time = time.time() - start_time
+        self.__print_stage_time("read dataset", read_time)
+
+        start_time = time.time()
+        self.__build(customer_profiles_table, terminal_profiles_table, transactions_df)
+        build_time = time.time() - start_time
+        self.__print_stage_time("build in-memory graph", build_time)
+
+        return read_time + build_time
+
+    def __build(self, customer_profiles_table, terminal_profiles_table, transactions_df):
+        self.customer_ids = np.unique(customer_profiles_table.CUSTOMER_ID.values.astype(np.int64))
+        self.terminal_ids = np.unique(terminal_profiles_table.TERMINAL_ID.values.astype(np.int64))
+        n_customers = len(self.customer_ids)
+        n_terminals = len(self.terminal_ids)
+
+        tx_customers = np.searchsorted(self.customer_ids, transactions_df.CUSTOMER_ID.values)
+        tx_terminals = np.searchsorted(self.terminal_ids, transactions_df.TERMINAL_ID.values)
+        tx_datetimes = transactions_df.TX_DATETIME.values.astype('datetime64[s]')
+        order = np.lexsort((tx_datetimes, tx_terminals, tx_customers))
+
+        self.tx_ids = transactions_df.TRANSACTION_ID.values[order].astype(np.int64)
+        self.tx_customers = tx_customers[order]
+        self.tx_terminals = tx_terminals[order]
+        self.tx_datetimes = tx_datetimes[order]
+        # Amounts as written by the Loader
+        self.tx_amounts = transactions_df.TX_AMOUNT.values[order].astype(np.float64).round(2)
+        self.tx_fraudulent = transactions_df.TX_FRAUD.values[order] == 1
+        if 'TX_SECURITY_FEELING' in transactions_df.columns:
+            self.tx_period_of_day = transactions_df.TX_PERIOD_OF_DAY.values[order].astype(object)
+            self.tx_product_type = transactions_df.TX_PRODUCT_TYPE.values[order].astype(object)
+            self.tx_security_feeling = transactions_df.TX_SECURITY_FEELING.values[order].astype(np.int64)
+        else:
+            self.tx_period_of_day = None
+            self.tx_product_type = None
+            self.tx_security_feeling = None
+
+        # Spending pairs, the transactions are already sorted by (customer, terminal)
+        pair_keys = self.tx_customers * n_terminals + self.tx_terminals
+        pair_starts = np.flatnonzero(np.diff(pair_keys, prepend=-1)) if len(pair_keys) else np.zeros(0, dtype=np.int64)
+        self.pair_customers = self.tx_customers[pair_starts]
+        self.pair_terminals = self.tx_terminals[pair_starts]
+        self.pair_offsets = np.append(pair_starts, len(pair_keys)).astype(np.int64)
+        self.customer_offsets = _to_offsets(self.pair_customers, n_customers)
+        self.terminal_pairs = np.lexsort((self.pair_customers, self.pair_terminals))
+        self.terminal_offsets = _to_offsets(self.pair_terminals, n_terminals)
+
+        available_terminals = customer_profiles_table.available_terminals
+        access_customers = np.searchsorted(
+            self.customer_ids, np.repeat(customer_profiles_table.CUSTOMER_ID.values, available_terminals.apply(len)))
+        access_terminals = np.searchsorted(
+            self.terminal_ids,
+            np.fromiter((t for terminals in available_terminals for t in terminals), dtype=np.int64))
+        access_keys = np.unique(access_customers * n_terminals + access_terminals)
+        self.access_terminals = access_keys % n_terminals
+        self.access_offsets = _to_offsets(access_keys // n_terminals, n_customers)
+
+        self.buying_friends = np.zeros(0, dtype=np.int64)
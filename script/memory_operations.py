@@ -0,0 +1,320 @@
+import time
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+import script.data_simulator as data_simulator
+from script.memory_graph import MemoryGraph
+
+# Maximum number of (left entry, right entry) pairs expanded at once by the pair operations
+PAIR_BLOCK_SIZE = 1 << 22
+
+
+def _iter_terminal_pairs(left_keys: np.ndarray, left_terminals: np.ndarray, right_offsets: np.ndarray):
+    """
+    Pair every left entry, e.g. a (customer, terminal) pair, with all the right entries of its terminal, given in CSR
+    form by right_offsets. The pairs are generated in blocks of about PAIR_BLOCK_SIZE pairs that never split the
+    entries of a left key, so that the aggregates of each key are computed in a single block.
+
+    :param left_keys: Keys of the left entries, sorted.
+    :param left_terminals: Terminal index of each left entry.
+    :param right_offsets: Offsets of the right entries of each terminal.
+    :return: A generator of (left index, right index) arrays.
+    """
+
+    counts = right_offsets[left_terminals + 1] - right_offsets[left_terminals]
+    ends = np.cumsum(counts)
+    start = 0
+    while start < len(left_keys):
+        end = max(int(np.searchsorted(ends, (ends[start - 1] if start > 0 else 0) + PAIR_BLOCK_SIZE, side='right')),
+                  start + 1)
+        end = int(np.searchsorted(left_keys, left_keys[end - 1], side='right'))
+
+        block_counts = counts[start:end]
+        total = int(block_counts.sum())
+        if total > 0:
+            first_pair = np.cumsum(block_counts) - block_counts
+            left_index = np.repeat(np.arange(start, end), block_counts)
+            right_index = np.arange(total) - np.repeat(first_pair - right_offsets[left_terminals[start:end]],
+                                                       block_counts)
+            yield left_index, right_index
+        start = end
+
+
+class MemoryOperations:
+    def __init__(self, graph: MemoryGraph, random_state: int = 2):
+        """
+        A class to execute the operations on a dataset held in memory by a MemoryGraph, with the same interface of
+        Operations: every operation returns its execution time and its result, with the columns returned by the
+        query of Operations, is available with get_last_result. It needs no database, so it can be used for local
+        analysis, to cross-check the results of the database and as a performance baseline.
+
+        :param graph: In-memory graph.
+        :param random_state: Random state of the random values of operation d.i, drawn as in the Generator.
+        """
+
+        self.__graph = graph
+        self.__random_state = random_state
+        self.__last_result = None
+
+    def get_profiles(self) -> dict[str, dict]:
+        """
+        The operations are not executed as queries, so there are no query plans.
+
+        :return: An empty dictionary.
+        """
+
+        return {}
+
+    def get_last_result(self) -> pd.DataFrame:
+        """
+        Get the result of the last operation.
+
+        :return: Result of the operation.
+        """
+
+        return self.__last_result
+
+    def __set_result(self, result: pd.DataFrame, query_name: str, start_time: float) -> float:
+        self.__last_result = result
+        execution_time = time.time() - start_time
+        print(f"Time to execute query {query_name}: {execution_time:.3f}s")
+
+        return execution_time
+
+    def operation_a(self):
+        """
+        Operation a, see Operations.operation_a. As in the query, the amount of X is summed once for every transaction
+        of Y on the same terminal and the amount of Y once for every relationship of X with the terminal.
+        """
+
+        start_time = time.time()
+        graph = self.__graph
+        n_customers = graph.get_n_customers()
+        n_terminals = graph.get_n_terminals()
+
+        # Relationships of X with each terminal: ACCESS_TO and transactions
+        pair_counts = graph.get_pair_tx_counts()
+        pair_amounts = graph.get_pair_sums(graph.tx_amounts)
+        access_customers = np.repeat(np.arange(n_customers), np.diff(graph.access_offsets))
+        x_keys, x_inverse = np.unique(np.concatenate((access_customers * n_terminals + graph.access_terminals,
+                                                      graph.pair_customers * n_terminals + graph.pair_terminals)),
+                                      return_inverse=True)
+        x_counts = np.bincount(x_inverse, weights=np.concatenate((np.ones(len(access_customers)), pair_counts)))
+        x_amounts = np.bincount(x_inverse, weights=np.concatenate((np.zeros(len(access_customers)), pair_amounts)))
+        x_customers = x_keys // n_terminals
+        x_terminals = x_keys % n_terminals
+
+        # Transactions of Y on each terminal
+        y_customers = graph.pair_customers[graph.terminal_pairs]
+        y_counts = pair_counts[graph.terminal_pairs]
+        y_amounts = pair_amounts[graph.terminal_pairs]
+
+        results = []
+        for left, right in _iter_terminal_pairs(x_customers, x_terminals, graph.terminal_offsets):
+            distinct = x_customers[left] != y_customers[right]
+            left, right = left[distinct], right[distinct]
+            keys, inverse = np.unique(x_customers[left] * n_customers + y_customers[right], return_inverse=True)
+            shared_terminals = np.bincount(inverse)
+            amount_x = np.bincount(inverse, weights=x_amounts[left] * y_counts[right])
+            amount_y = np.bincount(inverse, weights=y_amounts[right] * x_counts[left])
+
+            selected = (shared_terminals >= 3) & (np.abs(amount_x - amount_y) < 0.1 * amount_x)
+            results.append(pd.DataFrame({
+                'customer_x': graph.customer_ids[keys[selected] // n_customers],
+                'amount_x': amount_x[selected],
+                'customer_y': graph.customer_ids[keys[selected] % n_customers],
+                'amount_y': amount_y[selected]
+            }))
+
+        result = pd.concat(results, ignore_index=True) if results else pd.DataFrame(
+            columns=['customer_x', 'amount_x', 'customer_y', 'amount_y'])
+
+        return self.__set_result(result, "a", start_time)
+
+    def operation_b(self, as_of: str = None):
+        """
+        Operation b, see Operations.operation_b.
+
+        :param as_of: Reference date in ISO format, the current month is the month before it and the previous month
+            the one before that. If None, the current date is used.
+        """
+
+        start_time = time.time()
+        graph = self.__graph
+        n_terminals = graph.get_n_terminals()
+
+        # Month arithmetic clamps the day to the end of the month, as the durations of Cypher
+        current_date = pd.Timestamp(as_of if as_of is not None else date.today()).normalize()
+        previous_month_start = np.datetime64(current_date - pd.DateOffset(months=2), 's')
+        current_month_start = np.datetime64(current_date - pd.DateOffset(months=1), 's')
+        current_month_end = np.datetime64(current_date, 's')
+
+        previous_month = (graph.tx_datetimes >= previous_month_start) & (graph.tx_datetimes < current_month_start)
+        previous_counts = np.bincount(graph.tx_terminals[previous_month], minlength=n_terminals)
+        previous_sums = np.bincount(graph.tx_terminals[previous_month], weights=graph.tx_amounts[previous_month],
+                                    minlength=n_terminals)
+        avg_amount_last_month = np.divide(previous_sums, previous_counts, out=np.full(n_terminals, np.nan),
+                                          where=previous_counts > 0)
+
+        current_month = (graph.tx_datetimes >= current_month_start) & (graph.tx_datetimes < current_month_end)
+        avg_amounts = avg_amount_last_month[graph.tx_terminals]
+        selected = np.flatnonzero(current_month & (previous_counts[graph.tx_terminals] > 0) &
+                                  (graph.tx_amounts - avg_amounts > 0.2 * avg_amounts))
+
+        selected = selected[np.lexsort((graph.tx_ids[selected], graph.tx_terminals[selected]))]
+        terminals, first_transactions = np.unique(graph.tx_terminals[selected], return_index=True)
+        result = pd.DataFrame({
+            'terminal_id': graph.terminal_ids[terminals],
+            'possible_fraudulent_transaction': [transaction_ids.tolist() for transaction_ids in
+                                                np.split(graph.tx_ids[selected], first_transactions[1:])]
+            if len(terminals) > 0 else []
+        })
+
+        return self.__set_result(result, "b", start_time)
+
+    def __get_co_customer_neighbors(self, customer: int, neighbors: dict[int, np.ndarray]) -> np.ndarray:
+        # Customers with a transaction on a terminal of the customer, computed once per customer
+        if customer not in neighbors:
+            graph = self.__graph
+            terminals = graph.pair_terminals[graph.customer_offsets[customer]:graph.customer_offsets[customer + 1]]
+            pairs = np.concatenate([graph.terminal_pairs[graph.terminal_offsets[t]:graph.terminal_offsets[t + 1]]
+                                    for t in terminals]) if len(terminals) > 0 else np.zeros(0, dtype=np.int64)
+            customers = np.unique(graph.pair_customers[pairs])
+            neighbors[customer] = customers[customers != customer]
+
+        return neighbors[customer]
+
+    def operation_c(self, u_customer_id: int, k: int):
+        """
+        Operation c, see Operations.operation_c. As in the query, the chains are expanded one customer at a time,
+        keeping the distinct (last customer, customers of the chain) states, and the co-customers of degree k are
+        the last customers of the chains of k distinct customers.
+        """
+
+        start_time = time.time()
+        graph = self.__graph
+
+        position = int(np.searchsorted(graph.customer_ids, u_customer_id))
+        if k < 2 or position >= len(graph.customer_ids) or graph.customer_ids[position] != u_customer_id:
+            return self.__set_result(pd.DataFrame({'co_customer': np.zeros(0, dtype=np.int64)}), "c", start_time)
+
+        neighbors = {}
+        states = {(position, frozenset([position]))}
+        for _ in range(2, k):
+            states = {(customer, path | {customer})
+                      for last_customer, path in states
+                      for customer in self.__get_co_customer_neighbors(last_customer, neighbors).tolist()
+                      if customer not in path}
+
+        co_customers = np.zeros(graph.get_n_customers(), dtype=bool)
+        for last_customer, path in states:
+            customers = self.__get_co_customer_neighbors(last_customer, neighbors)
+            co_customers[customers[~np.isin(customers, list(path))]] = True
+
+        result = pd.DataFrame({'co_customer': graph.customer_ids[co_customers]})
+
+        return self.__set_result(result, "c", start_time)
+
+    def operation_d_i(self):
+        """
+        Operation d.i, see Operations.operation_d_i. The period of the day is the one of the time of the transaction
+        and the kind of product and the feeling of security are drawn as by the Generator with the extension of d.i.
+        """
+
+        start_time = time.time()
+        graph = self.__graph
+
+        graph.tx_period_of_day, graph.tx_product_type, graph.tx_security_feeling = \
+            data_simulator.get_transactions_extension(graph.tx_ids, graph.tx_datetimes.astype(np.int64),
+                                                      self.__random_state)
+
+        result = pd.DataFrame({
+            'transaction_id': graph.tx_ids,
+            'period_of_day': graph.tx_period_of_day,
+            'product_type': graph.tx_product_type,
+            'security_feeling': graph.tx_security_feeling
+        })
+
+        return self.__set_result(result, "d.i", start_time)
+
+    def operation_d_ii(self):
+        """
+        Operation d.ii, see Operations.operation_d_ii. As in the query, for each customer c1 the terminals on which
+        c1 has more than three transactions are grouped by the average feeling of security of c1, and the
+        transactions of every other customer c2 on all the terminals of a group are counted and averaged together.
+        The new BUYING_FRIEND relationships are merged with the existing ones of the graph.
+        """
+
+        start_time = time.time()
+        graph = self.__graph
+        n_customers = graph.get_n_customers()
+
+        if graph.tx_security_feeling is not None:
+            pair_counts = graph.get_pair_tx_counts()
+            pair_security_feelings = graph.get_pair_sums(graph.tx_security_feeling.astype(np.float64))
+
+            # Groups of the (c1, terminal) pairs with more than three transactions by (c1, average feeling)
+            left = np.flatnonzero(pair_counts > 3)
+            left_averages = pair_security_feelings[left] / pair_counts[left]
+            left = left[np.lexsort((left_averages, graph.pair_customers[left]))]
+            left_averages = pair_security_feelings[left] / pair_counts[left]
+            left_customers = graph.pair_customers[left]
+            new_group = np.ones(len(left), dtype=bool)
+            new_group[1:] = (np.diff(left_customers) != 0) | (np.diff(left_averages) != 0)
+            left_groups = np.cumsum(new_group) - 1
+
+            right_customers = graph.pair_customers[graph.terminal_pairs]
+            right_counts = pair_counts[graph.terminal_pairs]
+            right_security_feelings = pair_security_feelings[graph.terminal_pairs]
+
+            friendships = [graph.buying_friends]
+            for left_index, right_index in _iter_terminal_pairs(left_groups, graph.pair_terminals[left],
+                                                                graph.terminal_offsets):
+                distinct = left_customers[left_index] != right_customers[right_index]
+                left_index, right_index = left_index[distinct], right_index[distinct]
+                keys, first_pairs, inverse = np.unique(left_groups[left_index] * n_customers +
+                                                       right_customers[right_index],
+                                                       return_index=True, return_inverse=True)
+                c2_counts = np.bincount(inverse, weights=right_counts[right_index])
+                c2_averages = np.bincount(inverse, weights=right_security_feelings[right_index]) / c2_counts
+
+                selected = (c2_counts > 3) & (np.abs(left_averages[left_index[first_pairs]] - c2_averages) < 1)
+                friendships.append(left_customers[left_index[first_pairs[selected]]] * n_customers +
+                                   keys[selected] % n_customers)
+
+            graph.buying_friends = np.unique(np.concatenate(friendships))
+
+        result = pd.DataFrame({
+            'customer_id_1': graph.customer_ids[graph.buying_friends // n_customers],
+            'customer_id_2': graph.customer_ids[graph.buying_friends % n_customers]
+        })
+
+        return self.__set_result(result, "d.ii", start_time)
+
+    def operation_e(self):
+        """
+        Operation e, see Operations.operation_e. Before operation d.i the period of the day is null for all the
+        transactions, as in the database.
+        """
+
+        start_time = time.time()
+        graph = self.__graph
+
+        if graph.tx_period_of_day is None:
+            result = pd.DataFrame({
+                'period_of_day': [None],
+                'transactions': [len(graph.tx_ids)],
+                'avg_fraudulent_transactions': [graph.tx_fraudulent.mean() if len(graph.tx_ids) > 0 else None]
+            })
+        else:
+            periods, inverse = np.unique(graph.tx_period_of_day.astype(str), return_inverse=True)
+            transactions = np.bincount(inverse)
+            result = pd.DataFrame({
+                'period_of_day': periods.astype(object),
+                'transactions': transactions,
+                'avg_fraudulent_transactions': np.bincount(inverse, weights=graph.tx_fraudulent) / transactions
+            })
+
+        return self.__set_result(result, "e", start_time)
@@ -1,15 +1,105 @@
+import time
+from datetime import date
+
+import pandas as pd
+
+from script.co_customers import CoCustomerEngine
 from script.database import DatabaseInstance
+from script.profiling import summarize_profile
 
 
 class Operations:
-    def __init__(self, db: DatabaseInstance):
+    def __init__(self, db: DatabaseInstance, profile: bool = False):
         """
         A class to handle some operations on the dataset loaded in the database.
 
         :param db: Database instance.
+        :param profile: If True, the operations are executed under PROFILE and the summary of the plan of the last
+            execution of each operation is available with get_profiles.
         """
 
         self.__db = db
+        self.__profile = profile
+        self.__profiles = {}
+        self.__last_result = None
+
+    def get_profiles(self) -> dict[str, dict]:
+        """
+        Get the profiles of the operations executed in profiling mode.
+
+        :return: Dictionary from operation name to the summary of its plan, as returned by summarize_profile.
+        """
+
+        return dict(self.__profiles)
+
+    def get_last_result(self):
+        """
+        Get the result of the last operation computed on the client side, e.g. operation_c_frontier.
+
+        :return: Result of the operation.
+        """
+
+        return self.__last_result
+
+    def __execute(self, query: str, query_name: str, **kwargs) -> float:
+        if not self.__profile:
+            return self.__db.execute_query(query, query_name=query_name, **kwargs)
+
+        execution_time, profile = self.__db.profile_query(query, query_name=query_name, **kwargs)
+        self.__profiles[query_name] = summarize_profile(profile)
+
+        return execution_time
+
+    def get_read_queries(self, u_customer_id: int, k: int, as_of: str = None) -> dict[str, tuple[str, dict]]:
+        """
+        Get the queries of the read-only operations that do not depend on the extension of the transactions made by
+        operation d.i, so that they can be executed together, e.g. concurrently with AsyncDatabaseInstance.
+
+        :param u_customer_id: Customer id of the user u of operation c.
+        :param k: Degree of operation c, the operation is left out if it has no solutions.
+        :param as_of: Reference date of operation b.
+        :return: Dictionary from operation name to a (query string, parameters) tuple.
+        """
+
+        queries = {
+            "a": (self.__get_query_a(), {}),
+            "b": (self.__get_query_b(), {"as_of": as_of})
+        }
+        if k >= 2:
+            queries["c"] = (self.__get_query_c(u_customer_id, k), {})
+
+        return queries
+
+    def __get_read_variant_queries(self, as_of: str = None) -> dict[str, tuple[str, dict]]:
+        # Read-only variants of the operations, on the aggregates materialized by the Loader
+        return {
+            "a.aggregated": (self.__get_query_a_aggregated(), {}),
+            "a.shared_terminals": (self.__get_query_a_shared_terminals(), {}),
+            "b.aggregated": self.__get_query_b_aggregated(as_of)
+        }
+
+    def fetch_read_operation(self, name: str, u_customer_id: int = 0, k: int = 3, as_of: str = None,
+                             fetch_size: int = 1000, output: str = 'pandas'):
+        """
+        Execute one of the read-only operations returned by get_read_queries and fetch its result, streamed from the
+        database in batches of fetch_size records.
+
+        :param name: Operation name, 'a', 'b' or 'c', or one of their read-only variants, e.g. 'a.aggregated'.
+        :param u_customer_id: Customer id of the user u of operation c.
+        :param k: Degree of operation c.
+        :param as_of: Reference date of operation b.
+        :param fetch_size: Number of records pulled from the database at each step.
+        :param output: 'records', 'numpy' or 'pandas', as in DatabaseInstance.stream_query.
+        :return: A tuple containing the result of the operation and the statistics of the query.
+        """
+
+        queries = self.get_read_queries(u_customer_id, k, as_of)
+        queries.update(self.__get_read_variant_queries(as_of))
+        if name not in queries:
+            raise ValueError(f"Unknown read operation '{name}', expected one of {list(queries)}")
+
+        query, parameters = queries[name]
+        return self.__db.fetch_query(query, query_name=name, fetch_size=fetch_size, output=output, **parameters)
 
     def operation_a(self):
         """
@@ -19,7 +109,11 @@ class Operations:
         spending amount of the related costumer Y and the spending amount of Y.
         """
 
-        query = """
+        return self.__execute(self.__get_query_a(), "a")
+
+    @staticmethod
+    def __get_query_a() -> str:
+        return """
         MATCH (x:Customer)-[tx_x:ACCESS_TO|TRANSACTION]->(t:Terminal)<-[tx_y:TRANSACTION]-(y:Customer)
         WHERE x <> y
         WITH x.customer_id AS customer_x,
@@ -32,33 +126,173 @@ class Operations:
         RETURN customer_x, amount_x, customer_y, amount_y
         """
 
-        return self.__db.execute_query(query, query_name="a")
+    def operation_a_aggregated(self):
+        """
+        Variant of operation a that reads the SPENT_AT aggregates materialized by the Loader instead of the single
+        transactions, so that the expansion grows with the number of distinct (customer, terminal) pairs. It returns
+        the same customers and amounts of operation a, which sums the amounts over every (x)-[]->(t)<-[]-(y) path: on
+        each shared terminal, the amount of X is counted once for each transaction of Y, and the amount of Y once for
+        each relationship of X, ACCESS_TO included.
+        """
 
-    def operation_b(self):
+        return self.__execute(self.__get_query_a_aggregated(), "a.aggregated")
+
+    @staticmethod
+    def __get_query_a_aggregated() -> str:
+        return """
+        MATCH (x:Customer)-[:ACCESS_TO|SPENT_AT]->(t:Terminal)<-[s_y:SPENT_AT]-(y:Customer)
+        WHERE x <> y
+        WITH DISTINCT x, y, t, s_y
+        OPTIONAL MATCH (x)-[s_x:SPENT_AT]->(t)
+        WITH x, y, t, s_y, s_x, COUNT { (x)-[:ACCESS_TO]->(t) } AS x_access_count
+        WITH x.customer_id AS customer_x,
+           y.customer_id AS customer_y,
+           SUM(COALESCE(s_x.total_amount, 0) * s_y.tx_count) AS amount_x,
+           SUM(s_y.total_amount * (COALESCE(s_x.tx_count, 0) + x_access_count)) AS amount_y,
+           COUNT(t) AS shared_terminals
+
+        WHERE shared_terminals >= 3 AND ABS(amount_x - amount_y) < 0.1 * amount_x
+        RETURN customer_x, amount_x, customer_y, amount_y
+        """
+
+    def operation_a_shared_terminals(self):
+        """
+        Variant of operation a that starts from the SHARES_TERMINALS index loaded by Loader.load_shared_terminals,
+        which already contains only the customer pairs with at least 3 shared terminals, and computes the spending
+        amounts of X and Y on the shared terminals from the SPENT_AT aggregates, weighted as in
+        operation_a_aggregated so that they are the amounts of operation a.
+        """
+
+        return self.__execute(self.__get_query_a_shared_terminals(), "a.shared_terminals")
+
+    @staticmethod
+    def __get_query_a_shared_terminals() -> str:
+        return """
+        MATCH (x:Customer)-[shares:SHARES_TERMINALS]->(y:Customer)
+        WHERE shares.count >= 3
+        MATCH (y)-[s_y:SPENT_AT]->(t:Terminal)
+        WHERE EXISTS { (x)-[:ACCESS_TO|SPENT_AT]->(t) }
+        OPTIONAL MATCH (x)-[s_x:SPENT_AT]->(t)
+        WITH x, y, t, s_y, s_x, COUNT { (x)-[:ACCESS_TO]->(t) } AS x_access_count
+        WITH x.customer_id AS customer_x,
+           y.customer_id AS customer_y,
+           SUM(COALESCE(s_x.total_amount, 0) * s_y.tx_count) AS amount_x,
+           SUM(s_y.total_amount * (COALESCE(s_x.tx_count, 0) + x_access_count)) AS amount_y
+
+        WHERE ABS(amount_x - amount_y) < 0.1 * amount_x
+        RETURN customer_x, amount_x, customer_y, amount_y
+        """
+
+    def operation_b(self, as_of: str = None):
         """
         For each terminal identify the possible fraudulent transactions of the current month. The
         fraudulent transactions are those whose import is higher than 20% of the average import of
         the transactions executed on the same terminal in the previous month.
+
+        :param as_of: Reference date in ISO format (e.g. '2025-06-01'), the current month is the month before it
+            and the previous month the one before that. If None, the current date of the server is used.
         """
 
-        query = """
-        WITH date() AS current_date
+        return self.__execute(self.__get_query_b(), "b", as_of=as_of)
+
+    @staticmethod
+    def __get_query_b() -> str:
+        # The months are compared on the datetimes, so that the transactions of each month are a range of the
+        # transaction datetime index
+        return """
+        WITH COALESCE(date($as_of), date()) AS current_date
+        WITH datetime({date: current_date - duration({months: 2})}) AS previous_month_start,
+            datetime({date: current_date - duration({months: 1})}) AS current_month_start,
+            datetime({date: current_date}) AS current_month_end
         
         MATCH (t:Terminal)<-[tx:TRANSACTION]-(:Customer)
-        WITH t, tx, date(tx.datetime) AS tx_datetime, current_date
-        WHERE tx_datetime >= current_date - duration({months: 2}) AND tx_datetime < current_date - duration({months: 1})
-        WITH t, AVG(tx.amount) AS avg_amount_last_month, current_date
+        WHERE tx.datetime >= previous_month_start AND tx.datetime < current_month_start
+        WITH t, AVG(tx.amount) AS avg_amount_last_month, current_month_start, current_month_end
         
         MATCH (t)<-[tx:TRANSACTION]-(:Customer)
-        WITH t.terminal_id AS terminal_id, avg_amount_last_month, current_date, tx, date(tx.datetime) AS tx_datetime
-        WHERE tx_datetime >= current_date - duration({months: 1}) AND tx_datetime < current_date
-        WITH terminal_id, avg_amount_last_month, tx.transaction_id AS transaction_id, tx.amount AS amount
+        WHERE tx.datetime >= current_month_start AND tx.datetime < current_month_end
+        WITH t.terminal_id AS terminal_id, avg_amount_last_month,
+            tx.transaction_id AS transaction_id, tx.amount AS amount
         
         WHERE amount - avg_amount_last_month > 0.2 * avg_amount_last_month
         RETURN terminal_id, COLLECT(transaction_id) AS possible_fraudulent_transaction
         """
 
-        return self.__db.execute_query(query, query_name="b")
+    def operation_b_aggregated(self, as_of: str = None):
+        """
+        Variant of operation b, on the same months, that reads the average import of the previous month of each
+        terminal from the TerminalMonth aggregates materialized by the Loader. The previous month generally overlaps
+        two calendar months: each of them is read from its aggregate when it is fully covered, otherwise from the
+        cheaper between its transactions in the previous month and its aggregate minus its transactions outside of it,
+        read with the transaction datetime index. The transactions of the current month are read as in operation b,
+        so the result is the one of operation b up to the rounding of the sums.
+
+        :param as_of: Reference date in ISO format (e.g. '2025-06-01'), the current month is the month before it
+            and the previous month the one before that. If None, the current date of the client is used, since the
+            calendar months to read are computed before the query.
+        """
+
+        query, parameters = self.__get_query_b_aggregated(as_of)
+
+        return self.__execute(query, "b.aggregated", **parameters)
+
+    @staticmethod
+    def __get_query_b_aggregated(as_of: str = None) -> tuple[str, dict]:
+        # Month arithmetic clamps the day to the end of the month, as the durations of Cypher
+        current_date = pd.Timestamp(as_of if as_of is not None else date.today()).normalize()
+        previous_month_start = current_date - pd.DateOffset(months=2)
+        current_month_start = current_date - pd.DateOffset(months=1)
+
+        # Calendar months added (sign 1) and date ranges of transactions added or subtracted (sign -1) to cover the
+        # previous month
+        months = []
+        ranges = []
+        month_start = previous_month_start.replace(day=1)
+        while month_start < current_month_start:
+            month_end = month_start + pd.DateOffset(months=1)
+            start = max(month_start, previous_month_start)
+            end = min(month_end, current_month_start)
+            if end - start <= (month_end - month_start) - (end - start):
+                ranges.append({'start': str(start.date()), 'end': str(end.date()), 'sign': 1})
+            else:
+                months.append({'month': str(month_start.date()), 'sign': 1})
+                ranges.extend({'start': str(range_start.date()), 'end': str(range_end.date()), 'sign': -1}
+                              for range_start, range_end in ((month_start, start), (end, month_end))
+                              if range_start < range_end)
+            month_start = month_end
+
+        query = """
+        CALL () {
+            UNWIND $months AS month
+            MATCH (t:Terminal)-[:HAS_MONTH]->(m:TerminalMonth {month: date(month.month)})
+            RETURN t, month.sign * m.total_amount AS amount, month.sign * m.tx_count AS tx_count
+            UNION ALL
+            UNWIND $ranges AS date_range
+            MATCH (t:Terminal)<-[tx:TRANSACTION]-(:Customer)
+            WHERE tx.datetime >= datetime({date: date(date_range.start)})
+                AND tx.datetime < datetime({date: date(date_range.end)})
+            RETURN t, date_range.sign * tx.amount AS amount, date_range.sign AS tx_count
+        }
+        WITH t, SUM(amount) AS total_amount, SUM(tx_count) AS tx_count
+        WHERE tx_count > 0
+        WITH t, total_amount / tx_count AS avg_amount_last_month
+
+        MATCH (t)<-[tx:TRANSACTION]-(:Customer)
+        WHERE tx.datetime >= datetime({date: date($current_month_start)})
+            AND tx.datetime < datetime({date: date($current_month_end)})
+        WITH t.terminal_id AS terminal_id, avg_amount_last_month,
+            tx.transaction_id AS transaction_id, tx.amount AS amount
+
+        WHERE amount - avg_amount_last_month > 0.2 * avg_amount_last_month
+        RETURN terminal_id, COLLECT(transaction_id) AS possible_fraudulent_transaction
+        """
+
+        return query, {
+            'months': months,
+            'ranges': ranges,
+            'current_month_start': str(current_month_start.date()),
+            'current_month_end': str(current_date.date())
+        }
 
     def operation_c(self, u_customer_id: int, k: int):
         """
@@ -74,6 +308,10 @@ class Operations:
         if k < 2:
             return []
 
+        return self.__execute(self.__get_query_c(u_customer_id, k), "c")
+
+    @staticmethod
+    def __get_query_c(u_customer_id: int, k: int) -> str:
         query_sections = []
         for i in range(1, k):
             if i == 1:
@@ -94,7 +332,23 @@ class Operations:
         RETURN DISTINCT u{k}.customer_id AS co_customer
         """
 
-        return self.__db.execute_query(query, query_name="c")
+        return query
+
+    def operation_c_frontier(self, u_customer_id: int, k: int):
+        """
+        Variant of operation c that computes the co-customers with CoCustomerEngine, a breadth-first search over the
+        customers that share terminals, with parameterized queries instead of one MATCH clause per degree. Each
+        customer is assigned to the smallest degree at which it can be reached, so the co-customers of degree k are
+        the ones whose shortest chain from u has k customers. The co-customers of each degree up to k are available
+        with get_last_result.
+        """
+
+        start_time = time.time()
+        self.__last_result = CoCustomerEngine(self.__db).search([u_customer_id], k)[u_customer_id]
+        execution_time = time.time() - start_time
+        print(f"Time to execute query c.frontier: {execution_time:.3f}s")
+
+        return execution_time
 
     def operation_d_i(self):
         """
@@ -125,7 +379,41 @@ class Operations:
         tx.security_feeling = toInteger(rand() * 5) + 1
         """
 
-        return self.__db.execute_query(query, query_name="d.i")
+        return self.__execute(query, "d.i")
+
+    def operation_d_i_batched(self, batch_size: int = 10000, concurrency: int = 4):
+        """
+        Operation d.i for graphs that are already loaded, with the same values of operation_d_i, executed in batches of
+        batch_size transactions committed by up to concurrency parallel transactions, instead of a single transaction
+        that rewrites all the TRANSACTION relationships. The batches write disjoint relationships, so they do not
+        conflict. Datasets generated with the extension of d.i do not need it, the Loader sets it at creation.
+
+        :param batch_size: Number of relationships updated by each transaction.
+        :param concurrency: Maximum number of transactions executed in parallel.
+        """
+
+        query = """
+        MATCH ()-[tx:TRANSACTION]->()
+        CALL (tx) {
+            WITH tx, time(tx.datetime).hour AS hour, rand() AS rand
+            SET tx.period_of_day = CASE
+                WHEN hour >= 6 AND hour < 12 THEN 'morning'
+                WHEN hour >= 12 AND hour < 18 THEN 'afternoon'
+                WHEN hour >= 18 AND hour < 22 THEN 'evening'
+                ELSE 'night'
+            END,
+            tx.product_type = CASE
+                WHEN rand < 0.2 THEN 'hightech'
+                WHEN rand < 0.4 THEN 'food'
+                WHEN rand < 0.6 THEN 'clothing'
+                WHEN rand < 0.8 THEN 'consumable'
+                ELSE 'other'
+            END,
+            tx.security_feeling = toInteger(rand() * 5) + 1
+        } IN $concurrency CONCURRENT TRANSACTIONS OF $batch_size ROWS
+        """
+
+        return self.__execute(query, "d.i.batched", batch_size=batch_size, concurrency=concurrency)
 
     def operation_d_ii(self):
         """
@@ -152,7 +440,34 @@ class Operations:
         MERGE (c1)-[:BUYING_FRIEND]->(c2)
         """
 
-        return self.__db.execute_query(query, query_name="d.ii")
+        return self.__execute(query, "d.ii")
+
+    def operation_d_ii_aggregated(self):
+        """
+        Variant of operation d.ii that reads the number of transactions and the feelings of security of each
+        customer on each terminal from the SPENT_AT aggregates materialized by the Loader, which must be materialized
+        after operation d.i. It connects the same customers of operation d.ii: the terminals on which c1 has more than
+        three transactions are grouped by the average feeling of security of c1, and the transactions of c2 are
+        counted and averaged over all the terminals of each group.
+        """
+
+        query = """
+        MATCH (c1:Customer)-[s1:SPENT_AT]->(t:Terminal)
+        WHERE s1.tx_count > 3
+        WITH c1, t, s1.avg_security_feeling AS c1_avg_security
+
+        MATCH (c2:Customer)-[s2:SPENT_AT]->(t)
+        WHERE c1 <> c2
+        WITH c1, c2, c1_avg_security, SUM(s2.tx_count) AS tx2_count,
+            SUM(s2.security_feeling_sum) AS security_feeling_sum,
+            SUM(s2.security_feeling_count) AS security_feeling_count
+        WHERE tx2_count > 3 AND security_feeling_count > 0
+            AND ABS(c1_avg_security - toFloat(security_feeling_sum) / security_feeling_count) < 1
+        WITH DISTINCT c1, c2
+        MERGE (c1)-[:BUYING_FRIEND]->(c2)
+        """
+
+        return self.__execute(query, "d.ii.aggregated")
 
     def operation_e(self):
         """
@@ -160,10 +475,12 @@ class Operations:
         and the average number of fraudulent transactions.
         """
 
-        query = """
+        return self.__execute(self.__get_query_e(), "e")
+
+    @staticmethod
+    def __get_query_e() -> str:
+        return """
         MATCH ()-[tx:TRANSACTION]->()
         RETURN tx.period_of_day AS period_of_day, COUNT(tx) AS transactions,
             AVG(CASE WHEN tx.fraudulent THEN 1 ELSE 0 END) AS avg_fraudulent_transactions
-        """
-
-        return self.__db.execute_query(query, query_name="e")
\ No newline at end of file
+        """
\ No newline at end of file
@@ -0,0 +1,77 @@
+def flatten_profile(profile: dict, depth: int = 0) -> list[dict]:
+    """
+    Flatten the plan tree of a PROFILE query, as returned by the server in the result summary, into the list of its
+    operators in pre-order.
+
+    :param profile: Profiled plan tree.
+    :param depth: Depth of the root operator of the tree.
+    :return: One dictionary per operator with its depth, type, details, identifiers, db hits, rows, estimated rows,
+        page cache hits and misses and time in milliseconds.
+    """
+
+    if not profile:
+        return []
+
+    args = profile.get('args', {})
+    operators = [{
+        'depth': depth,
+        'operator': profile.get('operatorType', args.get('operatorType')),
+        'details': args.get('Details'),
+        'identifiers': list(profile.get('identifiers', [])),
+        'db_hits': int(profile.get('dbHits', args.get('DbHits', 0))),
+        'rows': int(profile.get('rows', args.get('Rows', 0))),
+        'estimated_rows': float(args.get('EstimatedRows', 0.0)),
+        'page_cache_hits': int(profile.get('pageCacheHits', args.get('PageCacheHits', 0))),
+        'page_cache_misses': int(profile.get('pageCacheMisses', args.get('PageCacheMisses', 0))),
+        'time': int(profile.get('time', args.get('Time', 0))) / 1e6
+    }]
+    for child in profile.get('children', []):
+        operators.extend(flatten_profile(child, depth + 1))
+
+    return operators
+
+
+def get_top_operators(operators: list[dict], n: int = 5) -> list[dict]:
+    """
+    Get the operators with the most db hits of a flattened profile.
+
+    :param operators: Operators returned by flatten_profile.
+    :param n: Number of operators returned.
+    :return: The n operators with the most db hits, with their share of the total db hits and the ratio between
+        actual and estimated rows.
+    """
+
+    total_db_hits = sum(operator['db_hits'] for operator in operators)
+    top_operators = sorted(operators, key=lambda operator: operator['db_hits'], reverse=True)[:n]
+
+    return [{
+        'operator': operator['operator'],
+        'details': operator['details'],
+        'db_hits': operator['db_hits'],
+        'db_hits_share': operator['db_hits'] / total_db_hits if total_db_hits > 0 else 0.0,
+        'rows': operator['rows'],
+        'estimated_rows': operator['estimated_rows'],
+        'rows_estimation_ratio': operator['rows'] / operator['estimated_rows'] if operator['estimated_rows'] > 0
+        else None
+    } for operator in top_operators]
+
+
+def summarize_profile(profile: dict, n: int = 5) -> dict:
+    """
+    Summarize the plan tree of a PROFILE query.
+
+    :param profile: Profiled plan tree.
+    :param n: Number of top operators by db hits.
+    :return: Dictionary with the totals of db hits and page cache hits and misses, the top operators and all the
+        operators.
+    """
+
+    operators = flatten_profile(profile)
+
+    return {
+        'db_hits': sum(operator['db_hits'] for operator in operators),
+        'page_cache_hits': sum(operator['page_cache_hits'] for operator in operators),
+        'page_cache_misses': sum(operator['page_cache_misses'] for operator in operators),
+        'top_operators': get_top_operators(operators, n),
+        'operators': operators
+    }
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+
+# Compact dtypes of the generated tables. Ids fit in int32, days in int16 (up to ~89 years) and seconds in int32 (up
+# to ~68 years), labels in uint8. Amounts are rounded to cents and stay well below 10^5, so float32 keeps them exact
+# to the cent. The float attributes of the profiles are the parameters of the simulation and are left in float64,
+# so that the generated data does not depend on the schema.
+CUSTOMER_PROFILES_DTYPES = {
+    'CUSTOMER_ID': 'int32',
+    'nb_terminals': 'int32'
+}
+
+TERMINAL_PROFILES_DTYPES = {
+    'TERMINAL_ID': 'int32'
+}
+
+TRANSACTIONS_DTYPES = {
+    'TRANSACTION_ID': 'int64',
+    'CUSTOMER_ID': 'int32',
+    'TERMINAL_ID': 'int32',
+    'TX_AMOUNT': 'float32',
+    'TX_TIME_SECONDS': 'int32',
+    'TX_TIME_DAYS': 'int16',
+    'TX_FRAUD': 'uint8',
+    'TX_FRAUD_SCENARIO': 'uint8',
+    'TX_SECURITY_FEELING': 'uint8'
+}
+
+# Available terminals of the customers in CSR form, used instead of a column of Python lists
+TERMINALS_OFFSETS_DTYPE = np.int64
+TERMINALS_INDICES_DTYPE = np.int32
+
+
+def apply_schema(df: pd.DataFrame, dtypes: dict) -> pd.DataFrame:
+    """
+    Cast the columns of a DataFrame to the dtypes of a schema, the columns missing from the DataFrame are ignored.
+
+    :param df: DataFrame to cast.
+    :param dtypes: Schema as a dictionary from column name to dtype.
+    :return: The DataFrame with the schema applied.
+    """
+
+    return df.astype({column: dtype for column, dtype in dtypes.items() if column in df.columns}, copy=False)
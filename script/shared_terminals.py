@@ -0,0 +1,129 @@
+import numpy as np
+import pandas as pd
+
+import script.dataset_io as dataset_io
+
+# Maximum number of (customer x, customer y) pairs expanded in each block of customers x, it bounds the memory of the
+# computation except for single customers x with more pairs
+PAIR_BLOCK_SIZE = 1 << 24
+
+
+def _to_incidence_csr(customer_indices: np.ndarray, terminal_indices: np.ndarray,
+                      n_terminals: int) -> tuple[np.ndarray, np.ndarray]:
+    # Distinct customers of each terminal, in CSR form sorted by terminal and then by customer
+    keys = np.unique(terminal_indices.astype(np.int64) * (1 << 32) + customer_indices)
+    terminals = keys >> 32
+    customers = keys & 0xFFFFFFFF
+    offsets = np.concatenate(([0], np.cumsum(np.bincount(terminals, minlength=n_terminals)))).astype(np.int64)
+
+    return offsets, customers
+
+
+def compute_shared_terminals(customer_profiles_table: pd.DataFrame, transactions_df: pd.DataFrame,
+                             min_shared_terminals: int = 3) -> pd.DataFrame:
+    """
+    Compute, for each ordered pair of distinct customers (x, y), the number of terminals on which y has a transaction
+    and x has a transaction or access, as operation a does. The counts are the entries of the product between the
+    customer-terminal incidence matrix of x (available or used terminals) and the transpose of the one of y (used
+    terminals), computed sparsely by expanding the (x, y) pairs of each terminal and counting the distinct pairs in
+    blocks of customers x, so that the cost grows with the co-occurring pairs rather than with the square of the
+    customers.
+
+    :param customer_profiles_table: Customer profiles table, with available_terminals as lists of terminal ids.
+    :param transactions_df: Transactions.
+    :param min_shared_terminals: Minimum number of shared terminals of the pairs returned.
+    :return: DataFrame with CUSTOMER_ID_X, CUSTOMER_ID_Y and SHARED_TERMINALS of the pairs with at least
+        min_shared_terminals shared terminals, sorted by CUSTOMER_ID_X and CUSTOMER_ID_Y.
+    """
+
+    customer_ids = np.unique(customer_profiles_table.CUSTOMER_ID.values)
+    n_customers = len(customer_ids)
+    available_terminals = customer_profiles_table.available_terminals
+    access_customers = np.repeat(customer_profiles_table.CUSTOMER_ID.values, available_terminals.apply(len))
+    access_terminals = np.fromiter((t for terminals in available_terminals for t in terminals), dtype=np.int64)
+    terminal_ids = np.unique(np.concatenate((access_terminals, transactions_df.TERMINAL_ID.values)))
+    n_terminals = len(terminal_ids)
+
+    tx_customers = np.searchsorted(customer_ids, transactions_df.CUSTOMER_ID.values)
+    tx_terminals = np.searchsorted(terminal_ids, transactions_df.TERMINAL_ID.values)
+
+    # Incidence of y (used terminals) and of x (available or used terminals), per terminal
+    y_offsets, y_customers = _to_incidence_csr(tx_customers, tx_terminals, n_terminals)
+    x_offsets, x_customers = _to_incidence_csr(
+        np.concatenate((np.searchsorted(customer_ids, access_customers), tx_customers)),
+        np.concatenate((np.searchsorted(terminal_ids, access_terminals), tx_terminals)), n_terminals)
+    x_terminals = np.repeat(np.arange(n_terminals), np.diff(x_offsets))
+
+    # Entries (x, terminal) sorted by customer x, with the number of (x, y) pairs each of them expands to
+    x_order = np.argsort(x_customers, kind='stable')
+    x_customers = x_customers[x_order]
+    x_terminals = x_terminals[x_order]
+    x_entry_offsets = np.concatenate(([0], np.cumsum(np.bincount(x_customers, minlength=n_customers))))
+    y_counts = y_offsets[x_terminals + 1] - y_offsets[x_terminals]
+    pair_ends = np.concatenate(([0], np.cumsum(y_counts)))[x_entry_offsets[1:]]
+
+    # Process the customers x in blocks, so that the pairs expanded in a block fit in PAIR_BLOCK_SIZE
+    block_bounds = [0]
+    while block_bounds[-1] < n_customers:
+        block_start = block_bounds[-1]
+        first_pair = pair_ends[block_start - 1] if block_start > 0 else 0
+        block_end = int(np.searchsorted(pair_ends, first_pair + PAIR_BLOCK_SIZE, side='right'))
+        block_bounds.append(max(block_end, block_start + 1))
+
+    pairs_x = []
+    pairs_y = []
+    pairs_count = []
+    for block_start, block_end in zip(block_bounds[:-1], block_bounds[1:]):
+        entries = slice(x_entry_offsets[block_start], x_entry_offsets[block_end])
+        block_x = x_customers[entries].astype(np.int64)
+        block_terminals = x_terminals[entries]
+
+        # Every (x, terminal) entry is paired with all the customers y of the terminal
+        block_y_counts = y_counts[entries]
+        total = int(block_y_counts.sum())
+        if total == 0:
+            continue
+        first_pairs = np.cumsum(block_y_counts) - block_y_counts
+        positions = np.arange(total) - np.repeat(first_pairs - y_offsets[block_terminals], block_y_counts)
+        pair_x = np.repeat(block_x, block_y_counts)
+        pair_y = y_customers[positions]
+
+        # Sorting the pair keys counts only the pairs that occur, sorted by x and then by y
+        keys, counts = np.unique(pair_x * n_customers + pair_y, return_counts=True)
+        selected = counts >= min_shared_terminals
+        keys = keys[selected]
+        keys_x = keys // n_customers
+        keys_y = keys % n_customers
+        distinct = keys_x != keys_y
+        pairs_x.append(keys_x[distinct])
+        pairs_y.append(keys_y[distinct])
+        pairs_count.append(counts[selected][distinct])
+
+    if not pairs_x:
+        empty = np.zeros(0, dtype=np.int64)
+        return pd.DataFrame({'CUSTOMER_ID_X': empty, 'CUSTOMER_ID_Y': empty, 'SHARED_TERMINALS': empty})
+
+    return pd.DataFrame({
+        'CUSTOMER_ID_X': customer_ids[np.concatenate(pairs_x)],
+        'CUSTOMER_ID_Y': customer_ids[np.concatenate(pairs_y)],
+        'SHARED_TERMINALS': np.concatenate(pairs_count).astype(np.int64)
+    })
+
+
+def write_shared_terminals(dataset_path: str, min_shared_terminals: int = 3) -> int:
+    """
+    Compute the shared terminals of the customer pairs of a generated dataset and write the pairs with at least
+    min_shared_terminals shared terminals as the shared_terminals side table of the dataset, in its format.
+
+    :param dataset_path: Directory of the generated dataset.
+    :param min_shared_terminals: Minimum number of shared terminals of the pairs written.
+    :return: Number of pairs written.
+    """
+
+    customer_profiles_table, _, transactions_df = dataset_io.read_dataset(dataset_path)
+    shared_terminals_df = compute_shared_terminals(customer_profiles_table, transactions_df, min_shared_terminals)
+
+    dataset_io.write_side_table(dataset_path, "shared_terminals", shared_terminals_df,
+                                dataset_io.get_dataset_format(dataset_path))
+
+    return len(shared_terminals_df)
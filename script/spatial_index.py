@@ -0,0 +1,112 @@
+import numpy as np
+
+
+class TerminalGridIndex:
+    def __init__(self, x_y_terminals: np.ndarray, r: float):
+        """
+        A uniform grid spatial index over the terminal coordinates, with square cells of side r. All the terminals
+        at a distance less than r from a point are in the cell of the point or in one of its 8 neighbour cells, so
+        a radius query only needs to compute the distances to the terminals of 9 cells instead of all of them.
+
+        :param x_y_terminals: Array of shape (n_terminals, 2) with the geographical location of all terminals.
+        :param r: Radius of the queries, used as cell size.
+        """
+
+        self.__x_y_terminals = np.asarray(x_y_terminals, dtype=float)
+        self.__r = r
+
+        cells = np.floor(self.__x_y_terminals / r).astype(np.int64)
+        if len(cells) > 0:
+            self.__min_cell = cells.min(axis=0)
+            self.__grid_shape = cells.max(axis=0) - self.__min_cell + 1
+        else:
+            self.__min_cell = np.zeros(2, dtype=np.int64)
+            self.__grid_shape = np.ones(2, dtype=np.int64)
+        cells -= self.__min_cell
+        cell_keys = cells[:, 0] * self.__grid_shape[1] + cells[:, 1]
+
+        # Terminals sorted by cell (and by index inside each cell), with the offsets of each cell in CSR form
+        self.__sorted_terminals = np.argsort(cell_keys, kind='stable')
+        cell_counts = np.bincount(cell_keys, minlength=int(np.prod(self.__grid_shape)))
+        self.__cell_offsets = np.concatenate(([0], np.cumsum(cell_counts)))
+
+    def query(self, x_y_customers: np.ndarray, batch_size: int = 65536) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Find the terminals within radius r of each customer.
+
+        :param x_y_customers: Array of shape (n_customers, 2) with the geographical location of the customers.
+        :param batch_size: Number of customers processed at once, it bounds the size of the temporary arrays.
+        :return: A tuple (offsets, indices) in CSR form, the terminals of the i-th customer are
+            indices[offsets[i]:offsets[i + 1]], sorted in ascending order.
+        """
+
+        x_y_customers = np.asarray(x_y_customers, dtype=float)
+        n_customers = len(x_y_customers)
+
+        counts = []
+        indices = []
+        for start in range(0, n_customers, batch_size):
+            batch_counts, batch_indices = self.__query_batch(x_y_customers[start:start + batch_size])
+            counts.append(batch_counts)
+            indices.append(batch_indices)
+
+        counts = np.concatenate(counts) if counts else np.zeros(0, dtype=np.int64)
+        indices = np.concatenate(indices) if indices else np.zeros(0, dtype=np.int64)
+        offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+
+        return offsets, indices
+
+    def __query_batch(self, x_y_customers: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        n_customers = len(x_y_customers)
+        n_terminals = len(self.__x_y_terminals)
+        customer_cells = np.floor(x_y_customers / self.__r).astype(np.int64) - self.__min_cell
+
+        pair_customers = []
+        pair_terminals = []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                neighbour_cells = customer_cells + (dx, dy)
+                valid = np.all((neighbour_cells >= 0) & (neighbour_cells < self.__grid_shape), axis=1)
+                cell_keys = neighbour_cells[:, 0] * self.__grid_shape[1] + neighbour_cells[:, 1]
+                cell_keys = np.where(valid, cell_keys, 0)
+
+                starts = self.__cell_offsets[cell_keys]
+                cell_counts = np.where(valid, self.__cell_offsets[cell_keys + 1] - starts, 0)
+                total = cell_counts.sum()
+                if total == 0:
+                    continue
+
+                # Expand every (customer, terminal of the cell) candidate pair
+                candidate_customers = np.repeat(np.arange(n_customers), cell_counts)
+                first_pair = np.cumsum(cell_counts) - cell_counts
+                positions = np.arange(total) - np.repeat(first_pair - starts, cell_counts)
+                candidate_terminals = self.__sorted_terminals[positions]
+
+                # Same distance computation of get_list_terminals_within_radius
+                squared_diff_x_y = np.square(x_y_customers[candidate_customers] - self.__x_y_terminals[candidate_terminals])
+                dist_x_y = np.sqrt(np.sum(squared_diff_x_y, axis=1))
+                within_radius = dist_x_y < self.__r
+
+                pair_customers.append(candidate_customers[within_radius])
+                pair_terminals.append(candidate_terminals[within_radius])
+
+        if not pair_customers:
+            return np.zeros(n_customers, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+        pair_keys = np.sort(np.concatenate(pair_customers) * n_terminals + np.concatenate(pair_terminals))
+        customers = pair_keys // n_terminals
+        terminals = pair_keys % n_terminals
+
+        return np.bincount(customers, minlength=n_customers), terminals
+
+
+def csr_to_lists(offsets: np.ndarray, indices: np.ndarray) -> list[list[int]]:
+    """
+    Convert a CSR (offsets, indices) pair into a list of lists of Python integers.
+
+    :param offsets: Offsets array of length n + 1.
+    :param indices: Flat indices array.
+    :return: The list of the n rows.
+    """
+
+    return [row.tolist() for row in np.split(np.asarray(indices), np.asarray(offsets)[1:-1])]
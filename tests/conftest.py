@@ -0,0 +1,25 @@
+import os
+
+import pytest
+from dotenv import load_dotenv
+
+from script.database import DatabaseInstance
+
+
+@pytest.fixture(scope='session')
+def db():
+    # The tests on Neo4j clear the database, so they only run on a database dedicated to them, named by
+    # TEST_DATABASE_NAME, on the DBMS configured as for main.py
+    load_dotenv()
+    if not os.getenv("DBMS_URI") or not os.getenv("TEST_DATABASE_NAME"):
+        pytest.skip("DBMS_URI and TEST_DATABASE_NAME are not set, no Neo4j database to test on")
+
+    db = DatabaseInstance(
+        uri=os.getenv("DBMS_URI"),
+        user=os.getenv("DBMS_USER"),
+        password=os.getenv("DBMS_PASSWORD"),
+        database=os.getenv("TEST_DATABASE_NAME"),
+    )
+    yield db
+    db.close()
+
@@ -0,0 +1,62 @@
+import os
+
+import pandas as pd
+import pytest
+
+import script.dataset_io as dataset_io
+from script.bulk_import import BULK_IMPORT_DIR_NAME, CUSTOMERS_FILE, TERMINALS_FILE, TRANSACTIONS_FILE, \
+    ACCESS_TO_FILE, write_bulk_import_files
+from script.generator import Generator
+
+
+@pytest.fixture(scope='module', params=[False, True], ids=['plain', 'enriched'])
+def dataset_path(request, tmp_path_factory):
+    output_path = tmp_path_factory.mktemp('bulk_import')
+    Generator(60, 40, '2025-01-01', 5, vectorized=True, enrich=request.param).generate(str(output_path), 10, 'tiny')
+
+    return os.path.join(output_path, 'tiny')
+
+
+def read_import_file(dataset_path: str, file_name: str) -> pd.DataFrame:
+    return pd.read_csv(os.path.join(dataset_path, BULK_IMPORT_DIR_NAME, file_name))
+
+
+def test_headers(dataset_path):
+    write_bulk_import_files(dataset_path)
+    enriched = 'TX_SECURITY_FEELING' in dataset_io.read_dataset(dataset_path)[2].columns
+
+    assert list(read_import_file(dataset_path, CUSTOMERS_FILE).columns) == [
+        'customer_id:ID(Customer)', 'x_location:double', 'y_location:double', 'mean_amount:double',
+        'std_amount:double', 'mean_nb_tx_per_day:double', 'nb_terminals:long']
+    assert list(read_import_file(dataset_path, TERMINALS_FILE).columns) == [
+        'terminal_id:ID(Terminal)', 'x_location:double', 'y_location:double']
+    assert list(read_import_file(dataset_path, TRANSACTIONS_FILE).columns) == [
+        ':START_ID(Customer)', ':END_ID(Terminal)', 'transaction_id:long', 'datetime:datetime', 'amount:double',
+        'fraudulent:boolean'] + (['period_of_day', 'product_type', 'security_feeling:long'] if enriched else [])
+    assert list(read_import_file(dataset_path, ACCESS_TO_FILE).columns) == [
+        ':START_ID(Customer)', ':END_ID(Terminal)']
+
+
+def test_row_counts(dataset_path):
+    rows = write_bulk_import_files(dataset_path)
+    customer_profiles_table, terminal_profiles_table, transactions_df = dataset_io.read_dataset(dataset_path)
+
+    assert rows == {
+        CUSTOMERS_FILE: len(customer_profiles_table),
+        TERMINALS_FILE: len(terminal_profiles_table),
+        TRANSACTIONS_FILE: len(transactions_df),
+        ACCESS_TO_FILE: int(customer_profiles_table.available_terminals.apply(len).sum())
+    }
+    for file_name, n_rows in rows.items():
+        assert len(read_import_file(dataset_path, file_name)) == n_rows
+
+
+def test_values(dataset_path):
+    write_bulk_import_files(dataset_path)
+    _, _, transactions_df = dataset_io.read_dataset(dataset_path)
+    transactions = read_import_file(dataset_path, TRANSACTIONS_FILE)
+
+    assert (transactions[':START_ID(Customer)'].values == transactions_df.CUSTOMER_ID.values).all()
+    assert (transactions[':END_ID(Terminal)'].values == transactions_df.TERMINAL_ID.values).all()
+    assert (transactions['fraudulent:boolean'].values == (transactions_df.TX_FRAUD.values == 1)).all()
+    assert (transactions['datetime:datetime'].str.match(r'^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}$')).all()
@@ -0,0 +1,65 @@
+import os
+import shutil
+
+import pytest
+
+from script.generator import Generator
+from script.loader import Loader
+from script.operations import Operations
+
+BUYING_FRIENDS_QUERY = """
+MATCH (c1:Customer)-[:BUYING_FRIEND]->(c2:Customer)
+RETURN c1.customer_id AS customer_id_1, c2.customer_id AS customer_id_2
+"""
+
+
+@pytest.fixture(scope='module')
+def dataset_paths(tmp_path_factory):
+    # A dataset with the extension of d.i, and a copy with only its first transactions to append the others to
+    output_path = tmp_path_factory.mktemp('buying_friends')
+    Generator(200, 50, '2025-01-01', 20, vectorized=True, enrich=True).generate(str(output_path), 60, 'full')
+    full_path = os.path.join(output_path, 'full')
+    base_path = os.path.join(output_path, 'base')
+    shutil.copytree(full_path, base_path)
+
+    with open(os.path.join(full_path, 'transactions.csv'), encoding='utf-8') as f:
+        lines = f.readlines()
+    with open(os.path.join(base_path, 'transactions.csv'), 'w', encoding='utf-8') as f:
+        f.writelines(lines[:len(lines) * 2 // 3])
+
+    return base_path, full_path
+
+
+def fetch_buying_friends(db) -> set:
+    records, _ = db.fetch_query(BUYING_FRIENDS_QUERY, output='records')
+
+    return {(record['customer_id_1'], record['customer_id_2']) for record in records}
+
+
+def get_d_ii_buying_friends(db) -> set:
+    # Relationships written by operation d.ii on the same graph, from the transactions
+    db.execute_query("MATCH (:Customer)-[f:BUYING_FRIEND]->(:Customer) DELETE f")
+    Operations(db).operation_d_ii()
+
+    return fetch_buying_friends(db)
+
+
+def test_materialized_buying_friends_are_the_ones_of_d_ii(db, dataset_paths):
+    _, full_path = dataset_paths
+    Loader(db, spending_aggregates=True, buying_friends=True).load_dataset_batched(full_path)
+
+    materialized = fetch_buying_friends(db)
+    assert materialized
+    assert materialized == get_d_ii_buying_friends(db)
+
+
+def test_appended_buying_friends_are_the_ones_of_d_ii(db, dataset_paths):
+    base_path, full_path = dataset_paths
+    loader = Loader(db, spending_aggregates=True, buying_friends=True)
+    loader.load_dataset_batched(base_path)
+    before = fetch_buying_friends(db)
+    loader.append_dataset(full_path)
+
+    updated = fetch_buying_friends(db)
+    assert updated != before
+    assert updated == get_d_ii_buying_friends(db)
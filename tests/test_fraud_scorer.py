@@ -0,0 +1,66 @@
+import os
+
+import numpy as np
+import pytest
+
+import script.dataset_io as dataset_io
+from script.fraud_scorer import StreamingFraudScorer
+from script.generator import Generator
+
+
+@pytest.fixture(scope='module')
+def transactions(tmp_path_factory):
+    output_path = tmp_path_factory.mktemp('fraud_scorer')
+    Generator(200, 100, '2025-01-01', 5, vectorized=True).generate(str(output_path), 90, 'small')
+    _, _, transactions_df = dataset_io.read_dataset(os.path.join(output_path, 'small'))
+
+    return (transactions_df.CUSTOMER_ID.values, transactions_df.TERMINAL_ID.values,
+            transactions_df.TX_AMOUNT.values, transactions_df.TX_TIME_DAYS.values, transactions_df.TX_FRAUD.values == 1)
+
+
+def score_sequentially(scorer: StreamingFraudScorer, transactions: tuple) -> tuple[np.ndarray, np.ndarray]:
+    results = [scorer.score(int(customer_id), int(terminal_id), float(amount), int(tx_time_days), bool(fraudulent))
+               for customer_id, terminal_id, amount, tx_time_days, fraudulent in zip(*transactions)]
+
+    return np.array([score for score, _ in results]), np.array([flags for _, flags in results])
+
+
+def test_score_many_equals_score(transactions):
+    scores, flags = score_sequentially(StreamingFraudScorer(), transactions)
+    assert flags.any()
+
+    batch_scores, batch_flags = StreamingFraudScorer().score_many(*transactions)
+
+    assert np.array_equal(batch_flags, flags)
+    assert np.allclose(batch_scores, scores)
+
+
+def test_score_many_in_chunks(transactions):
+    scores, flags = StreamingFraudScorer().score_many(*transactions)
+
+    scorer = StreamingFraudScorer()
+    # Chunks that split the transactions of a day
+    chunks = [scorer.score_many(*(column[start:start + 997] for column in transactions))
+              for start in range(0, len(transactions[0]), 997)]
+
+    assert np.array_equal(np.concatenate([chunk_flags for _, chunk_flags in chunks]), flags)
+    assert np.allclose(np.concatenate([chunk_scores for chunk_scores, _ in chunks]), scores)
+
+
+@pytest.mark.parametrize('file_name', ['scorer', 'scorer.npz', 'scorer.ckpt'])
+def test_checkpoint_and_restore(tmp_path, transactions, file_name):
+    half = len(transactions[0]) // 2
+    first_half = tuple(column[:half] for column in transactions)
+    second_half = tuple(column[half:] for column in transactions)
+
+    scorer = StreamingFraudScorer()
+    scorer.score_many(*first_half)
+    path = str(tmp_path / file_name)
+    scorer.checkpoint(path)
+    restored = StreamingFraudScorer.restore(path)
+
+    assert os.listdir(tmp_path) == [file_name]
+    scores, flags = scorer.score_many(*second_half)
+    restored_scores, restored_flags = restored.score_many(*second_half)
+    assert np.array_equal(restored_flags, flags)
+    assert np.array_equal(restored_scores, scores)
@@ -0,0 +1,29 @@
+import filecmp
+import os
+
+import pytest
+
+from script.generator import Generator
+
+
+def generate(output_path, n_workers: int, vectorized: bool, radius: float) -> str:
+    Generator(60, 40, '2025-01-01', radius, vectorized=vectorized, n_workers=n_workers).generate(
+        str(output_path), 20, f'workers_{n_workers}')
+
+    return os.path.join(output_path, f'workers_{n_workers}')
+
+
+# With a radius of 1 most of the customers have no available terminals, and so no transactions
+@pytest.mark.parametrize('radius', [5, 1])
+@pytest.mark.parametrize('vectorized', [False, True], ids=['loop', 'vectorized'])
+def test_output_does_not_depend_on_workers(tmp_path, vectorized, radius):
+    sequential_path = generate(tmp_path, 1, vectorized, radius)
+    file_names = sorted(os.listdir(sequential_path))
+    assert file_names
+
+    for n_workers in (2, 3):
+        sharded_path = generate(tmp_path, n_workers, vectorized, radius)
+        assert sorted(os.listdir(sharded_path)) == file_names
+        for file_name in file_names:
+            assert filecmp.cmp(os.path.join(sequential_path, file_name), os.path.join(sharded_path, file_name),
+                               shallow=False), file_name
@@ -0,0 +1,185 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import script.dataset_io as dataset_io
+import script.memory_operations as memory_operations
+from script.generator import Generator
+from script.memory_graph import MemoryGraph
+from script.memory_operations import MemoryOperations
+
+
+# Reference implementations of the queries of Operations on the tables of the dataset, written after the Cypher
+# semantics rather than after the in-memory algorithms
+
+
+def reference_a(customer_profiles_table: pd.DataFrame, transactions_df: pd.DataFrame) -> set:
+    # (x)-[:ACCESS_TO|TRANSACTION]->(t)<-[:TRANSACTION]-(y), amounts summed over all the matched paths
+    access = pd.DataFrame([(customer_id, terminal_id)
+                           for customer_id, terminals in zip(customer_profiles_table.CUSTOMER_ID,
+                                                             customer_profiles_table.available_terminals)
+                           for terminal_id in terminals], columns=['x', 't']).drop_duplicates()
+    access['amount'] = 0.0
+    x_edges = pd.concat([access, transactions_df.rename(columns={'CUSTOMER_ID': 'x', 'TERMINAL_ID': 't'})[
+        ['x', 't', 'amount']]])
+    x_groups = x_edges.groupby(['x', 't']).agg(x_edges=('amount', 'size'), x_sum=('amount', 'sum')).reset_index()
+    y_groups = transactions_df.groupby(['CUSTOMER_ID', 'TERMINAL_ID']).agg(
+        y_edges=('amount', 'size'), y_sum=('amount', 'sum')).reset_index().rename(
+        columns={'CUSTOMER_ID': 'y', 'TERMINAL_ID': 't'})
+
+    paths = x_groups.merge(y_groups, on='t')
+    paths = paths[paths.x != paths.y]
+    paths['amount_x'] = paths.x_sum * paths.y_edges
+    paths['amount_y'] = paths.y_sum * paths.x_edges
+    pairs = paths.groupby(['x', 'y']).agg(
+        amount_x=('amount_x', 'sum'), amount_y=('amount_y', 'sum'), shared=('t', 'nunique')).reset_index()
+    pairs = pairs[(pairs.shared >= 3) & ((pairs.amount_x - pairs.amount_y).abs() < 0.1 * pairs.amount_x)]
+
+    return set(zip(pairs.x, pairs.y))
+
+
+def reference_b(transactions_df: pd.DataFrame, as_of: str) -> dict:
+    current_date = pd.Timestamp(as_of)
+    current_month_start = current_date - pd.DateOffset(months=1)
+    previous_month_start = current_date - pd.DateOffset(months=2)
+
+    previous = transactions_df[(transactions_df.TX_DATETIME >= previous_month_start) &
+                               (transactions_df.TX_DATETIME < current_month_start)]
+    average = previous.groupby('TERMINAL_ID').amount.mean()
+    current = transactions_df[(transactions_df.TX_DATETIME >= current_month_start) &
+                              (transactions_df.TX_DATETIME < current_date)]
+    current = current[current.TERMINAL_ID.isin(average.index)]
+    current = current[current.amount - current.TERMINAL_ID.map(average) > 0.2 * current.TERMINAL_ID.map(average)]
+
+    return {terminal_id: sorted(ids) for terminal_id, ids in current.groupby('TERMINAL_ID').TRANSACTION_ID}
+
+
+def reference_c(transactions_df: pd.DataFrame, u_customer_id: int, k: int) -> list:
+    # Chains u1-t1-u2-...-uk of distinct customers
+    neighbours = {}
+    for _, customers in transactions_df.drop_duplicates(['CUSTOMER_ID', 'TERMINAL_ID']).groupby(
+            'TERMINAL_ID').CUSTOMER_ID:
+        for customer_id in customers:
+            neighbours.setdefault(customer_id, set()).update(customers)
+
+    co_customers = set()
+
+    def visit(customer_id, path, degree):
+        if degree == k:
+            co_customers.add(customer_id)
+            return
+        for neighbour in neighbours.get(customer_id, ()):
+            if neighbour not in path:
+                visit(neighbour, path | {neighbour}, degree + 1)
+
+    visit(u_customer_id, {u_customer_id}, 1)
+
+    return sorted(co_customers)
+
+
+def reference_d_ii(transactions_df: pd.DataFrame) -> set:
+    spending = transactions_df.groupby(['CUSTOMER_ID', 'TERMINAL_ID']).agg(
+        tx_count=('security_feeling', 'size'), security_sum=('security_feeling', 'sum')).reset_index()
+    c1 = spending[spending.tx_count > 3].copy()
+    c1['c1_avg_security'] = c1.security_sum / c1.tx_count
+
+    # The transactions of c2 are grouped with the ones of c1, by the average feeling of security of c1
+    paths = c1[['CUSTOMER_ID', 'TERMINAL_ID', 'c1_avg_security']].merge(spending, on='TERMINAL_ID',
+                                                                        suffixes=('', '_2'))
+    paths = paths[paths.CUSTOMER_ID != paths.CUSTOMER_ID_2]
+    groups = paths.groupby(['CUSTOMER_ID', 'CUSTOMER_ID_2', 'c1_avg_security']).agg(
+        tx2_count=('tx_count', 'sum'), security_sum=('security_sum', 'sum')).reset_index()
+    groups = groups[(groups.tx2_count > 3) &
+                    ((groups.c1_avg_security - groups.security_sum / groups.tx2_count).abs() < 1)]
+
+    return set(zip(groups.CUSTOMER_ID, groups.CUSTOMER_ID_2))
+
+
+@pytest.fixture(scope='module')
+def dataset_path(tmp_path_factory):
+    output_path = tmp_path_factory.mktemp('memory_operations')
+    # Few terminals in a large radius, so that the customers share enough terminals for operations a and d.ii
+    Generator(200, 50, '2025-01-01', 20, vectorized=True).generate(str(output_path), 60, 'small')
+
+    return os.path.join(output_path, 'small')
+
+
+@pytest.fixture(scope='module')
+def transactions_df(dataset_path):
+    _, _, transactions_df = dataset_io.read_dataset(dataset_path)
+
+    # Amounts as written by the Loader
+    return transactions_df.assign(amount=transactions_df.TX_AMOUNT.astype(float).round(2))
+
+
+@pytest.fixture
+def graph(dataset_path):
+    graph = MemoryGraph()
+    graph.load_dataset(dataset_path)
+
+    return graph
+
+
+@pytest.fixture(params=[memory_operations.PAIR_BLOCK_SIZE, 64], ids=['one_block', 'small_blocks'])
+def operations(request, monkeypatch, graph):
+    # The results must not depend on the blocks of the pairs expanded
+    monkeypatch.setattr(memory_operations, 'PAIR_BLOCK_SIZE', request.param)
+
+    return MemoryOperations(graph)
+
+
+def test_operation_a(operations, dataset_path, transactions_df):
+    customer_profiles_table, _, _ = dataset_io.read_dataset(dataset_path)
+    expected = reference_a(customer_profiles_table, transactions_df)
+    assert expected
+
+    operations.operation_a()
+    result = operations.get_last_result()
+
+    assert set(zip(result.customer_x, result.customer_y)) == expected
+
+
+@pytest.mark.parametrize('as_of', ['2025-02-28', '2025-03-01', '2025-03-31'])
+def test_operation_b(operations, transactions_df, as_of):
+    expected = reference_b(transactions_df, as_of)
+    assert expected
+
+    operations.operation_b(as_of)
+    result = operations.get_last_result()
+
+    assert dict(zip(result.terminal_id, result.possible_fraudulent_transaction)) == expected
+
+
+@pytest.mark.parametrize('u_customer_id, k', [(0, 2), (0, 3), (5, 3), (7, 4)])
+def test_operation_c(operations, transactions_df, u_customer_id, k):
+    operations.operation_c(u_customer_id, k)
+
+    assert operations.get_last_result().co_customer.tolist() == reference_c(transactions_df, u_customer_id, k)
+
+
+def test_operation_d_ii(operations, graph, transactions_df):
+    operations.operation_d_i()
+    security_feeling = pd.Series(graph.tx_security_feeling, index=graph.tx_ids)
+    expected = reference_d_ii(
+        transactions_df.assign(security_feeling=transactions_df.TRANSACTION_ID.map(security_feeling)))
+    assert expected
+
+    operations.operation_d_ii()
+    result = operations.get_last_result()
+
+    assert set(zip(result.customer_id_1, result.customer_id_2)) == expected
+
+
+def test_operation_e(operations, graph, transactions_df):
+    operations.operation_d_i()
+    period_of_day = pd.Series(graph.tx_period_of_day, index=graph.tx_ids)
+    expected = transactions_df.assign(period_of_day=transactions_df.TRANSACTION_ID.map(period_of_day)).groupby(
+        'period_of_day').TX_FRAUD.agg(['size', 'mean'])
+
+    operations.operation_e()
+    result = operations.get_last_result().set_index('period_of_day').loc[expected.index]
+
+    assert np.array_equal(result.transactions.values, expected['size'].values)
+    assert np.allclose(result.avg_fraudulent_transactions.values, expected['mean'].values)
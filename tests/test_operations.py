@@ -0,0 +1,61 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from script.generator import Generator
+from script.loader import Loader
+from script.operations import Operations
+
+
+@pytest.fixture(scope='module')
+def operations(db, tmp_path_factory):
+    # Few terminals in a large radius, so that the customers share enough terminals for operation a
+    output_path = tmp_path_factory.mktemp('operations')
+    Generator(200, 50, '2025-01-01', 20, vectorized=True).generate(str(output_path), 60, 'small')
+    Generator.export_shared_terminals(str(output_path), 'small')
+    dataset_path = os.path.join(output_path, 'small')
+    loader = Loader(db, spending_aggregates=True, monthly_aggregates=True)
+    loader.load_dataset_batched(dataset_path)
+    loader.load_shared_terminals(dataset_path)
+
+    return Operations(db)
+
+
+def fetch_sorted(operations: Operations, name: str, keys: list[str], **kwargs) -> pd.DataFrame:
+    result, _ = operations.fetch_read_operation(name, output='pandas', **kwargs)
+
+    return result.sort_values(keys).reset_index(drop=True)
+
+
+def assert_same_pairs(result: pd.DataFrame, expected: pd.DataFrame):
+    assert not expected.empty
+    assert result.customer_x.tolist() == expected.customer_x.tolist()
+    assert result.customer_y.tolist() == expected.customer_y.tolist()
+    assert np.allclose(result.amount_x, expected.amount_x)
+    assert np.allclose(result.amount_y, expected.amount_y)
+
+
+def test_operation_a_aggregated_equals_a(operations):
+    keys = ['customer_x', 'customer_y']
+
+    assert_same_pairs(fetch_sorted(operations, 'a.aggregated', keys), fetch_sorted(operations, 'a', keys))
+
+
+def test_operation_a_shared_terminals_equals_a(operations):
+    keys = ['customer_x', 'customer_y']
+
+    assert_same_pairs(fetch_sorted(operations, 'a.shared_terminals', keys), fetch_sorted(operations, 'a', keys))
+
+
+@pytest.mark.parametrize('as_of', ['2025-02-28', '2025-03-01', '2025-03-15', '2025-03-31'])
+def test_operation_b_aggregated_equals_b(operations, as_of):
+    expected = fetch_sorted(operations, 'b', ['terminal_id'], as_of=as_of)
+    assert not expected.empty
+
+    result = fetch_sorted(operations, 'b.aggregated', ['terminal_id'], as_of=as_of)
+
+    assert result.terminal_id.tolist() == expected.terminal_id.tolist()
+    assert ([sorted(ids) for ids in result.possible_fraudulent_transaction] ==
+            [sorted(ids) for ids in expected.possible_fraudulent_transaction])